@@ -1,20 +1,81 @@
+import time
+# زمان شروع برنامه، پیش از import ماژول‌های سنگین، برای سنجش زمان تا اولین فریم پردازش‌شده
+STARTED_NS = time.monotonic_ns()
 import sys
+import signal
+import argparse
 import logging
-from PyQt6.QtWidgets import QApplication
-from PyQt6.QtGui import QFont
-from src.app import DrowsinessApp
 
 # تنظیم لاگ‌گذاری
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def run_gui(args):
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtGui import QFont
+    from src.app import DrowsinessApp
+
+    app = QApplication(sys.argv)
+    window = DrowsinessApp(multiprocess=args.multiprocess, started_ns=STARTED_NS)
+    font = QFont("BNazanin" if window.language == "fa" else "Arial", 14)
+    app.setFont(font)
+    window.show()
+    return app.exec()
+
+def run_headless(args):
+    from src.headless import HeadlessMonitor
+
+    monitor = HeadlessMonitor(multiprocess=args.multiprocess, started_ns=STARTED_NS)
+    signal.signal(signal.SIGTERM, lambda signum, frame: monitor.stop())
+    if hasattr(signal, "SIGUSR1"):
+        # kill -USR1 <pid> writes the stage-timing trace to alerts/traces/
+        signal.signal(signal.SIGUSR1, lambda signum, frame: monitor.request_trace())
+    return monitor.run()
+
+def run_multi_camera(args):
+    from src.multi_camera import MultiCameraMonitor
+    from src.constants import FACEMESH_POOL_SIZE
+
+    # "0,1" are device indices; anything else (file paths, RTSP URLs) is passed to OpenCV as is
+    sources = [int(source) if source.isdigit() else source for source in args.cameras.split(",") if source]
+    monitor = MultiCameraMonitor(sources, args.facemesh_workers or FACEMESH_POOL_SIZE)
+    signal.signal(signal.SIGTERM, lambda signum, frame: monitor.stop())
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: monitor.request_trace())
+    return monitor.run()
+
+def run_batch(args):
+    from src.batch import run_batch as run_batch_videos
+
+    return run_batch_videos(args.batch, args.output, args.workers)
+
+def run_report(args):
+    from src.alert_report import main as report_main
+
+    return report_main(args.report + (["--workers", str(args.workers)] if args.workers else []))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Drowsiness detection system")
+    parser.add_argument("--headless", action="store_true", help="run detection and alerts without the Qt window or overlay rendering")
+    parser.add_argument("--multiprocess", action="store_true", help="run capture and FaceMesh inference in separate processes with shared-memory frames")
+    parser.add_argument("--batch", metavar="DIR", help="run detection offline over every video file in DIR")
+    parser.add_argument("--output", metavar="DIR", default=None, help="folder for per-video alert logs in batch mode")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes in batch and report mode (default: CPU count)")
+    parser.add_argument("--report", nargs="+", metavar="PATH", help="print alert-history statistics for these alert folders or logs and exit")
+    parser.add_argument("--cameras", metavar="SOURCES", help="comma-separated camera indices or video URLs to monitor headless in one process")
+    parser.add_argument("--facemesh-workers", type=int, default=None, help="FaceMesh workers shared by all cameras (default: FACEMESH_POOL_SIZE in src/constants.py)")
+    args, _ = parser.parse_known_args()
+    return args
+
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        app = QApplication(sys.argv)
-        window = DrowsinessApp()
-        font = QFont("BNazanin" if window.language == "fa" else "Arial", 14)
-        app.setFont(font)
-        window.show()
-        sys.exit(app.exec())
+        if args.report:
+            sys.exit(run_report(args))
+        if args.batch:
+            sys.exit(run_batch(args))
+        if args.cameras:
+            sys.exit(run_multi_camera(args))
+        sys.exit(run_headless(args) if args.headless else run_gui(args))
     except Exception as e:
         logging.error(f"Error starting application: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
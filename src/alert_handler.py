@@ -1,104 +1,150 @@
 import os
 import json
 import logging
-import pygame
 import jdatetime
-import asyncio
+import time
 import threading
 from collections import deque
-import cv2
-from src.constants import ALERT_FOLDER, ALARM_SOUND, FOURCC, FPS, CONFIG_FILE, MIN_BRIGHTNESS_THRESH, ALERT_COOLDOWN, GRACE_PERIOD, SENSITIVITY_MODES, BLINK_RATE_MIN, BLINK_RATE_MAX, BLINK_DURATION_THRESH, BLINK_CONSEC_FRAMES
+from src.constants import ALERT_FOLDER, ALARM_SOUND, CONFIG_FILE, MIN_BRIGHTNESS_THRESH, ALERT_COOLDOWN, GRACE_PERIOD, SENSITIVITY_MODES, BLINK_RATE_MIN, BLINK_RATE_MAX, BLINK_DURATION_THRESH, BLINK_CONSEC_FRAMES, DENOISE_MODE, EAR_HISTORY_WINDOW, BLINK_RATE_WINDOW, EVENT_STORE_FOLDER, LEGACY_ALERT_LOG
+from src.event_store import EventStore
+from src.clip_recorder import ClipRecorder
+from src.clip_maintenance import ClipMaintenance
+from src.rolling_stats import RollingWindow
+
+GRACE_PERIOD_NS = int(GRACE_PERIOD * 1e9)
+BLINK_RATE_WINDOW_NS = int(BLINK_RATE_WINDOW * 1e9)
+
+# The pygame mixer is process-wide and shared by the handlers of all camera streams, so it is only shut
+# down when the last handler using it is cleaned up.
+mixer_lock = threading.Lock()
+mixer_users = 0
+
+def acquire_mixer():
+    global mixer_users
+    import pygame
+    with mixer_lock:
+        pygame.mixer.init()
+        mixer_users += 1
+
+def release_mixer():
+    global mixer_users
+    import pygame
+    with mixer_lock:
+        mixer_users -= 1
+        if mixer_users == 0:
+            pygame.mixer.quit()  # خاتمه کامل میکسر صوتی
+            logging.debug("Pygame mixer quit during cleanup")
 
 class AlertHandler:
-    def __init__(self, parent):
+    def __init__(self, parent, log_folder=None, enable_audio=True, enable_recording=True, persist_config=True, alert_folder=ALERT_FOLDER, alarm_channel_id=0):
         self.parent = parent
+        self.alert_folder = alert_folder
+        self.alarm_channel_id = alarm_channel_id
+        self.log_folder = log_folder or os.path.join(alert_folder, EVENT_STORE_FOLDER)
+        self.enable_recording = enable_recording
+        self.persist_config = persist_config
+        # همه‌ی زمان‌ها به نانوثانیه‌ی time.monotonic_ns() هستند؛ این فاصله آن‌ها را فقط هنگام نوشتن گزارش به زمان واقعی تبدیل می‌کند
+        # (حالت دسته‌ای آن را طوری تنظیم می‌کند که زمان ویدیو به زمان ضبط برسد)
+        self.wall_clock_offset_ns = time.time_ns() - time.monotonic_ns()
         self.alert_count = 0
         self.alert_start_time = None
         self.last_alert_times = {}
         self.alert_triggered = False
         self.alarm_playing = False
         self.recording = False
-        self.log_data = []
+        self.event_store = None
+        self.current_alert_id = None
         self.current_video_filename = None
-        self.ear_history = deque(maxlen=15)
+        self.ear_history = RollingWindow(EAR_HISTORY_WINDOW)
         self.eyes_closed_frames = 0
         self.roll_alert_frames = 0
         self.pitch_alert_frames = 0
         self.no_face_frames = 0
-        self.video_writer = None
+        self.clip_recorder = None
+        self.clip_maintenance = None
+        if enable_recording:
+            self.clip_recorder = ClipRecorder()
+            # فشرده‌سازی دوباره، تصویر بندانگشتی و سهمیه‌ی دیسک در یک پردازه‌ی کم‌اولویت
+            self.clip_maintenance = ClipMaintenance(alert_folder, self.log_folder)
+            self.clip_recorder.on_clip_written = self.clip_maintenance.clip_written
+            self.clip_maintenance.resume()
         self.current_alert_type = None
         self.pending_alert_type = None
         self.grace_period_start = None
         self.is_grace_period = False
         self.sensitivity_mode = "normal"
+        self.driver_id = ""
         self.blink_count = 0
         self.blink_times = deque()
+        self.blink_rate = 0
         self.blink_duration = 0.0
         self.was_eyes_closed = False
         self.blink_start_time = None
         self.sound_enabled = True  # متغیر برای ردیابی وضعیت فعال بودن صدا
+        self.alarm_sound = None
+        self.alarm_channel = None
+        self.mixer_acquired = False
 
-        try:
-            pygame.mixer.init()
-            if not os.path.exists(ALARM_SOUND):
-                raise FileNotFoundError(f"Alarm sound file not found: {ALARM_SOUND}")
-            self.alarm_sound = pygame.mixer.Sound(ALARM_SOUND)
-            self.alarm_channel = pygame.mixer.Channel(0)
-            self.alarm_sound.set_volume(0.5)
-            logging.info("Audio initialized successfully")
-        except Exception as e:
-            logging.error(f"Error initializing audio: {e}")
-            self.parent.show_warning(f"Error initializing audio: {e}")
-            self.alarm_sound = None
-            self.alarm_channel = None
+        if enable_audio:
+            self.init_audio()
+        else:
             self.sound_enabled = False
 
         try:
-            if not os.path.exists(ALERT_FOLDER):
-                os.makedirs(ALERT_FOLDER)
-            log_filename = os.path.join(ALERT_FOLDER, "alerts_log.json")
-            if not os.path.exists(log_filename):
-                with open(log_filename, 'w', encoding='utf-8') as file:
-                    json.dump([], file, ensure_ascii=False, indent=4)
+            self.event_store = EventStore(self.log_folder)
+            legacy_log = os.path.join(alert_folder, LEGACY_ALERT_LOG)
+            if log_folder is None and os.path.exists(legacy_log):
+                self.event_store.import_json_log(legacy_log)
         except Exception as e:
             logging.error(f"Error setting up alert folder: {e}")
             self.parent.show_warning(f"Error setting up alert folder: {e}")
 
-        self.async_loop = asyncio.new_event_loop()
-        threading.Thread(target=self.start_async_loop, daemon=True).start()
-
         # بارگذاری تنظیمات اولیه
         self.load_config()
 
-    def start_async_loop(self):
+    def init_audio(self):
         try:
-            asyncio.set_event_loop(self.async_loop)
-            self.async_loop.run_forever()
-        except Exception as e:
-            logging.error(f"Error starting async loop: {e}")
-
-    async def async_save_log(self):
-        log_filename = os.path.join(ALERT_FOLDER, "alerts_log.json")
-        try:
-            with open(log_filename, mode='w', encoding='utf-8') as file:
-                json.dump(self.log_data, file, ensure_ascii=False, indent=4)
-            logging.info(f"Log file updated at {os.path.abspath(log_filename)}")
-        except Exception as e:
-            logging.error(f"Error saving log file: {e}")
-
-    def schedule_save_log(self):
-        try:
-            asyncio.run_coroutine_threadsafe(self.async_save_log(), self.async_loop)
+            start = time.perf_counter()
+            # pygame is only needed for the alarm; its import is part of the audio start-up
+            import pygame
+            acquire_mixer()
+            self.mixer_acquired = True
+            if not os.path.exists(ALARM_SOUND):
+                raise FileNotFoundError(f"Alarm sound file not found: {ALARM_SOUND}")
+            self.alarm_sound = pygame.mixer.Sound(ALARM_SOUND)
+            if pygame.mixer.get_num_channels() <= self.alarm_channel_id:
+                pygame.mixer.set_num_channels(self.alarm_channel_id + 1)
+            self.alarm_channel = pygame.mixer.Channel(self.alarm_channel_id)
+            self.alarm_sound.set_volume(0.5)
+            logging.info(f"Audio initialized successfully in {(time.perf_counter() - start) * 1000:.0f} ms")
         except Exception as e:
-            logging.error(f"Error scheduling log save: {e}")
+            logging.error(f"Error initializing audio: {e}")
+            self.parent.show_warning(f"Error initializing audio: {e}")
+            self.alarm_sound = None
+            self.alarm_channel = None
+            self.sound_enabled = False
+            if self.mixer_acquired:
+                release_mixer()
+                self.mixer_acquired = False
 
+    # Blinks in the minute before the latest frame; updated once per frame by handle_alerts.
     def calculate_blink_rate(self):
-        current_time = jdatetime.datetime.now()
-        while self.blink_times and (current_time - self.blink_times[0]).total_seconds() > 60:
+        return self.blink_rate
+
+    def update_blink_rate(self, current_time):
+        cutoff = current_time - BLINK_RATE_WINDOW_NS
+        while self.blink_times and self.blink_times[0] < cutoff:
             self.blink_times.popleft()
-        blink_rate = len(self.blink_times)
-        logging.debug(f"Calculated blink rate: {blink_rate}/minute")
-        return blink_rate
+        self.blink_rate = len(self.blink_times)
+        return self.blink_rate
+
+    # رکورد فقط به صف نوشتن اضافه می‌شود؛ نوشتن روی دیسک در رشته‌ی EventStore انجام می‌شود
+    def append_event(self, record):
+        if self.event_store:
+            self.event_store.append(record)
+
+    def format_time(self, timestamp_ns, fmt="%Y/%m/%d %H:%M:%S"):
+        return jdatetime.datetime.fromtimestamp((timestamp_ns + self.wall_clock_offset_ns) / 1e9).strftime(fmt)
 
     def load_config(self):
         try:
@@ -106,6 +152,7 @@ class AlertHandler:
                 with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
                     config = json.load(f)
                     self.sensitivity_mode = config.get("sensitivity_mode", "normal")
+                    self.driver_id = config.get("driver_id", "")
                     self.sound_enabled = config.get("sound_alert", True)
                     volume = config.get("volume", 50) / 100.0
                     if self.alarm_sound:
@@ -114,10 +161,16 @@ class AlertHandler:
         except Exception as e:
             logging.error(f"Error loading configuration in AlertHandler: {e}")
 
-    def handle_alerts(self, frame, smoothed_ear, current_roll, current_pitch, direction_text, alert_flag, alert_severity, brightness):
+    def handle_result(self, result):
+        self.handle_alerts(result.frame, result.smoothed_ear, result.current_roll, result.current_pitch, result.direction_text, result.alert_flag, result.alert_severity, result.brightness, result.timestamp_ns)
+
+    # timestamp_ns: capture time of the frame (time.monotonic_ns()); defaults to now
+    def handle_alerts(self, frame, smoothed_ear, current_roll, current_pitch, direction_text, alert_flag, alert_severity, brightness, timestamp_ns=None):
         try:
             self.ear_history.append(smoothed_ear)
-            current_time = jdatetime.datetime.now()
+            current_time = time.monotonic_ns() if timestamp_ns is None else timestamp_ns
+            if self.clip_recorder:
+                self.clip_recorder.add_frame(frame, current_time)
 
             # تنظیم آستانه‌ها بر اساس حساسیت
             sensitivity = SENSITIVITY_MODES[self.sensitivity_mode]
@@ -164,8 +217,8 @@ class AlertHandler:
                 self.was_eyes_closed = True
             elif not is_eyes_closed and self.was_eyes_closed:
                 self.was_eyes_closed = False
-                if self.blink_start_time:
-                    self.blink_duration = (current_time - self.blink_start_time).total_seconds()
+                if self.blink_start_time is not None:
+                    self.blink_duration = (current_time - self.blink_start_time) / 1e9
                     self.blink_times.append(current_time)
                     self.blink_count += 1
                     logging.debug(f"Blink detected, duration: {self.blink_duration}, count: {self.blink_count}")
@@ -177,7 +230,7 @@ class AlertHandler:
             self.was_eyes_closed = is_eyes_closed
 
             # نرخ پلک زدن
-            blink_rate = self.calculate_blink_rate()
+            blink_rate = self.update_blink_rate(current_time)
             if (blink_rate < BLINK_RATE_MIN or blink_rate > BLINK_RATE_MAX) and not self.pending_alert_type:
                 self.pending_alert_type = "blink_anomaly"
                 self.grace_period_start = current_time
@@ -238,7 +291,7 @@ class AlertHandler:
             if new_alert_type and new_alert_type != self.current_alert_type:
                 alert_category = self.get_alert_category(new_alert_type)
                 last_alert_time = self.last_alert_times.get(alert_category)
-                if last_alert_time and (current_time - last_alert_time).total_seconds() < ALERT_COOLDOWN[alert_category]:
+                if last_alert_time is not None and current_time - last_alert_time < ALERT_COOLDOWN[alert_category] * 1e9:
                     logging.debug(f"Alert {new_alert_type} blocked by cooldown")
                     return
 
@@ -247,20 +300,30 @@ class AlertHandler:
                     self.grace_period_start = current_time
                     self.is_grace_period = True
                     logging.debug(f"Started grace period for {new_alert_type}")
-                elif (current_time - self.grace_period_start).total_seconds() >= GRACE_PERIOD:
+                elif current_time - self.grace_period_start >= GRACE_PERIOD_NS:
                     if self.alert_start_time is None:
                         self.alert_start_time = self.grace_period_start
-                    duration = (current_time - self.alert_start_time).total_seconds()
+                    duration = (current_time - self.alert_start_time) / 1e9
 
                     if duration >= self.parent.ALERT_MIN_DURATION:
                         self.alert_triggered = True
                         self.last_alert_times[alert_category] = current_time
                         self.alert_count += 1
                         self.current_alert_type = new_alert_type
+                        self.current_alert_id = f"{self.event_store.session_id if self.event_store else ''}_{self.alert_count}"
+                        if self.clip_recorder and not self.recording and new_alert_type not in ["no_face", "blink_anomaly"]:
+                            # کلیپ ثانیه‌های پیش از شروع هشدار را هم از بافر حلقوی دارد
+                            self.current_video_filename = os.path.join(self.alert_folder, f"alert_{self.format_time(self.alert_start_time, '%Y%m%d_%H%M%S')}.mp4")
+                            self.clip_recorder.trigger(self.current_video_filename, self.alert_start_time)
+                            self.recording = True
                         log_entry = {
+                            "event": "alert_start",
+                            "alert_id": self.current_alert_id,
+                            "time": (self.alert_start_time + self.wall_clock_offset_ns) / 1e9,
                             "alert_number": self.alert_count,
-                            "alert_start_time": self.alert_start_time.strftime("%Y/%m/%d %H:%M:%S"),
+                            "alert_start_time": self.format_time(self.alert_start_time),
                             "alert_type": new_alert_type,
+                            "driver_id": self.driver_id,
                             "alert_severity": alert_severity,
                             "video_link": f"file://{os.path.abspath(self.current_video_filename) if self.current_video_filename else ''}",
                             "direction": direction_text,
@@ -275,9 +338,8 @@ class AlertHandler:
                             "blink_rate": blink_rate,
                             "blink_duration": self.blink_duration if new_alert_type == "long_blink" else None
                         }
-                        self.log_data.append(log_entry)
+                        self.append_event(log_entry)
                         logging.info(f"Alert #{self.alert_count}: {new_alert_type}, Severity: {alert_severity}, Blink Rate: {blink_rate}")
-                        self.schedule_save_log()
 
                         # مدیریت پخش صدا
                         if (self.sound_enabled and self.alarm_sound and self.alarm_channel and 
@@ -294,12 +356,6 @@ class AlertHandler:
                                 self.parent.show_warning(f"Error playing alarm: {e}")
                                 self.alarm_playing = False
 
-                        if not self.recording and new_alert_type not in ["no_face", "blink_anomaly"]:
-                            self.current_video_filename = os.path.join(ALERT_FOLDER, f"alert_{self.alert_start_time.strftime('%Y%m%d_%H%M%S')}.mp4")
-                            self.video_writer = cv2.VideoWriter(self.current_video_filename, FOURCC, FPS, (self.parent.frame_processor.frame_width, self.parent.frame_processor.frame_height))
-                            self.recording = True
-                        if self.recording and new_alert_type != "no_face":
-                            self.video_writer.write(frame)
                     self.is_grace_period = False
                     self.pending_alert_type = None
 
@@ -318,14 +374,21 @@ class AlertHandler:
                 if not new_alert_type and (self.alert_triggered or self.is_grace_period):
                     if self.alert_triggered:
                         alert_end_time = current_time
-                        alert_duration = (alert_end_time - self.alert_start_time).total_seconds()
-                        self.log_data[-1]["alert_end_time"] = alert_end_time.strftime("%Y/%m/%d %H:%M:%S")
-                        self.log_data[-1]["alert_duration"] = alert_duration
+                        alert_duration = (alert_end_time - self.alert_start_time) / 1e9
+                        self.append_event({
+                            "event": "alert_end",
+                            "alert_id": self.current_alert_id,
+                            "time": (alert_end_time + self.wall_clock_offset_ns) / 1e9,
+                            "alert_number": self.alert_count,
+                            "alert_type": self.current_alert_type,
+                            "driver_id": self.driver_id,
+                            "alert_end_time": self.format_time(alert_end_time),
+                            "alert_duration": alert_duration
+                        })
                         logging.info(f"Alert #{self.alert_count} ended. Type: {self.current_alert_type}, Duration: {alert_duration}s")
-                        self.schedule_save_log()
                     self.reset_alert_state()
                     if self.recording:
-                        self.video_writer.release()
+                        self.clip_recorder.finish(current_time)
                         self.recording = False
 
         except Exception as e:
@@ -366,7 +429,12 @@ class AlertHandler:
 
     def save_config(self):
         try:
-            config = {
+            # کلیدهایی که این پنجره مدیریت نمی‌کند (مثل تنظیمات پردازش فریم) حفظ می‌شوند
+            config = {}
+            if os.path.exists(CONFIG_FILE):
+                with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+            config.update({
                 "language": self.parent.language,
                 "theme": self.parent.theme,
                 "ear_threshold": int(self.parent.EYE_AR_THRESH * 100),
@@ -375,8 +443,9 @@ class AlertHandler:
                 "pitch_tilt": self.parent.HEAD_PITCH_THRESH,
                 "volume": int(self.alarm_sound.get_volume() * 100) if self.alarm_sound else 50,
                 "sound_alert": self.sound_enabled,
-                "sensitivity_mode": self.sensitivity_mode
-            }
+                "sensitivity_mode": self.sensitivity_mode,
+                "denoise_mode": self.parent.frame_processor.configured_denoise_mode if self.parent.frame_processor else DENOISE_MODE
+            })
             with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
                 json.dump(config, f, ensure_ascii=False, indent=4)
             logging.info("Configuration saved successfully.")
@@ -385,9 +454,11 @@ class AlertHandler:
 
     def cleanup(self):
         try:
-            if self.recording and self.video_writer:
-                self.video_writer.release()
+            if self.clip_recorder:
+                self.clip_recorder.close()
                 self.recording = False
+            if self.clip_maintenance:
+                self.clip_maintenance.close()
             if self.alarm_playing and self.alarm_channel:
                 try:
                     self.alarm_channel.stop()
@@ -396,29 +467,16 @@ class AlertHandler:
                 except Exception as e:
                     logging.error(f"Error stopping alarm during cleanup: {e}")
                     self.parent.show_warning(f"Error stopping alarm during cleanup: {e}")
-            try:
-                pygame.mixer.quit()  # خاتمه کامل میکسر صوتی
-                logging.debug("Pygame mixer quit during cleanup")
-            except Exception as e:
-                logging.error(f"Error quitting pygame mixer: {e}")
-
-            def shutdown_loop():
+            if self.mixer_acquired:
                 try:
-                    self.async_loop.stop()
-                    self.async_loop.run_until_complete(self.async_loop.shutdown_asyncgens())
-                    self.async_loop.close()
-                    logging.debug("Async loop shut down successfully")
+                    self.mixer_acquired = False
+                    release_mixer()
                 except Exception as e:
-                    logging.error(f"Error shutting down async loop: {e}")
+                    logging.error(f"Error quitting pygame mixer: {e}")
 
-            self.async_loop.call_soon_threadsafe(shutdown_loop)
-            self.save_config()
-            log_filename = os.path.join(ALERT_FOLDER, "alerts_log.json")
-            try:
-                with open(log_filename, mode='w', encoding='utf-8') as file:
-                    json.dump(self.log_data, file, ensure_ascii=False, indent=4)
-                logging.info(f"Final log file saved at {os.path.abspath(log_filename)}")
-            except Exception as e:
-                logging.error(f"Error saving log file: {e}")
+            if self.persist_config:
+                self.save_config()
+            if self.event_store:
+                self.event_store.close()
         except Exception as e:
             logging.error(f"Error cleaning up alert handler: {e}")
\ No newline at end of file
@@ -0,0 +1,269 @@
+# alert_report.py
+import os
+import sys
+import json
+import math
+import logging
+import argparse
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from src.event_store import segment_files, iter_records
+from src.constants import EVENT_INDEX_FILE, LEGACY_ALERT_LOG, REPORT_HISTOGRAM_GROWTH, REPORT_HISTOGRAM_MIN, REPORT_PERCENTILES
+
+# Duration histogram with logarithmic bins (each bin REPORT_HISTOGRAM_GROWTH times wider than the last),
+# so percentiles have a bounded relative error, memory stays at a few hundred bins whatever the count,
+# and histograms from different files merge by adding their bins.
+class LogHistogram:
+    def __init__(self):
+        self.bins = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def bin_of(value):
+        if value <= REPORT_HISTOGRAM_MIN:
+            return 0
+        return int(math.log(value / REPORT_HISTOGRAM_MIN) / math.log(REPORT_HISTOGRAM_GROWTH)) + 1
+
+    @staticmethod
+    def bin_value(index):
+        if index == 0:
+            return REPORT_HISTOGRAM_MIN
+        # geometric middle of the bin
+        return REPORT_HISTOGRAM_MIN * REPORT_HISTOGRAM_GROWTH ** (index - 0.5)
+
+    def add(self, value):
+        self.bins[self.bin_of(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        self.bins.update(other.bins)
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentile(self, q):
+        if not self.count:
+            return None
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen >= rank:
+                return min(max(self.bin_value(index), self.min), self.max)
+        return self.max
+
+    def summary(self):
+        result = {"count": self.count, "mean": self.total / self.count if self.count else None, "min": self.min, "max": self.max}
+        for q in REPORT_PERCENTILES:
+            result[f"p{q}"] = self.percentile(q)
+        return result
+
+# Running sums over the fields of alert start records
+class FieldStats:
+    def __init__(self):
+        self.count = 0
+        self.sums = Counter()
+
+    def add(self, record):
+        self.count += 1
+        for key in ("brightness", "blink_rate"):
+            value = record.get(key)
+            if isinstance(value, (int, float)):
+                self.sums[key] += value
+        for key, value in (record.get("consecutive_frames") or {}).items():
+            if isinstance(value, (int, float)):
+                self.sums[f"consecutive_frames.{key}"] += value
+
+    def merge(self, other):
+        self.count += other.count
+        self.sums.update(other.sums)
+
+    def means(self):
+        return {key: value / self.count for key, value in sorted(self.sums.items())} if self.count else {}
+
+class Group:
+    def __init__(self):
+        self.alerts = 0
+        self.types = Counter()
+        self.severities = Counter()
+        self.durations = LogHistogram()
+
+    def add_start(self, record):
+        self.alerts += 1
+        self.types[record.get("alert_type") or "unknown"] += 1
+        self.severities[record.get("alert_severity") or "unknown"] += 1
+
+    def merge(self, other):
+        self.alerts += other.alerts
+        self.types.update(other.types)
+        self.severities.update(other.severities)
+        self.durations.merge(other.durations)
+
+    def summary(self):
+        return {"alerts": self.alerts, "types": dict(self.types.most_common()), "severities": dict(self.severities.most_common()), "duration_s": self.durations.summary()}
+
+# Mergeable aggregates over any number of alert records; nothing per record is kept.
+class AlertSummary:
+    def __init__(self):
+        self.records = 0
+        self.malformed = 0
+        self.files = 0
+        self.overall = Group()
+        self.by_day = defaultdict(Group)
+        self.by_driver = defaultdict(Group)
+        self.by_type_duration = defaultdict(LogHistogram)
+        self.sensitivity_modes = Counter()
+        self.hours = [0] * 24
+        self.fields = FieldStats()
+
+    def add(self, record):
+        self.records += 1
+        event = record.get("event", "alert")
+        driver = record.get("driver_id") or "unknown"
+        if event in ("alert_start", "alert"):
+            # alert_start_time is the Jalali local time "YYYY/MM/DD HH:MM:SS"
+            start = record.get("alert_start_time") or ""
+            day = start[:10] or "unknown"
+            self.overall.add_start(record)
+            self.by_day[day].add_start(record)
+            self.by_driver[driver].add_start(record)
+            self.sensitivity_modes[record.get("sensitivity_mode") or "unknown"] += 1
+            if start[11:13].isdigit():
+                self.hours[int(start[11:13]) % 24] += 1
+            self.fields.add(record)
+        if event in ("alert_end", "alert"):
+            duration = record.get("alert_duration")
+            if isinstance(duration, (int, float)):
+                self.overall.durations.add(duration)
+                self.by_driver[driver].durations.add(duration)
+                self.by_type_duration[record.get("alert_type") or "unknown"].add(duration)
+                end = record.get("alert_end_time") or record.get("alert_start_time") or ""
+                self.by_day[end[:10] or "unknown"].durations.add(duration)
+
+    def merge(self, other):
+        self.records += other.records
+        self.malformed += other.malformed
+        self.files += other.files
+        self.overall.merge(other.overall)
+        for key, group in other.by_day.items():
+            self.by_day[key].merge(group)
+        for key, group in other.by_driver.items():
+            self.by_driver[key].merge(group)
+        for key, histogram in other.by_type_duration.items():
+            self.by_type_duration[key].merge(histogram)
+        self.sensitivity_modes.update(other.sensitivity_modes)
+        self.hours = [a + b for a, b in zip(self.hours, other.hours)]
+        self.fields.merge(other.fields)
+
+    def to_dict(self):
+        return {
+            "files": self.files,
+            "records": self.records,
+            "malformed_files": self.malformed,
+            "overall": self.overall.summary(),
+            "by_day": {day: group.summary() for day, group in sorted(self.by_day.items())},
+            "by_driver": {driver: group.summary() for driver, group in sorted(self.by_driver.items())},
+            "duration_by_type_s": {alert_type: histogram.summary() for alert_type, histogram in sorted(self.by_type_duration.items())},
+            "hour_of_day": self.hours,
+            "sensitivity_modes": dict(self.sensitivity_modes.most_common()),
+            "field_means": self.fields.means()
+        }
+
+# Runs in a worker process: one file in, one small summary out.
+def summarize_file(path):
+    summary = AlertSummary()
+    summary.files = 1
+    try:
+        if path.endswith(".jsonl"):
+            for record in iter_records(path):
+                summary.add(record)
+        else:
+            # لاگ‌های قدیمی یک فهرست JSON کامل هستند
+            with open(path, 'r', encoding='utf-8') as f:
+                for entry in json.load(f):
+                    summary.add(entry)
+    except Exception as e:
+        logging.error(f"Error reading alert log {path}: {e}")
+        summary.malformed += 1
+    return summary
+
+# Event-store segments and single-file logs of earlier versions under each path, in order
+def find_log_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+            continue
+        for root, _, names in os.walk(path):
+            if EVENT_INDEX_FILE in names or any(name.endswith(".jsonl") for name in names):
+                files.extend(segment_files(root))
+            # logs already imported into an event store are renamed to .imported and skipped here
+            for name in sorted(names):
+                if name == LEGACY_ALERT_LOG or name.endswith("_alerts.json"):
+                    files.append(os.path.join(root, name))
+    return list(dict.fromkeys(files))
+
+def build_report(paths, workers=None):
+    files = find_log_files(paths)
+    total = AlertSummary()
+    workers = max(1, min(workers or os.cpu_count() or 1, len(files) or 1))
+    if workers == 1:
+        for path in files:
+            total.merge(summarize_file(path))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # chunksize keeps IPC per file low for thousands of small segments
+            for summary in executor.map(summarize_file, files, chunksize=max(1, len(files) // (workers * 4))):
+                total.merge(summary)
+    return total
+
+def format_seconds(value):
+    return "-" if value is None else f"{value:.1f}"
+
+def print_report(report):
+    overall = report["overall"]
+    durations = overall["duration_s"]
+    print(f"{report['files']} file(s), {report['records']} record(s), {overall['alerts']} alert(s)")
+    print(f"duration s: p50 {format_seconds(durations['p50'])}  p90 {format_seconds(durations['p90'])}  p95 {format_seconds(durations['p95'])}  p99 {format_seconds(durations['p99'])}  max {format_seconds(durations['max'])}")
+    print("\nseverity: " + ", ".join(f"{key} {value}" for key, value in overall["severities"].items()))
+    print("types: " + ", ".join(f"{key} {value}" for key, value in overall["types"].items()))
+
+    print(f"\n{'day':<12}{'alerts':>8}{'p50 s':>9}{'p95 s':>9}")
+    for day, group in report["by_day"].items():
+        print(f"{day:<12}{group['alerts']:>8}{format_seconds(group['duration_s']['p50']):>9}{format_seconds(group['duration_s']['p95']):>9}")
+
+    print(f"\n{'driver':<20}{'alerts':>8}{'p50 s':>9}{'p95 s':>9}  top type")
+    for driver, group in report["by_driver"].items():
+        top = next(iter(group["types"]), "-")
+        print(f"{driver:<20}{group['alerts']:>8}{format_seconds(group['duration_s']['p50']):>9}{format_seconds(group['duration_s']['p95']):>9}  {top}")
+
+    print("\nhour of day:")
+    peak = max(report["hour_of_day"]) or 1
+    for hour, count in enumerate(report["hour_of_day"]):
+        print(f"{hour:02d} {'#' * round(40 * count / peak):<40} {count}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate alert history from event stores and alert logs")
+    parser.add_argument("paths", nargs="+", help="alert folders, event-store folders or log files")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--json", help="write the full report to this JSON file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    report = build_report(args.paths, args.workers).to_dict()
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,28 @@
 # app.py
+import time
 import logging
-from PyQt6.QtWidgets import QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QPushButton, QSizePolicy, QMessageBox
-from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtGui import QFont, QImage, QPixmap
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QPushButton, QMessageBox
+from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtGui import QFont, QKeySequence, QShortcut
 from src.settings import SettingsDialog
-from src.frame_processor import FrameProcessor
-from src.alert_handler import AlertHandler
+from src.pipeline import DetectionWorker, LatestResultQueue
+from src.display_sink import DisplaySink
+from src.view_model import StatsViewModel
 from src.utils import get_texts
-from src.constants import FRAME_WIDTH, FRAME_HEIGHT, EYE_AR_THRESH, EYE_AR_CONSEC_FRAMES, HEAD_ROLL_THRESH, HEAD_PITCH_THRESH, ALERT_MIN_DURATION, ALERT_COOLDOWN
+from src.constants import FRAME_WIDTH, FRAME_HEIGHT, EYE_AR_THRESH, EYE_AR_CONSEC_FRAMES, HEAD_ROLL_THRESH, HEAD_PITCH_THRESH, ALERT_MIN_DURATION, ALERT_COOLDOWN, STARTUP_JOIN_TIMEOUT
 
 class DrowsinessApp(QMainWindow):
-    def __init__(self):
+    result_ready = pyqtSignal()
+    warning_requested = pyqtSignal(str)
+    modules_loaded = pyqtSignal(str)  # start-up error, empty on success
+
+    # started_ns: time.monotonic_ns() when the process started, for the start-up metrics
+    def __init__(self, multiprocess=False, started_ns=None):
         super().__init__()
+        self.started_ns = started_ns or time.monotonic_ns()
+        self.startup_ms = {}
         self.language = "fa"
         self.theme = "dark"
         self.texts = get_texts()
@@ -38,12 +49,14 @@ class DrowsinessApp(QMainWindow):
         self.pitch_dir = ""
         self.alert_severity = "none"
         self.brightness = 0.0
-        self.animation_frame = 0
         self.pending_alert_message = None
 
-        # Initialize modules
-        self.frame_processor = FrameProcessor(self)
-        self.alert_handler = AlertHandler(self)
+        # Created by load_modules after the window is shown
+        self.frame_processor = None
+        self.alert_handler = None
+        self.detection_worker = None
+        self.closing = False
+        self.startup_lock = threading.Lock()  # modules loaded after closing are released by the start-up thread
 
         # Setup UI
         self.central_widget = QWidget()
@@ -57,11 +70,8 @@ class DrowsinessApp(QMainWindow):
         self.video_container = QWidget()
         self.video_container.setObjectName("videoFrame")
         self.video_layout = QVBoxLayout(self.video_container)
-        self.video_label = QLabel()
-        self.video_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.video_label.setScaledContents(True)
-        self.video_label.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
-        self.video_layout.addWidget(self.video_label)
+        self.video_sink = DisplaySink()
+        self.video_layout.addWidget(self.video_sink)
         self.main_layout.addWidget(self.video_container, stretch=3)
 
         # Info container
@@ -89,6 +99,7 @@ class DrowsinessApp(QMainWindow):
         """)
         self.settings_btn.setLayoutDirection(Qt.LayoutDirection.RightToLeft if self.language == "fa" else Qt.LayoutDirection.LeftToRight)
         self.settings_btn.clicked.connect(self.open_settings)
+        self.settings_btn.setEnabled(False)  # until the alert handler is loaded
         self.info_layout.addWidget(self.settings_btn)
 
         # Main tab
@@ -98,7 +109,7 @@ class DrowsinessApp(QMainWindow):
         self.main_tab_layout.setSpacing(20)
         self.main_tab_layout.setContentsMargins(15, 15, 15, 15)
 
-        self.alert_label = QLabel(self.texts[self.language]["alert_count"].format(self.alert_handler.alert_count))
+        self.alert_label = QLabel(self.texts[self.language]["alert_count"].format(0))
         self.ear_label = QLabel(self.texts[self.language]["ear_ratio"].format(0.00))
         self.tilt_label = QLabel(self.texts[self.language]["tilt_info"].format(0.00, 0.00))
         self.direction_label = QLabel(self.texts[self.language]["direction"].format("---"))
@@ -177,18 +188,117 @@ class DrowsinessApp(QMainWindow):
         """)
 
         self.info_layout.addWidget(self.main_tab)
+        self.stats_view = StatsViewModel(self)
         self.main_layout.addWidget(self.info_container, stretch=1)
 
         self.update_theme()
 
-        # Start frame processing timer
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_frame)
-        self.timer.start(15)
+        # Dump the stage-timing ring buffer as a Chrome trace on demand
+        self.trace_shortcut = QShortcut(QKeySequence("Ctrl+Shift+T"), self)
+        self.trace_shortcut.activated.connect(self.export_trace)
+
+        self.warning_requested.connect(self.show_warning)
+        self.result_queue = LatestResultQueue()
+        self.result_ready.connect(self.update_frame)
+        self.modules_loaded.connect(self.start_detection)
+        # بدون پنجره‌ی قابل مشاهده، هم‌پوشانی تصویر رسم نمی‌شود
+        self.video_sink.on_active_changed = self.set_rendering
+
+        # پنجره بلافاصله نمایش داده می‌شود؛ دوربین، مدل، صدا و سخت‌افزار در پس‌زمینه آماده می‌شوند
+        self.startup_thread = threading.Thread(target=self.load_modules, args=(multiprocess,), name="Startup", daemon=True)
+        self.startup_thread.start()
+
+    def mark_startup(self, milestone):
+        if milestone not in self.startup_ms:
+            self.startup_ms[milestone] = (time.monotonic_ns() - self.started_ns) / 1e6
+            logging.info(f"Startup: {milestone} after {self.startup_ms[milestone]:.0f} ms")
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.mark_startup("window shown")
+
+    @staticmethod
+    def create_frame_processor(parent, multiprocess):
+        if multiprocess:
+            from src.shm_pipeline import SharedMemoryFrameProcessor
+            return SharedMemoryFrameProcessor(parent)
+        from src.frame_processor import FrameProcessor
+        return FrameProcessor(parent)
+
+    @staticmethod
+    def create_alert_handler(parent):
+        from src.alert_handler import AlertHandler
+        return AlertHandler(parent)
+
+    # Runs on the start-up thread: the frame processor (camera, FaceMesh, hardware probe) and the alert
+    # handler (alarm sound, event store) are built at the same time, with their modules imported here.
+    def load_modules(self, multiprocess):
+        errors = []
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="Startup") as executor:
+            processor = executor.submit(self.create_frame_processor, self, multiprocess)
+            handler = executor.submit(self.create_alert_handler, self)
+        modules = {}
+        for name, future in (("frame_processor", processor), ("alert_handler", handler)):
+            try:
+                modules[name] = future.result()
+            except Exception as e:
+                logging.error(f"Error initializing {name}: {e}")
+                errors.append(str(e))
+        with self.startup_lock:
+            if self.closing:
+                # the window was closed while loading and cleanup() stopped waiting
+                for module in modules.values():
+                    module.cleanup()
+                return
+            for name, module in modules.items():
+                setattr(self, name, module)
+        self.modules_loaded.emit("; ".join(errors))
+
+    def start_detection(self, error):
+        if self.closing:
+            return
+        if error:
+            QMessageBox.critical(self, "Error" if self.language == "en" else "خطا", error)
+            self.cleanup()
+            QApplication.instance().exit(1)
+            return
+        self.mark_startup("modules loaded")
+        self.video_sink.tracer = self.frame_processor.tracer
+        self.settings_btn.setEnabled(True)
+        # Finished frames arrive through a latest-wins queue
+        self.detection_worker = DetectionWorker(self, self.result_queue, on_result=self.result_ready.emit)
+        self.detection_worker.render = self.video_sink.active
+        self.detection_worker.start()
+
+    def set_rendering(self, active):
+        if self.detection_worker:
+            self.detection_worker.render = active
 
     def show_warning(self, message):
+        # AlertHandler runs on the detection worker; message boxes must be opened on the GUI thread
+        if threading.current_thread() is not threading.main_thread():
+            self.warning_requested.emit(message)
+            return
         QMessageBox.warning(self, "Warning" if self.language == "en" else "هشدار", message)
 
+    def apply_frame_data(self, frame_data):
+        self.left_eye_points = frame_data.left_eye_points
+        self.right_eye_points = frame_data.right_eye_points
+        self.current_roll = frame_data.current_roll
+        self.current_pitch = frame_data.current_pitch
+        self.direction_text = frame_data.direction_text
+        self.roll_dir = frame_data.roll_dir
+        self.pitch_dir = frame_data.pitch_dir
+        self.alert_severity = frame_data.alert_severity
+        self.brightness = frame_data.brightness
+
+    def export_trace(self):
+        if self.frame_processor is None:
+            return
+        path = self.frame_processor.tracer.export_chrome_trace()
+        if path:
+            self.statusBar().showMessage(path, 5000)
+
     def open_settings(self):
         dialog = SettingsDialog(self)
         dialog.exec()
@@ -310,11 +420,14 @@ class DrowsinessApp(QMainWindow):
             self.info_container.setLayoutDirection(direction)
             self.main_tab.setLayoutDirection(direction)
 
-            self.alert_label.setText(self.texts[self.language]["alert_count"].format(self.alert_handler.alert_count))
+            alert_count = self.alert_handler.alert_count if self.alert_handler else 0
+            blink_rate = self.alert_handler.calculate_blink_rate() if self.alert_handler else 0
+            self.alert_label.setText(self.texts[self.language]["alert_count"].format(alert_count))
             self.ear_label.setText(self.texts[self.language]["ear_ratio"].format(0.00))
             self.tilt_label.setText(self.texts[self.language]["tilt_info"].format(0.00, 0.00))
             self.direction_label.setText(self.texts[self.language]["direction"].format("---"))
-            self.blink_rate_label.setText(self.texts[self.language]["blink_rate"].format(self.alert_handler.calculate_blink_rate()))
+            self.blink_rate_label.setText(self.texts[self.language]["blink_rate"].format(blink_rate))
+            self.stats_view.refresh()
 
             labels = [self.alert_label, self.ear_label, self.tilt_label, self.direction_label, self.blink_rate_label]
             for label in labels:
@@ -335,43 +448,41 @@ class DrowsinessApp(QMainWindow):
 
     def update_frame(self):
         try:
-            frame_data = self.frame_processor.process_frame()
-            if frame_data is None:
+            result = self.result_queue.get()
+            if result is None:
                 return
+            if "first processed frame" not in self.startup_ms:
+                self.mark_startup("first processed frame")
+                logging.info(f"Startup metrics (ms): {self.startup_ms}")
 
-            frame, smoothed_ear, current_roll, current_pitch, direction_text, alert_flag, left_eye_points, right_eye_points, roll_dir, pitch_dir, alert_severity, brightness = frame_data
-            self.left_eye_points = left_eye_points
-            self.right_eye_points = right_eye_points
-            self.current_roll = current_roll
-            self.current_pitch = current_pitch
-            self.direction_text = direction_text
-            self.roll_dir = roll_dir
-            self.pitch_dir = pitch_dir
-            self.alert_severity = alert_severity
-            self.brightness = brightness
-
-            self.ear_label.setText(self.texts[self.language]["ear_ratio"].format(smoothed_ear))
-            self.tilt_label.setText(self.texts[self.language]["tilt_info"].format(current_roll, current_pitch))
-            self.direction_label.setText(self.texts[self.language]["direction"].format(direction_text))
-            self.blink_rate_label.setText(self.texts[self.language]["blink_rate"].format(self.alert_handler.calculate_blink_rate()))
-
-            self.alert_handler.handle_alerts(frame, smoothed_ear, current_roll, current_pitch, direction_text, alert_flag, alert_severity, brightness)
-            self.alert_label.setText(self.texts[self.language]["alert_count"].format(self.alert_handler.alert_count))
-
-            final_frame = self.frame_processor.finalize_frame(frame, alert_flag, alert_severity)
-            height, width, channel = final_frame.shape
-            bytes_per_line = 3 * width
-            q_img = QImage(final_frame.data, width, height, bytes_per_line, QImage.Format.Format_RGB888)
-            pixmap = QPixmap.fromImage(q_img).scaled(self.video_label.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.video_label.setPixmap(pixmap)
+            self.stats_view.update(result)
+            self.video_sink.submit(result.frame, result.frame_id)
         except Exception as e:
             logging.error(f"Error updating frame: {e}")
 
+    def cleanup(self):
+        self.closing = True
+        # modules still loading are waited for, so that the camera and threads are released; if they take
+        # longer, the start-up thread releases them itself once they are built
+        self.startup_thread.join(timeout=STARTUP_JOIN_TIMEOUT)
+        if self.startup_thread.is_alive():
+            logging.warning(f"Modules still loading after {STARTUP_JOIN_TIMEOUT:.0f} s; closing without waiting")
+        if self.detection_worker:
+            self.detection_worker.stop()
+        self.video_sink.stop()
+        self.stats_view.stop()
+        with self.startup_lock:
+            frame_processor, alert_handler = self.frame_processor, self.alert_handler
+        if frame_processor:
+            frame_processor.cleanup()
+        if alert_handler:
+            alert_handler.cleanup()
+
     def closeEvent(self, event):
         logging.info("Closing application...")
         try:
-            self.frame_processor.cleanup()
-            self.alert_handler.cleanup()
+            if not self.closing:
+                self.cleanup()
             event.accept()
         except Exception as e:
             logging.error(f"Error during close event: {e}")
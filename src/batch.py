@@ -0,0 +1,134 @@
+# batch.py
+import os
+import json
+import logging
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+from src.frame_processor import FrameProcessor
+from src.alert_handler import AlertHandler
+from src.headless import HeadlessParent
+from src.constants import BATCH_VIDEO_EXTENSIONS, BATCH_OUTPUT_FOLDER
+
+# یک نمونه FaceMesh برای هر پردازه‌ی کارگر
+_worker_face_mesh = None
+
+def init_worker():
+    global _worker_face_mesh
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Parallelism comes from the process pool; keep OpenCV from oversubscribing the cores.
+    cv2.setNumThreads(1)
+    _worker_face_mesh = FrameProcessor.create_face_mesh()
+
+class BatchSession(HeadlessParent):
+    def __init__(self, video_path, output_dir, face_mesh):
+        super().__init__()
+        self.video_path = video_path
+        log_folder = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(video_path))[0]}_alerts")
+        self.frame_processor = FrameProcessor(self, source=None, face_mesh=face_mesh)
+        # Offline runs have no frame deadline, so quality is never traded for speed
+        self.frame_processor.governor = None
+        self.alert_handler = AlertHandler(self, log_folder=log_folder, enable_audio=False, enable_recording=False, persist_config=False)
+
+    def run(self):
+        cap = cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            raise Exception(f"Cannot open video file: {self.video_path}")
+
+        # زمان شروع ضبط تقریباً برابر زمان آخرین تغییر فایل منهای طول ویدیو است
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        total_frames = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0.0
+        duration = total_frames / fps if fps > 0 else 0.0
+        # زمان‌بندی هشدارها بر اساس زمان ویدیو (نانوثانیه از ابتدای فایل)، نه سرعت پردازش
+        self.alert_handler.wall_clock_offset_ns = int((os.path.getmtime(self.video_path) - duration) * 1e9)
+
+        frames = 0
+        start = time.perf_counter()
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                position_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+                if position_ms <= 0 and fps > 0:
+                    position_ms = frames * 1000.0 / fps
+                video_time_ns = int(position_ms * 1e6)
+
+                frame_data = self.frame_processor.analyze_frame(frame, timestamp_ns=video_time_ns)
+                frames += 1
+                if frame_data is None:
+                    continue
+                self.apply_frame_data(frame_data)
+                self.alert_handler.handle_result(frame_data)
+        finally:
+            cap.release()
+            self.frame_processor.cleanup()
+            self.alert_handler.cleanup()
+
+        seconds = time.perf_counter() - start
+        return {
+            "video": self.video_path,
+            "alert_log": self.alert_handler.log_folder,
+            "frames": frames,
+            "alerts": self.alert_handler.alert_count,
+            "seconds": seconds,
+            "fps": frames / seconds if seconds > 0 else 0.0
+        }
+
+def process_video(video_path, output_dir):
+    return BatchSession(video_path, output_dir, _worker_face_mesh).run()
+
+def find_videos(input_dir):
+    videos = []
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if name.lower().endswith(BATCH_VIDEO_EXTENSIONS):
+                videos.append(os.path.join(root, name))
+    return sorted(videos)
+
+def run_batch(input_dir, output_dir=None, workers=None):
+    output_dir = output_dir or BATCH_OUTPUT_FOLDER
+    videos = find_videos(input_dir)
+    if not videos:
+        logging.error(f"No video files found in {input_dir}")
+        return 1
+    os.makedirs(output_dir, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(videos)))
+    logging.info(f"Processing {len(videos)} video(s) with {workers} worker process(es)")
+
+    results = []
+    failed = 0
+    start = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker) as executor:
+        futures = {executor.submit(process_video, video, output_dir): video for video in videos}
+        for future in as_completed(futures):
+            video = futures[future]
+            try:
+                result = future.result()
+                results.append(result)
+                logging.info(f"{video}: {result['frames']} frames, {result['alerts']} alert(s), {result['fps']:.1f} FPS")
+            except Exception as e:
+                failed += 1
+                logging.error(f"Error processing video {video}: {e}")
+
+    elapsed = time.perf_counter() - start
+    total_frames = sum(result["frames"] for result in results)
+    summary = {
+        "videos": len(videos),
+        "failed": failed,
+        "workers": workers,
+        "frames": total_frames,
+        "alerts": sum(result["alerts"] for result in results),
+        "seconds": elapsed,
+        "fps": total_frames / elapsed if elapsed > 0 else 0.0,
+        "results": sorted(results, key=lambda result: result["video"])
+    }
+    try:
+        with open(os.path.join(output_dir, "batch_summary.json"), 'w', encoding='utf-8') as file:
+            json.dump(summary, file, ensure_ascii=False, indent=4)
+    except Exception as e:
+        logging.error(f"Error saving batch summary: {e}")
+    logging.info(f"Batch finished: {total_frames} frames in {elapsed:.1f}s ({summary['fps']:.1f} FPS total), {failed} failed")
+    return 0 if failed == 0 else 1
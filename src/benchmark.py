@@ -0,0 +1,281 @@
+# benchmark.py
+# Per-stage microbenchmarks on generated frames and landmark fixtures; no camera needed.
+#   python -m src.benchmark [--image face.jpg] [--json out.json] [--compare baseline.json]
+#   python -m src.benchmark --record-fixture drive.mp4
+import os
+import sys
+import json
+import time
+import types
+import logging
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import cv2
+import mediapipe as mp
+from src.frame_processor import FrameProcessor
+from src.alert_handler import AlertHandler
+from src.headless import HeadlessParent
+from src.utils import eye_aspect_ratio
+from src.text_sprites import TextSpriteCache
+from src.geometry import face_geometry, batch_geometry
+from src.constants import FRAME_WIDTH, FRAME_HEIGHT, LEFT_EYE_INDICES, RIGHT_EYE_INDICES, BENCHMARK_ITERATIONS, BENCHMARK_WARMUP, BENCHMARK_TIME_BUDGET, BENCHMARK_MIN_SAMPLES, BENCHMARK_ALLOC_SAMPLES, BENCHMARK_BRIGHTNESS_BANDS, BENCHMARK_FIXTURE, DENOISE_MODES
+
+LANDMARK_COUNT = 478
+
+def make_frame(brightness, width=FRAME_WIDTH, height=FRAME_HEIGHT, seed=0):
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(-0.5, 0.5, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0.0, 0.15, (height, width, 3)).astype(np.float32)
+    return np.clip(brightness * (1.0 + gradient + noise), 0, 255).astype(np.uint8)
+
+def make_landmarks(open_ratio=0.3, seed=1):
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0.0, 2.0 * np.pi, LANDMARK_COUNT, endpoint=False)
+    points = np.empty((LANDMARK_COUNT, 3), dtype=np.float32)
+    points[:, 0] = 0.5 + 0.18 * np.cos(angles)
+    points[:, 1] = 0.5 + 0.24 * np.sin(angles)
+    points[:, 2] = rng.normal(0.0, 0.02, LANDMARK_COUNT)
+
+    # ترتیب نقاط مطابق eye_aspect_ratio: گوشه، بالا، بالا، گوشه، پایین، پایین
+    def place_eye(indices, center_x, center_y, width):
+        height = width * open_ratio
+        offsets = [(-width / 2, 0), (-width / 6, -height / 2), (width / 6, -height / 2), (width / 2, 0), (width / 6, height / 2), (-width / 6, height / 2)]
+        for idx, (dx, dy) in zip(indices, offsets):
+            points[idx, :2] = (center_x + dx, center_y + dy)
+
+    place_eye(LEFT_EYE_INDICES, 0.42, 0.45, 0.08)
+    place_eye(RIGHT_EYE_INDICES, 0.58, 0.45, 0.08)
+    points[1, :2] = (0.5, 0.56)
+    return points
+
+def load_landmark_fixture(path=BENCHMARK_FIXTURE):
+    if os.path.exists(path):
+        with np.load(path) as data:
+            return data["landmarks"].astype(np.float32)
+    logging.warning(f"Landmark fixture {path} not found; using synthetic landmarks")
+    return np.stack([make_landmarks(0.3), make_landmarks(0.08)])
+
+def as_face_landmarks(points):
+    return types.SimpleNamespace(landmark=[types.SimpleNamespace(x=float(x), y=float(y), z=float(z)) for x, y, z in points])
+
+# Replays fixture landmarks in place of mediapipe so the downstream stages see realistic input.
+class FixtureFaceMesh:
+    def __init__(self, fixtures):
+        self.results = [types.SimpleNamespace(multi_face_landmarks=[as_face_landmarks(points)]) for points in fixtures]
+        self.index = 0
+
+    def process(self, image):
+        result = self.results[self.index % len(self.results)]
+        self.index += 1
+        return result
+
+    def close(self):
+        pass
+
+def record_landmark_fixture(video_path, output=BENCHMARK_FIXTURE, limit=300):
+    face_mesh = FrameProcessor.create_face_mesh()
+    cap = cv2.VideoCapture(video_path)
+    landmarks = []
+    try:
+        while len(landmarks) < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame = cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT))
+            results = face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            if results.multi_face_landmarks:
+                landmarks.append([(lm.x, lm.y, lm.z) for lm in results.multi_face_landmarks[0].landmark])
+    finally:
+        cap.release()
+        face_mesh.close()
+    if not landmarks:
+        logging.error(f"No faces found in {video_path}; fixture not written")
+        return 1
+    np.savez_compressed(output, landmarks=np.array(landmarks, dtype=np.float32))
+    logging.warning(f"Saved {len(landmarks)} landmark sets to {output}")
+    return 0
+
+class BenchmarkParent(HeadlessParent):
+    def __init__(self, fixtures, log_dir):
+        super().__init__()
+        self.frame_processor = FrameProcessor(self, source=None, face_mesh=FixtureFaceMesh(fixtures))
+        self.frame_processor.governor = None  # fixed settings so runs are comparable
+        self.alert_handler = AlertHandler(self, log_folder=os.path.join(log_dir, "events"), enable_audio=False, enable_recording=False, persist_config=False)
+
+def measure(stage, func, iterations=BENCHMARK_ITERATIONS, warmup=BENCHMARK_WARMUP, time_budget=BENCHMARK_TIME_BUDGET):
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - t0)
+        if i + 1 >= BENCHMARK_MIN_SAMPLES and time.perf_counter() - start > time_budget:
+            break
+
+    # بیشینه‌ی حافظه‌ی تخصیص‌یافته در هر فراخوانی (numpy نیز در tracemalloc ثبت می‌شود)
+    allocations = []
+    tracemalloc.start()
+    try:
+        for _ in range(min(len(samples), BENCHMARK_ALLOC_SAMPLES)):
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+            allocations.append(peak - baseline)
+    finally:
+        tracemalloc.stop()
+
+    times_ms = np.array(samples, dtype=np.float64) / 1e6
+    return {
+        "stage": stage,
+        "samples": len(samples),
+        "mean_ms": float(times_ms.mean()),
+        "p50_ms": float(np.percentile(times_ms, 50)),
+        "p95_ms": float(np.percentile(times_ms, 95)),
+        "p99_ms": float(np.percentile(times_ms, 99)),
+        "alloc_kib": float(np.median(allocations)) / 1024.0 if allocations else 0.0
+    }
+
+def cycle(items):
+    state = {"index": 0}
+    def next_item():
+        item = items[state["index"] % len(items)]
+        state["index"] += 1
+        return item
+    return next_item
+
+def run_benchmarks(image_path=None, fixture_path=BENCHMARK_FIXTURE, stages=None):
+    fixtures = load_landmark_fixture(fixture_path)
+    log_dir = tempfile.mkdtemp(prefix="drowsiness_bench_")
+    parent = BenchmarkParent(fixtures, log_dir)
+    processor = parent.frame_processor
+    handler = parent.alert_handler
+    results = []
+
+    def run(stage, func):
+        if stages and not any(stage.startswith(name) for name in stages):
+            return
+        results.append(measure(stage, func))
+        print(f"  {stage:<34} p50 {results[-1]['p50_ms']:9.3f} ms", file=sys.stderr)
+
+    try:
+        image = cv2.imread(image_path) if image_path else None
+        if image_path and image is None:
+            logging.error(f"Cannot read image {image_path}; using generated frames")
+
+        for band, brightness in BENCHMARK_BRIGHTNESS_BANDS.items():
+            band_frame = make_frame(brightness)
+            run(f"enhance_frame[{band}]", lambda band_frame=band_frame: processor.enhance_frame(band_frame))
+
+        faces = [as_face_landmarks(points) for points in fixtures]
+        dark_frame = make_frame(BENCHMARK_BRIGHTNESS_BANDS["dark"])
+        first_face = face_geometry(faces[0], FRAME_WIDTH, FRAME_HEIGHT)
+        processor.update_denoise_roi(first_face.left_eye_points, first_face.right_eye_points)
+        default_mode = processor.denoise_mode
+        for mode in DENOISE_MODES:
+            processor.set_denoise_mode(mode)
+            run(f"denoise[{mode}]", lambda: processor.denoise(dark_frame.copy()))
+        processor.set_denoise_mode(default_mode)
+
+        face_frame = cv2.resize(image, (FRAME_WIDTH, FRAME_HEIGHT)) if image is not None else make_frame(BENCHMARK_BRIGHTNESS_BANDS["normal"])
+        try:
+            face_mesh = FrameProcessor.create_face_mesh()
+            rgb_face = cv2.cvtColor(face_frame, cv2.COLOR_BGR2RGB)
+            run("face_mesh.process", lambda: face_mesh.process(rgb_face))
+            face_mesh.close()
+        except Exception as e:
+            logging.warning(f"Skipping face_mesh.process benchmark: {e}")
+
+        # landmark extraction (eye points, EAR inputs, head pose) is done by geometry.face_geometry
+        next_face = cycle(faces)
+        run("landmark_extraction[face]", lambda: face_geometry(next_face(), FRAME_WIDTH, FRAME_HEIGHT))
+        run(f"landmark_extraction[batch x{len(fixtures)}]", lambda: batch_geometry(fixtures, FRAME_WIDTH, FRAME_HEIGHT))
+
+        eye_sets = [face_geometry(face, FRAME_WIDTH, FRAME_HEIGHT).left_eye_points for face in faces]
+        next_eye = cycle(eye_sets)
+        run("utils.eye_aspect_ratio", lambda: eye_aspect_ratio(next_eye()))
+
+        processor.roi_tracking = False
+        run("analyze_frame[fixture, no inference]", lambda: processor.analyze_frame(face_frame.copy()))
+        processor.roi_tracking = True
+        run("analyze_frame[fixture, face roi]", lambda: processor.analyze_frame(face_frame.copy()))
+        processor.keyframe_tracking = True
+        run("analyze_frame[fixture, keyframes]", lambda: processor.analyze_frame(face_frame.copy()))
+        processor.keyframe_tracking = False
+
+        parent.left_eye_points = first_face.left_eye_points
+        parent.right_eye_points = first_face.right_eye_points
+        run("finalize_frame[idle]", lambda: processor.finalize_frame(face_frame, False, "none"))
+        parent.pending_alert_message = parent.texts[parent.language]["alert_message_sleep"]
+        # closed eyes, so the alert text is rendered whatever the analyze stages left in the filter
+        processor.kalman_ear = 0.05
+        run("finalize_frame[alert]", lambda: processor.finalize_frame(face_frame, True, "moderate"))
+        parent.pending_alert_message = None
+
+        rgb_frame = cv2.cvtColor(face_frame, cv2.COLOR_BGR2RGB)
+        message = parent.texts[parent.language]["alert_message_sleep"]
+        # the animated alert text is drawn from cached sprites: rendered once per message, blended every frame
+        sprites = TextSpriteCache()
+        run("render_animated_text[render]", lambda: sprites.render(message, parent.language))
+        elapsed = cycle([i / 30.0 for i in range(120)])
+        run("render_animated_text[draw]", lambda: sprites.draw(rgb_frame, message, parent.language, elapsed()))
+
+        # چشم‌های باز با بسته شدن‌های دوره‌ای تا ماشین حالت هشدار درگیر شود
+        alert_inputs = [(0.08 if i % 40 < 12 else 0.30, 3.0 * np.sin(i / 9.0), 5.0 * np.cos(i / 13.0)) for i in range(400)]
+        next_alert_input = cycle(alert_inputs)
+        def handle_alerts():
+            ear, roll, pitch = next_alert_input()
+            handler.handle_alerts(face_frame, ear, roll, pitch, "---", ear < 0.14, "moderate" if ear < 0.14 else "none", 120.0)
+        run("AlertHandler.handle_alerts", handle_alerts)
+    finally:
+        processor.cleanup()
+        handler.cleanup()
+    return results
+
+def print_report(results, baseline=None):
+    baseline_by_stage = {result["stage"]: result for result in baseline or []}
+    header = f"{'stage':<36}{'n':>6}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'alloc KiB':>12}"
+    if baseline_by_stage:
+        header += f"{'Δp50':>10}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        line = f"{result['stage']:<36}{result['samples']:>6}{result['p50_ms']:>11.3f}{result['p95_ms']:>11.3f}{result['p99_ms']:>11.3f}{result['alloc_kib']:>12.1f}"
+        previous = baseline_by_stage.get(result["stage"])
+        if previous and previous["p50_ms"] > 0:
+            line += f"{(result['p50_ms'] / previous['p50_ms'] - 1.0) * 100:>+9.1f}%"
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage microbenchmarks for the detection pipeline")
+    parser.add_argument("--image", help="face image for enhance/FaceMesh stages (default: generated frames)")
+    parser.add_argument("--fixture", default=BENCHMARK_FIXTURE, help="landmark fixture (.npz with a 'landmarks' array)")
+    parser.add_argument("--stage", action="append", help="only run stages whose name starts with this prefix")
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --json run")
+    parser.add_argument("--record-fixture", metavar="VIDEO", help="record real FaceMesh landmarks from VIDEO into --fixture and exit")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.record_fixture:
+        return record_landmark_fixture(args.record_fixture, args.fixture)
+
+    results = run_benchmarks(args.image, args.fixture, args.stage)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+    print_report(results, baseline)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"opencv": cv2.__version__, "mediapipe": getattr(mp, "__version__", "unknown"), "numpy": np.__version__, "results": results}, f, indent=4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
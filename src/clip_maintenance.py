@@ -0,0 +1,195 @@
+# clip_maintenance.py
+import os
+import json
+import time
+import shutil
+import logging
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from src.event_store import segment_files, iter_records
+from src.constants import EVENT_INDEX_FILE, CLIP_DISK_QUOTA, CLIP_PROTECT_SECONDS, CLIP_VIDEO_CODEC, CLIP_VIDEO_BITRATE, CLIP_THUMBNAIL_WIDTH, CLIP_PROCESS_NICE, CLIP_PARTIAL_SUFFIX
+
+def init_worker():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(processName)s - %(message)s')
+    # کار نگهداری نباید با تشخیص خواب‌آلودگی برای CPU رقابت کند
+    try:
+        os.nice(CLIP_PROCESS_NICE)
+    except (AttributeError, OSError) as e:
+        logging.warning(f"Could not lower clip worker priority: {e}")
+    cv2.setNumThreads(1)
+
+# Re-encodes with ffmpeg at the configured codec and bitrate; returns False if ffmpeg is unavailable or fails
+# (the clip is then kept as recorded).
+def reencode_clip(path, codec, bitrate):
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return False
+    temp_path = path + CLIP_PARTIAL_SUFFIX
+    command = [ffmpeg, "-y", "-loglevel", "error", "-i", path, "-an", "-c:v", codec, "-b:v", bitrate, "-preset", "veryfast", "-threads", "1", "-movflags", "+faststart", "-f", "mp4", temp_path]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0 or not os.path.exists(temp_path):
+        logging.error(f"Error re-encoding clip {path}: {result.stderr.strip()}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+    os.replace(temp_path, path)
+    return True
+
+def clip_sidecars(path):
+    base = os.path.splitext(path)[0]
+    return [base + ".jpg", base + ".json"]
+
+# Runs in the worker process: re-encode, thumbnail and index file for one finished clip.
+def process_clip(path, codec=CLIP_VIDEO_CODEC, bitrate=CLIP_VIDEO_BITRATE):
+    try:
+        recorded_bytes = os.path.getsize(path)
+        reencoded = reencode_clip(path, codec, bitrate)
+        cap = cv2.VideoCapture(path)
+        try:
+            frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0)
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0)
+            # تصویر بندانگشتی از فریم میانه‌ی کلیپ
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frames // 2)
+            ret, frame = cap.read()
+        finally:
+            cap.release()
+        thumbnail_path, index_path = clip_sidecars(path)
+        if ret:
+            scale = CLIP_THUMBNAIL_WIDTH / frame.shape[1]
+            thumbnail = cv2.resize(frame, (CLIP_THUMBNAIL_WIDTH, max(1, round(frame.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+            cv2.imwrite(thumbnail_path, thumbnail)
+        index = {
+            "clip": os.path.basename(path),
+            "thumbnail": os.path.basename(thumbnail_path) if ret else None,
+            "frames": frames,
+            "fps": fps,
+            "duration": frames / fps if fps > 0 else None,
+            "width": width,
+            "height": height,
+            "recorded_bytes": recorded_bytes,
+            "bytes": os.path.getsize(path),
+            "codec": codec if reencoded else "recorded",
+            "bitrate": bitrate if reencoded else None,
+            "processed_time": time.time()
+        }
+        temp_path = index_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=4)
+        os.replace(temp_path, index_path)
+        logging.info(f"Processed clip {path}: {recorded_bytes / 1024:.0f} KiB -> {index['bytes'] / 1024:.0f} KiB")
+    except Exception as e:
+        logging.error(f"Error processing clip {path}: {e}")
+
+# Clip files referenced by video_link in event records newer than protect_seconds.
+def linked_clips(log_folder, protect_seconds):
+    linked = set()
+    if not log_folder or not os.path.isdir(log_folder):
+        return linked
+    cutoff = time.time() - protect_seconds
+    segments = {}
+    try:
+        with open(os.path.join(log_folder, EVENT_INDEX_FILE), 'r', encoding='utf-8') as f:
+            segments = {segment["file"]: segment for segment in json.load(f)["segments"]}
+    except Exception as e:
+        logging.warning(f"Event index unavailable, scanning every segment: {e}")
+    for path in segment_files(log_folder):
+        last_time = segments.get(os.path.basename(path), {}).get("last_time")
+        if last_time is not None and last_time < cutoff:
+            continue
+        for record in iter_records(path):
+            link = record.get("video_link") or ""
+            if link.startswith("file://") and len(link) > len("file://") and record.get("time", cutoff) >= cutoff:
+                linked.add(os.path.abspath(link[len("file://"):]))
+    return linked
+
+# Runs in the worker process: deletes the oldest clips (with their thumbnails and index files) until
+# the folder is under quota, skipping clips linked from recent alert records.
+def enforce_quota(alert_folder, log_folder, quota_bytes=CLIP_DISK_QUOTA, protect_seconds=CLIP_PROTECT_SECONDS):
+    try:
+        clips = []
+        total = 0
+        for name in os.listdir(alert_folder):
+            if not (name.startswith("alert_") and name.endswith(".mp4")):
+                continue
+            path = os.path.join(alert_folder, name)
+            files = [path] + [sidecar for sidecar in clip_sidecars(path) if os.path.exists(sidecar)]
+            size = sum(os.path.getsize(file) for file in files)
+            clips.append((os.path.getmtime(path), path, files, size))
+            total += size
+        if total <= quota_bytes:
+            return 0
+        protected = linked_clips(log_folder, protect_seconds)
+        evicted = 0
+        for _, path, files, size in sorted(clips):
+            if total <= quota_bytes:
+                break
+            if os.path.abspath(path) in protected:
+                continue
+            for file in files:
+                os.remove(file)
+            total -= size
+            evicted += 1
+            logging.info(f"Evicted clip {path} ({size / 1024:.0f} KiB) to stay under the disk quota")
+        if total > quota_bytes:
+            logging.warning(f"Alert clips in {alert_folder} use {total / 2**20:.0f} MiB, over the {quota_bytes / 2**20:.0f} MiB quota, but the rest are linked from recent alerts")
+        return evicted
+    except Exception as e:
+        logging.error(f"Error enforcing clip quota in {alert_folder}: {e}")
+        return 0
+
+# Post-processing of finished alert clips in one low-priority worker process, so re-encoding never
+# competes with detection for a core. The pool is started with the first job.
+class ClipMaintenance:
+    def __init__(self, alert_folder, log_folder, quota_bytes=CLIP_DISK_QUOTA, codec=CLIP_VIDEO_CODEC, bitrate=CLIP_VIDEO_BITRATE):
+        self.alert_folder = alert_folder
+        self.log_folder = log_folder
+        self.quota_bytes = quota_bytes
+        self.codec = codec
+        self.bitrate = bitrate
+        self.executor = None
+        self.pending = []
+
+    def submit(self, function, *args):
+        try:
+            if self.executor is None:
+                context = multiprocessing.get_context("spawn")
+                self.executor = ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=init_worker)
+            self.pending = [future for future in self.pending if not future.done()]
+            self.pending.append(self.executor.submit(function, *args))
+        except Exception as e:
+            logging.error(f"Error scheduling clip maintenance: {e}")
+
+    # Called from the clip writer thread once a clip file is complete.
+    def clip_written(self, path):
+        self.submit(process_clip, path, self.codec, self.bitrate)
+        self.enforce_quota()
+
+    def enforce_quota(self):
+        self.submit(enforce_quota, self.alert_folder, self.log_folder, self.quota_bytes)
+
+    # Clips left unprocessed by an earlier session (no index file yet) and the quota. Partial re-encodes
+    # left by an interrupted worker are deleted; their clip is still there and is processed again.
+    def resume(self):
+        try:
+            if not os.path.isdir(self.alert_folder):
+                return
+            for name in sorted(os.listdir(self.alert_folder)):
+                path = os.path.join(self.alert_folder, name)
+                if name.endswith(CLIP_PARTIAL_SUFFIX):
+                    os.remove(path)
+                    logging.info(f"Removed partial clip re-encode {path}")
+                elif name.startswith("alert_") and name.endswith(".mp4") and not os.path.exists(clip_sidecars(path)[1]):
+                    self.submit(process_clip, path, self.codec, self.bitrate)
+            self.enforce_quota()
+        except Exception as e:
+            logging.error(f"Error resuming clip maintenance: {e}")
+
+    # Without wait, queued jobs are cancelled (resume() picks them up next time) and a running one finishes on its own.
+    def close(self, wait=False):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=not wait)
+            self.executor = None
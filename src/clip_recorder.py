@@ -0,0 +1,204 @@
+# clip_recorder.py
+import os
+import queue
+import logging
+import threading
+from collections import deque
+import numpy as np
+import cv2
+from src.constants import FOURCC, CLIP_FPS, CLIP_PRE_SECONDS, CLIP_POST_SECONDS, CLIP_MAX_SECONDS, CLIP_JPEG_QUALITY, CLIP_MEMORY_BUDGET, CLIP_ENCODE_QUEUE_SIZE, CLIP_WRITE_QUEUE_SIZE
+
+STOP = object()
+
+class Clip:
+    def __init__(self, path, start_ns, frames):
+        self.path = path
+        self.start_ns = start_ns
+        self.end_ns = None  # open until finish(); capped at CLIP_MAX_SECONDS
+        self.frames = frames  # [(timestamp_ns, jpeg bytes)]
+
+# Alert clips with the seconds before the event. Frames are sampled at `fps`, JPEG-encoded on an
+# encoder thread and kept in a ring covering the last `pre_seconds`; trigger() starts a clip from
+# that ring, and after finish() it keeps collecting `post_seconds` more before a writer thread
+# encodes it to video at the frames' real capture times.
+#
+# Memory: the ring plus the open clip hold at most `memory_budget` bytes of JPEG data (the ring gives
+# up its oldest frames first, then new clip frames are dropped), plus up to CLIP_WRITE_QUEUE_SIZE
+# finished clips waiting for the writer and CLIP_ENCODE_QUEUE_SIZE raw frames waiting for the encoder.
+# The detection thread only copies a sampled frame into the encoder queue and never blocks: when
+# either queue is full the frame or clip is dropped and counted.
+class ClipRecorder:
+    def __init__(self, fps=CLIP_FPS, pre_seconds=CLIP_PRE_SECONDS, post_seconds=CLIP_POST_SECONDS, jpeg_quality=CLIP_JPEG_QUALITY, memory_budget=CLIP_MEMORY_BUDGET):
+        self.frame_interval_ns = int(1e9 / fps)
+        self.pre_ns = int(pre_seconds * 1e9)
+        self.post_ns = int(post_seconds * 1e9)
+        self.max_ns = int(CLIP_MAX_SECONDS * 1e9)
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.memory_budget = memory_budget
+        self.ring = deque()
+        self.ring_bytes = 0
+        self.clip = None
+        self.clip_bytes = 0
+        self.lock = threading.Lock()
+        self.last_sample_ns = None
+        self.encode_queue = queue.Queue(maxsize=CLIP_ENCODE_QUEUE_SIZE)
+        self.write_queue = queue.Queue(maxsize=CLIP_WRITE_QUEUE_SIZE)
+        self.encode_drops = 0  # sampled frames dropped because the encoder fell behind
+        self.budget_drops = 0  # clip frames dropped by the memory budget
+        self.dropped_clips = 0  # finished clips dropped because the writer fell behind
+        self.written_clips = 0
+        self.on_clip_written = None  # optional callback with the path of each finished clip
+        self.encoder = threading.Thread(target=self.run_encoder, name="ClipEncoder", daemon=True)
+        self.writer = threading.Thread(target=self.run_writer, name="ClipWriter", daemon=True)
+        self.encoder.start()
+        self.writer.start()
+
+    # Called for every processed frame; timestamp_ns is its capture time.
+    def add_frame(self, frame, timestamp_ns):
+        if self.last_sample_ns is not None and 0 <= timestamp_ns - self.last_sample_ns < self.frame_interval_ns:
+            return
+        self.last_sample_ns = timestamp_ns
+        try:
+            # the frame may be a reused capture buffer, so the encoder gets a copy
+            self.encode_queue.put_nowait((timestamp_ns, frame.copy()))
+        except queue.Full:
+            self.encode_drops += 1
+
+    def run_encoder(self):
+        while True:
+            item = self.encode_queue.get()
+            if item is STOP:
+                break
+            timestamp_ns, frame = item
+            try:
+                ok, data = cv2.imencode(".jpg", frame, self.encode_params)
+                if ok:
+                    self.store(timestamp_ns, data.tobytes())
+            except Exception as e:
+                logging.error(f"Error encoding clip frame: {e}")
+
+    def store(self, timestamp_ns, data):
+        finished = None
+        with self.lock:
+            clip = self.clip
+            if clip is not None:
+                if clip.end_ns is None and timestamp_ns - clip.start_ns > self.max_ns:
+                    clip.end_ns = clip.start_ns + self.max_ns
+                if clip.end_ns is not None and timestamp_ns > clip.end_ns:
+                    finished = self.close_clip()
+                elif self.clip_bytes + len(data) > self.memory_budget:
+                    self.budget_drops += 1
+                else:
+                    clip.frames.append((timestamp_ns, data))
+                    self.clip_bytes += len(data)
+
+            self.ring.append((timestamp_ns, data))
+            self.ring_bytes += len(data)
+            while self.ring and (timestamp_ns - self.ring[0][0] > self.pre_ns or self.ring_bytes + self.clip_bytes > self.memory_budget):
+                self.ring_bytes -= len(self.ring.popleft()[1])
+        if finished:
+            self.submit(finished)
+
+    # Starts a clip at path holding the buffered frames from start_ns - pre_seconds on.
+    def trigger(self, path, start_ns):
+        finished = None
+        with self.lock:
+            if self.clip is not None:
+                finished = self.close_clip()
+            first = start_ns - self.pre_ns
+            frames = [(timestamp, data) for timestamp, data in self.ring if timestamp >= first]
+            self.clip = Clip(path, first, frames)
+            self.clip_bytes = sum(len(data) for _, data in frames)
+        if finished:
+            self.submit(finished)
+        logging.info(f"Recording alert clip {path} with {len(frames)} buffered frame(s)")
+
+    # The event ended at end_ns; the clip keeps the following post_seconds.
+    def finish(self, end_ns):
+        with self.lock:
+            if self.clip is not None and self.clip.end_ns is None:
+                self.clip.end_ns = end_ns + self.post_ns
+
+    # Called with the lock held.
+    def close_clip(self):
+        clip = self.clip
+        self.clip = None
+        self.clip_bytes = 0
+        return clip
+
+    def submit(self, clip):
+        try:
+            self.write_queue.put_nowait(clip)
+        except queue.Full:
+            self.dropped_clips += 1
+            logging.warning(f"Clip writer is behind; dropped clip {clip.path}")
+
+    def run_writer(self):
+        while True:
+            clip = self.write_queue.get()
+            if clip is STOP:
+                break
+            self.write_clip(clip)
+
+    # Writes at a constant frame rate, repeating or skipping frames so that playback follows capture time.
+    def write_clip(self, clip):
+        writer = None
+        try:
+            if not clip.frames:
+                logging.warning(f"Alert clip {clip.path} has no frames")
+                return
+            os.makedirs(os.path.dirname(clip.path) or ".", exist_ok=True)
+            frames = clip.frames
+            first_ns = frames[0][0]
+            last_ns = frames[-1][0]
+            fps = 1e9 / self.frame_interval_ns
+            index = 0
+            image = None
+            decoded = -1
+            for tick in range(int((last_ns - first_ns) / self.frame_interval_ns) + 1):
+                tick_ns = first_ns + tick * self.frame_interval_ns
+                while index + 1 < len(frames) and frames[index + 1][0] <= tick_ns:
+                    index += 1
+                if index != decoded:
+                    image = cv2.imdecode(np.frombuffer(frames[index][1], dtype=np.uint8), cv2.IMREAD_COLOR)
+                    decoded = index
+                    if writer is None:
+                        writer = cv2.VideoWriter(clip.path, FOURCC, fps, (image.shape[1], image.shape[0]))
+                        size = (image.shape[1], image.shape[0])
+                    elif (image.shape[1], image.shape[0]) != size:
+                        # the quality governor may change the processing resolution mid-clip
+                        image = cv2.resize(image, size)
+                writer.write(image)
+            writer.release()
+            writer = None
+            self.written_clips += 1
+            logging.info(f"Alert clip saved at {clip.path} ({len(frames)} frames, {(last_ns - first_ns) / 1e9:.1f}s)")
+            if self.on_clip_written:
+                self.on_clip_written(clip.path)
+        except Exception as e:
+            logging.error(f"Error writing alert clip {clip.path}: {e}")
+        finally:
+            if writer is not None:
+                writer.release()
+
+    def stats(self):
+        return {
+            "written_clips": self.written_clips, "dropped_clips": self.dropped_clips,
+            "encode_drops": self.encode_drops, "budget_drops": self.budget_drops,
+            "buffered_bytes": self.ring_bytes + self.clip_bytes
+        }
+
+    # Writes the open clip (without waiting for its post-event seconds) and stops both threads.
+    def close(self, timeout=10.0):
+        try:
+            self.encode_queue.put(STOP)
+            self.encoder.join(timeout)
+            with self.lock:
+                clip = self.close_clip()
+            if clip is not None:
+                self.write_queue.put(clip, timeout=timeout)
+            self.write_queue.put(STOP, timeout=timeout)
+            self.writer.join(timeout)
+            logging.info(f"Clip recorder stopped: {self.stats()}")
+        except Exception as e:
+            logging.error(f"Error closing clip recorder: {e}")
@@ -8,6 +8,8 @@ FRAME_HEIGHT = 480
 # Eye indices for MediaPipe FaceMesh
 LEFT_EYE_INDICES = [33, 160, 158, 133, 153, 144]
 RIGHT_EYE_INDICES = [263, 387, 385, 362, 380, 373]
+NOSE_INDEX = 1
+PITCH_OFFSET = 30  # degrees subtracted from the nose-below-eyes angle so a level head reads about 0
 
 # Alert thresholds
 EYE_AR_THRESH = 0.14
@@ -26,6 +28,65 @@ GRACE_PERIOD = 1.5
 STD_DEV_THRESH = 4.0
 MIN_BRIGHTNESS_THRESH = 10
 DYNAMIC_EAR_ADJUST_RATE = 0.002
+
+# Rolling statistics
+POSE_WINDOW = 15  # frames of roll/pitch for smoothing and the stability check
+EAR_HISTORY_WINDOW = 15
+EAR_CALIBRATION_WINDOW = 120.0  # seconds of EAR behind the dynamic EYE_AR_THRESH
+EAR_CALIBRATION_CAPACITY = 120 * 60  # entries; enough for the whole window at 60 FPS
+EAR_CALIBRATION_MIN_FILL = 0.9  # fraction of the window that must be covered before adapting
+
+# Low-light enhancement
+GAMMA_ANCHORS = ((5, 3.5), (16, 2.8), (26, 2.2), (40, 1.7), (55, 1.2))  # (brightness, gamma); gamma is interpolated between anchors
+LOW_LIGHT_THRESH = 50  # CLAHE and denoising below this brightness
+BRIGHTNESS_SAMPLE_STEP = 8  # brightness is estimated from every 8th pixel in each direction
+BRIGHTNESS_HYSTERESIS = 2.0  # brightness change needed before the gamma table or low-light mode switches
+CLAHE_CLIP_LIMIT = 4.0
+CLAHE_TILE_GRID = (8, 8)
+
+# Low-light denoising: "nlmeans" (full frame, slowest), "roi" (non-local means on the eye region of the
+# previous frame), "temporal" (running average over recent frames) or "spatial" (edge-preserving bilateral filter)
+DENOISE_MODES = ("nlmeans", "roi", "temporal", "spatial")
+DENOISE_MODE = "spatial"
+DENOISE_ROI_PADDING = 0.6  # eye-region padding as a fraction of the region's width
+TEMPORAL_DENOISE_ALPHA = 0.5  # weight of the newest frame; lower is smoother but smears blinks
+BILATERAL_DIAMETER = 5
+BILATERAL_SIGMA = 40
+
+# Face-ROI tracking: enhancement and FaceMesh run on a padded box around the last face.
+# Opt-in ("roi_tracking": true in the config file), since it changes what FaceMesh sees.
+FACE_ROI_TRACKING = False
+FACE_EXTENT_INDICES = (10, 152, 234, 454)  # forehead, chin and both cheeks
+FACE_ROI_PADDING = 0.35  # padding on each side as a fraction of the face size
+FACE_ROI_MIN_SIZE = 128  # pixels
+FACE_ROI_KEEP_MARGIN = 0.1  # the box is kept while the face stays this far (fraction of face size) inside it
+
+# Keyframe inference: FaceMesh on keyframes, Lucas-Kanade optical flow on the eye and nose landmarks in between
+KEYFRAME_TRACKING = False
+KEYFRAME_INTERVAL = 5  # at most this many frames per FaceMesh run
+KEYFRAME_EAR_JUMP = 0.04  # EAR change between frames that forces a keyframe
+LK_WINDOW_SIZE = (15, 15)
+LK_MAX_LEVEL = 2
+LK_MAX_ERROR = 20.0  # mean absolute patch difference reported by calcOpticalFlowPyrLK
+LK_MAX_FB_ERROR = 1.0  # forward-backward tracking error in pixels
+
+# Quality governor: steps down this ladder while the frame cost exceeds the budget.
+# Opt-in ("quality_governor": true in the config file), since resolution and denoising then depend on timing.
+QUALITY_GOVERNOR = False
+GOVERNOR_FRAME_BUDGET_MS = 30.0  # analysis plus overlay per frame; keeps 30 fps with some headroom
+GOVERNOR_EMA_ALPHA = 0.1
+GOVERNOR_SETTLE_FRAMES = 30  # frames measured at a level before it can change again
+GOVERNOR_UPGRADE_RATIO = 0.6  # step back up only when the cost is below 60% of the budget...
+GOVERNOR_UPGRADE_FRAMES = 150  # ...for this many frames in a row
+DENOISE_COST_ORDER = ("nlmeans", "roi", "spatial", "temporal")  # most to least expensive
+# denoise_mode None keeps the configured mode; a ladder mode is used only if it is cheaper
+QUALITY_LADDER = [
+    {"resolution": (FRAME_WIDTH, FRAME_HEIGHT), "refine_landmarks": True, "denoise_mode": None, "overlay": "full"},
+    {"resolution": (FRAME_WIDTH, FRAME_HEIGHT), "refine_landmarks": False, "denoise_mode": None, "overlay": "full"},
+    {"resolution": (FRAME_WIDTH, FRAME_HEIGHT), "refine_landmarks": False, "denoise_mode": "spatial", "overlay": "reduced"},
+    {"resolution": (FRAME_WIDTH * 3 // 4, FRAME_HEIGHT * 3 // 4), "refine_landmarks": False, "denoise_mode": "temporal", "overlay": "reduced"},
+    {"resolution": (FRAME_WIDTH // 2, FRAME_HEIGHT // 2), "refine_landmarks": False, "denoise_mode": "temporal", "overlay": "reduced"},
+]
 SENSITIVITY_MODES = {
     "high": {"ear_scale": 0.80, "consec_frames": 50, "roll_scale": 0.85, "pitch_scale": 0.80},
     "normal": {"ear_scale": 1.0, "consec_frames": 80, "roll_scale": 1.0, "pitch_scale": 1.0},
@@ -57,11 +118,28 @@ FONT_PATH_FA = "assets/BNazanin.ttf"
 FONT_PATH_EN = "assets/arial.ttf"
 ALARM_SOUND = "assets/Enrique Iglesias & Pitbull - Move To Miami.mp3"
 ALERT_FOLDER = "alerts"
+LEGACY_ALERT_LOG = "alerts_log.json"  # single-file log of earlier versions, imported into the event store
 CONFIG_FILE = os.path.join(os.path.expanduser("~"), ".drowsiness_config.json")
 
 # Video recording settings
 FOURCC = cv2.VideoWriter_fourcc(*'mp4v')
-FPS = 20.0
+CLIP_FPS = 15.0  # frames sampled into the clip buffer per second
+CLIP_PRE_SECONDS = 5.0  # kept before the alert starts
+CLIP_POST_SECONDS = 5.0  # kept after the alert ends
+CLIP_MAX_SECONDS = 120.0  # a clip still open after this long is closed
+CLIP_JPEG_QUALITY = 80
+CLIP_MEMORY_BUDGET = 48 * 1024 * 1024  # bytes of JPEG frames held by the ring and the open clip
+CLIP_ENCODE_QUEUE_SIZE = 4  # raw frames waiting for the JPEG encoder
+CLIP_WRITE_QUEUE_SIZE = 2  # finished clips waiting for the video writer
+
+# Alert clip post-processing and retention
+CLIP_VIDEO_CODEC = "libx264"  # ffmpeg encoder for finished clips; without ffmpeg clips stay as recorded
+CLIP_VIDEO_BITRATE = "500k"
+CLIP_THUMBNAIL_WIDTH = 320
+CLIP_DISK_QUOTA = 2 * 1024 ** 3  # bytes of clips, thumbnails and clip index files per alert folder
+CLIP_PROTECT_SECONDS = 7 * 24 * 3600  # clips linked from alerts this recent are never evicted
+CLIP_PROCESS_NICE = 10
+CLIP_PARTIAL_SUFFIX = ".partial"  # re-encode in progress; not an alert_*.mp4 name, so quota and resume skip it
 YOLO_MODEL_PATH = "src/yolo11n.pt"
 
 # Blink detection thresholds
@@ -69,6 +147,79 @@ BLINK_RATE_MIN = 15
 BLINK_RATE_MAX = 20
 BLINK_DURATION_THRESH = 0.5
 BLINK_CONSEC_FRAMES = 10
+BLINK_RATE_WINDOW = 60.0  # seconds of blinks counted for the blink rate
+
+# Display overlay
+OVERLAY_TINT_COLORS = {"severe": (0, 0, 255), "moderate": (0, 165, 255), "mild": (0, 255, 255)}  # BGR
+OVERLAY_DEFAULT_TINT = (255, 255, 0)
+OVERLAY_ALERT_ALPHA = 0.3
+OVERLAY_PENDING_ALPHA = 0.2
+OVERLAY_OUTPUT_BUFFERS = 3  # display frames in flight: drawn, queued and shown
+EYE_CONTOUR_COLOR = (0, 255, 0)  # BGR
+DISPLAY_MAX_FPS = 30  # preview repaints per second, whatever the detection rate
+UI_STATS_RATE = 10  # stat label refreshes per second
+
+# Alert text on the display
+ALERT_TEXT_FONT_SIZE = 40
+ALERT_TEXT_PADDING = 10  # pixels of dark box around the text
+ALERT_TEXT_SHADOW = 3  # shadow offset in pixels
+ALERT_TEXT_BOX_ALPHA = 0.5
+ALERT_TEXT_PULSE_RATE = 1.5  # radians per second of the opacity pulse
+ALERT_TEXT_PULSE_DEPTH = 0.3
+ALERT_TEXT_BOB_RATE = 2.0  # radians per second of the vertical movement
+ALERT_TEXT_BOB_AMPLITUDE = 20  # pixels
+TEXT_SPRITE_CACHE_SIZE = 64  # rendered messages kept (formatted messages differ by their numbers)
+
+# Alert event store
+EVENT_STORE_FOLDER = "events"  # sub-folder of the alert folder
+EVENT_INDEX_FILE = "index.json"
+EVENT_SEGMENT_MAX_BYTES = 4 * 1024 * 1024  # rotate to a new JSONL segment past this size
+EVENT_BATCH_SIZE = 64  # records per write (each batch is fsynced)
+EVENT_FLUSH_INTERVAL = 1.0  # seconds the writer waits for records before checking for shutdown
+
+# Alert history report
+REPORT_HISTOGRAM_MIN = 0.01  # seconds; shorter durations share the first bin
+REPORT_HISTOGRAM_GROWTH = 1.05  # bin width ratio, about 2.5% percentile error
+REPORT_PERCENTILES = (50, 90, 95, 99)
+
+# Headless mode
+HEADLESS_REPORT_INTERVAL = 5.0  # seconds between FPS reports
+HEADLESS_FRAME_TIMEOUT = 0.5  # seconds to wait for a new camera frame
+
+# Detection worker (GUI mode)
+DETECTION_FRAME_TIMEOUT = 0.5  # seconds the worker waits for a new camera frame
+STARTUP_JOIN_TIMEOUT = 5.0  # seconds closing the window waits for modules still loading
+CAPTURE_JOIN_TIMEOUT = 2.0  # seconds cleanup waits for the frame reader to finish its current read
+RESULT_QUEUE_SIZE = 1  # latest-wins queue between the worker and the GUI
+
+# Multi-process pipeline (shared-memory frames)
+SHM_INPUT_SLOTS = 4  # camera frames shared between capture and inference
+SHM_OUTPUT_SLOTS = 3  # enhanced frames shared between inference and rendering
+SHM_FRAME_TIMEOUT = 0.5
+SHM_JOIN_TIMEOUT = 2.0
+
+# Multi-camera monitoring
+MULTI_CAMERA_FOLDER = os.path.join(ALERT_FOLDER, "cameras")  # one sub-folder of logs and clips per camera
+FACEMESH_POOL_SIZE = 2  # FaceMesh workers shared by all camera streams
+MULTI_CAMERA_FRAME_TIMEOUT = 0.5
+
+# Offline batch mode
+BATCH_VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".m4v")
+BATCH_OUTPUT_FOLDER = os.path.join(ALERT_FOLDER, "batch")
+
+# Per-frame stage tracing
+TRACE_BUFFER_SIZE = 8192  # stage spans kept in memory (about 10 spans per frame)
+TRACE_FOLDER = os.path.join(ALERT_FOLDER, "traces")
+
+# Stage microbenchmarks
+BENCHMARK_ITERATIONS = 200
+BENCHMARK_WARMUP = 5
+BENCHMARK_TIME_BUDGET = 5.0  # seconds per stage; slow stages stop early
+BENCHMARK_MIN_SAMPLES = 10
+BENCHMARK_ALLOC_SAMPLES = 5
+BENCHMARK_BRIGHTNESS_BANDS = {"very_dark": 5, "dark": 16, "dim": 26, "low": 40, "normal": 120}
+# real FaceMesh landmarks recorded with `python -m src.benchmark --record-fixture`; found from any working directory
+BENCHMARK_FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "benchmark_landmarks.npz")
 
 # Text messages (unchanged)
 TEXTS = {
@@ -0,0 +1,112 @@
+# display_sink.py
+import logging
+import numpy as np
+import cv2
+from PyQt6.QtWidgets import QWidget, QSizePolicy
+from PyQt6.QtCore import Qt, QTimer, QPointF
+from PyQt6.QtGui import QImage, QPainter
+from src.constants import DISPLAY_MAX_FPS
+
+# Video preview widget. Detection results hand in their RGB frame with submit(); a timer at `max_fps`
+# scales the newest one once, to the widget's size in device pixels, into a reused buffer wrapped by a
+# reused QImage, and paints it without any further scaling. Frames arriving faster than the repaint rate
+# only replace the pending one. While the window is minimised, hidden or not exposed nothing is scaled
+# or painted, and on_active_changed(False) lets the detection worker stop drawing overlays.
+#
+# The submitted frame is an overlay output buffer that the detection thread redraws a few frames later,
+# with no hand-back. submit() therefore copies it at once into a staging buffer owned by the sink; the
+# tick only reads that buffer, and submit and tick both run on the GUI thread.
+class DisplaySink(QWidget):
+    def __init__(self, parent=None, max_fps=DISPLAY_MAX_FPS, tracer=None):
+        super().__init__(parent)
+        self.tracer = tracer
+        self.pending = None
+        self.pending_id = 0
+        self.staging = None
+        self.buffer = None
+        self.image = None
+        self.active = False  # until the window is first exposed
+        self.on_active_changed = None  # optional callback with the new state
+        self.submitted = 0
+        self.rendered = 0
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(max(1, round(1000 / max_fps)))
+
+    def submit(self, frame, frame_id=0):
+        if frame is None:
+            return
+        self.submitted += 1
+        if not self.active:
+            return
+        if self.staging is None or self.staging.shape != frame.shape:
+            self.staging = np.empty_like(frame)
+        np.copyto(self.staging, frame)
+        self.pending = self.staging
+        self.pending_id = frame_id
+
+    def is_shown(self):
+        window = self.window()
+        handle = window.windowHandle()
+        return self.isVisible() and not window.isMinimized() and (handle is None or handle.isExposed())
+
+    def tick(self):
+        try:
+            active = self.is_shown()
+            if active != self.active:
+                self.active = active
+                logging.info(f"Video preview {'shown' if active else 'paused while the window is hidden'}")
+                if not active:
+                    self.pending = None
+                if self.on_active_changed:
+                    self.on_active_changed(active)
+            if not active or self.pending is None:
+                return
+            frame = self.pending
+            self.pending = None
+            if self.tracer:
+                with self.tracer.span(self.pending_id, "display_render"):
+                    self.render(frame)
+            else:
+                self.render(frame)
+        except Exception as e:
+            logging.error(f"Error rendering video preview: {e}")
+
+    def render(self, frame):
+        ratio = self.devicePixelRatioF()
+        frame_height, frame_width = frame.shape[:2]
+        scale = min(self.width() * ratio / frame_width, self.height() * ratio / frame_height)
+        width, height = max(1, int(frame_width * scale)), max(1, int(frame_height * scale))
+        if self.buffer is None or self.buffer.shape[:2] != (height, width):
+            # window resized, moved to another screen or the frame resolution changed
+            self.buffer = np.empty((height, width, 3), dtype=np.uint8)
+            self.image = QImage(self.buffer.data, width, height, 3 * width, QImage.Format.Format_RGB888)
+        if (width, height) == (frame_width, frame_height):
+            np.copyto(self.buffer, frame)
+        else:
+            cv2.resize(frame, (width, height), dst=self.buffer, interpolation=cv2.INTER_LINEAR)
+        self.image.setDevicePixelRatio(ratio)
+        self.rendered += 1
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        try:
+            painter.fillRect(self.rect(), Qt.GlobalColor.black)
+            if self.image is not None:
+                ratio = self.image.devicePixelRatio()
+                x = (self.width() - self.image.width() / ratio) / 2
+                y = (self.height() - self.image.height() / ratio) / 2
+                painter.drawImage(QPointF(x, y), self.image)
+        finally:
+            painter.end()
+
+    def stats(self):
+        return {"submitted": self.submitted, "rendered": self.rendered}
+
+    def stop(self):
+        self.timer.stop()
+        logging.info(f"Video preview stopped; frames shown: {self.rendered} of {self.submitted}")
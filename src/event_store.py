@@ -0,0 +1,179 @@
+# event_store.py
+import os
+import json
+import time
+import queue
+import logging
+import threading
+import jdatetime
+from src.constants import EVENT_INDEX_FILE, EVENT_SEGMENT_MAX_BYTES, EVENT_BATCH_SIZE, EVENT_FLUSH_INTERVAL
+
+STOP = object()
+
+# Append-only alert history: JSON Lines segments in one folder, written in batches by a background
+# thread. Every batch is flushed and fsynced, so a crash loses at most the batch being written.
+# Each session starts its own segment and rotates to a new one past max_bytes; earlier sessions are
+# never touched. index.json lists the segments in order with their session, time range and size.
+class EventStore:
+    def __init__(self, folder, max_bytes=EVENT_SEGMENT_MAX_BYTES, batch_size=EVENT_BATCH_SIZE, flush_interval=EVENT_FLUSH_INTERVAL):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.session_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        self.index_path = os.path.join(folder, EVENT_INDEX_FILE)
+        self.queue = queue.Queue()
+        self.file = None
+        self.segment = None
+        self.segment_number = 0
+        self.records_written = 0
+        self.batches_written = 0
+        os.makedirs(folder, exist_ok=True)
+        self.index = self.load_index()
+        self.thread = threading.Thread(target=self.run, name="EventStoreWriter", daemon=True)
+        self.thread.start()
+
+    def load_index(self):
+        try:
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logging.error(f"Error loading event index, rebuilding it: {e}")
+        # بازسازی فهرست از روی فایل‌های موجود (مثلاً اگر index.json آسیب دیده باشد)
+        return {"segments": [{"file": name} for name in sorted(os.listdir(self.folder)) if name.endswith(".jsonl")]}
+
+    def save_index(self):
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, ensure_ascii=False, indent=4)
+        os.replace(temp_path, self.index_path)
+
+    # Non-blocking; the record is written by the writer thread with the next batch.
+    def append(self, record):
+        record.setdefault("session_id", self.session_id)
+        record.setdefault("time", time.time())
+        self.queue.put(record)
+
+    def run(self):
+        running = True
+        while running:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            while record is not STOP:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if record is STOP:
+                running = False
+            if batch:
+                self.write_batch(batch)
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def open_segment(self):
+        if self.file:
+            self.file.close()
+        # never reopen an existing segment (another store of the same session id may have written it)
+        name = None
+        while name is None or os.path.exists(os.path.join(self.folder, name)):
+            self.segment_number += 1
+            name = f"events_{self.session_id}_{self.segment_number:03d}.jsonl"
+        self.file = open(os.path.join(self.folder, name), 'ab')
+        self.segment = {"file": name, "session_id": self.session_id, "first_time": None, "last_time": None, "records": 0, "bytes": 0}
+        self.index["segments"].append(self.segment)
+        logging.info(f"Opened event segment {name}")
+
+    def write_batch(self, batch):
+        try:
+            if self.file is None or self.segment["bytes"] >= self.max_bytes:
+                self.open_segment()
+            data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch).encode('utf-8')
+            self.file.write(data)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            segment = self.segment
+            if segment["first_time"] is None:
+                segment["first_time"] = batch[0]["time"]
+            segment["last_time"] = batch[-1]["time"]
+            segment["records"] += len(batch)
+            segment["bytes"] += len(data)
+            self.save_index()
+            self.records_written += len(batch)
+            self.batches_written += 1
+        except Exception as e:
+            logging.error(f"Error writing alert events: {e}")
+
+    # Moves a log written by earlier versions (one JSON list, rewritten on every change) into the store.
+    def import_json_log(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            modified = os.path.getmtime(path)
+            for entry in entries:
+                record = {"event": "alert", "alert_id": f"legacy_{modified:.0f}_{entry.get('alert_number', 0)}"}
+                record.update(entry)
+                record.setdefault("time", legacy_time(entry, modified))
+                self.append(record)
+            os.replace(path, path + ".imported")
+            logging.info(f"Imported {len(entries)} alert(s) from {path}")
+        except Exception as e:
+            logging.error(f"Error importing alert log {path}: {e}")
+
+    def close(self, timeout=5.0):
+        try:
+            self.queue.put(STOP)
+            self.thread.join(timeout)
+            if self.thread.is_alive():
+                # the writer is still busy with the file; it closes it when it reaches STOP
+                logging.warning(f"Event store writer still running after {timeout} s; {self.queue.qsize()} item(s) queued")
+            elif self.file:
+                self.file.close()
+                self.file = None
+            logging.info(f"Event store closed: {self.records_written} record(s) in {self.batches_written} batch(es) at {os.path.abspath(self.folder)}")
+        except Exception as e:
+            logging.error(f"Error closing event store: {e}")
+
+# Wall-clock time of a legacy alert: its alert_start_time (Jalali local time "YYYY/MM/DD HH:MM:SS"),
+# or the log file's modification time if that is missing or unreadable.
+def legacy_time(entry, default):
+    try:
+        return jdatetime.datetime.strptime(entry["alert_start_time"], "%Y/%m/%d %H:%M:%S").togregorian().timestamp()
+    except Exception:
+        return default
+
+# Segment paths in `folder`, oldest first (index order, then any segment missing from the index).
+def segment_files(folder):
+    index_path = os.path.join(folder, EVENT_INDEX_FILE)
+    names = []
+    try:
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                names = [segment["file"] for segment in json.load(f)["segments"]]
+    except Exception as e:
+        logging.error(f"Error reading event index {index_path}: {e}")
+    names = list(dict.fromkeys(names))
+    listed = set(names)
+    names += sorted(name for name in os.listdir(folder) if name.endswith(".jsonl") and name not in listed)
+    return [os.path.join(folder, name) for name in names if os.path.exists(os.path.join(folder, name))]
+
+# Records of one segment, read one line at a time.
+def iter_records(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # the last line of a segment may be cut short by a crash
+                logging.warning(f"Skipping malformed event record in {path}")
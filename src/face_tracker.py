@@ -0,0 +1,107 @@
+# face_tracker.py
+import logging
+import types
+from src.constants import FACE_EXTENT_INDICES, FACE_ROI_PADDING, FACE_ROI_MIN_SIZE, FACE_ROI_KEEP_MARGIN
+
+# Landmarks found in a crop, read back in full-frame normalized coordinates.
+# Only the landmarks that are actually indexed get mapped.
+class CropLandmarks:
+    __slots__ = ("source", "offset_x", "offset_y", "scale_x", "scale_y")
+
+    def __init__(self, source, offset_x, offset_y, scale_x, scale_y):
+        self.source = source
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+        self.scale_x = scale_x
+        self.scale_y = scale_y
+
+    @property
+    def landmark(self):
+        return self
+
+    def __len__(self):
+        return len(self.source.landmark)
+
+    def __getitem__(self, index):
+        lm = self.source.landmark[index]
+        return types.SimpleNamespace(x=self.offset_x + lm.x * self.scale_x, y=self.offset_y + lm.y * self.scale_y, z=lm.z * self.scale_x)
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+# Keeps a padded face box from the last landmarks so enhancement and FaceMesh run on that crop only.
+# The box is kept while the face stays well inside it, so the crop size is stable from frame to frame;
+# when no face is found in the crop the next frame is scanned in full.
+class FaceTracker:
+    def __init__(self, frame_width, frame_height):
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.box = None
+        self.tracked_frames = 0
+        self.full_scans = 0
+        self.pixels = 0
+
+    def region(self):
+        if self.box is None:
+            self.full_scans += 1
+            self.pixels += self.frame_width * self.frame_height
+            return (0, 0, self.frame_width, self.frame_height)
+        self.tracked_frames += 1
+        x0, y0, x1, y1 = self.box
+        self.pixels += (x1 - x0) * (y1 - y0)
+        return self.box
+
+    # Maps results found in `region` to full-frame coordinates and moves the box to the new face position.
+    def update(self, results, region):
+        try:
+            x0, y0, x1, y1 = region
+            if not results.multi_face_landmarks:
+                if self.box is not None:
+                    logging.debug("Face lost in tracked region; rescanning the full frame")
+                self.box = None
+                return results
+            if (x1 - x0, y1 - y0) != (self.frame_width, self.frame_height):
+                face = CropLandmarks(
+                    results.multi_face_landmarks[0], x0 / self.frame_width, y0 / self.frame_height,
+                    (x1 - x0) / self.frame_width, (y1 - y0) / self.frame_height
+                )
+                results = types.SimpleNamespace(multi_face_landmarks=[face])
+            self.track(results.multi_face_landmarks[0])
+            return results
+        except Exception as e:
+            logging.error(f"Error updating face tracker: {e}")
+            self.box = None
+            return results
+
+    def track(self, face_landmarks):
+        xs = [face_landmarks.landmark[index].x * self.frame_width for index in FACE_EXTENT_INDICES]
+        ys = [face_landmarks.landmark[index].y * self.frame_height for index in FACE_EXTENT_INDICES]
+        face_x0, face_x1, face_y0, face_y1 = min(xs), max(xs), min(ys), max(ys)
+        size = max(face_x1 - face_x0, face_y1 - face_y0, 1.0)
+
+        if self.box is not None:
+            bx0, by0, bx1, by1 = self.box
+            margin = FACE_ROI_KEEP_MARGIN * size
+            padded_size = size * (1 + 2 * FACE_ROI_PADDING)
+            inside = face_x0 - bx0 >= margin and face_y0 - by0 >= margin and bx1 - face_x1 >= margin and by1 - face_y1 >= margin
+            # کادر فعلی تا وقتی چهره درون آن است و اندازه‌اش زیاد تغییر نکرده حفظ می‌شود
+            if inside and 0.8 <= padded_size / max(bx1 - bx0, by1 - by0) <= 1.25:
+                return
+
+        half = max(size * (0.5 + FACE_ROI_PADDING), FACE_ROI_MIN_SIZE / 2)
+        center_x = (face_x0 + face_x1) / 2
+        center_y = (face_y0 + face_y1) / 2
+        self.box = (
+            max(0, int(center_x - half)), max(0, int(center_y - half)),
+            min(self.frame_width, int(center_x + half)), min(self.frame_height, int(center_y + half))
+        )
+
+    def reset(self):
+        self.box = None
+
+    # Share of full-frame pixels that went through enhancement and FaceMesh.
+    def pixel_ratio(self):
+        frames = self.tracked_frames + self.full_scans
+        if not frames:
+            return 1.0
+        return self.pixels / (frames * self.frame_width * self.frame_height)
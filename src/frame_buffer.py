@@ -0,0 +1,65 @@
+# frame_buffer.py
+import threading
+
+# Lock-step triple buffer between the capture thread and the processing side.
+# The writer fills `back` in place (cv2.VideoCapture.read into the slot) and swaps it with `ready`;
+# the reader swaps `ready` with `front` only when a newer frame exists. No slot is ever copied,
+# and the front slot stays untouched by the writer until the reader's next acquire().
+class TripleBuffer:
+    def __init__(self):
+        self.slots = [None, None, None]
+        self.sequences = [0, 0, 0]
+        self.timestamps = [0, 0, 0]  # time.monotonic_ns() at capture
+        self.back = 0
+        self.ready = 1
+        self.front = 2
+        self.ready_fresh = False
+        self.sequence = 0
+        self.last_sequence = 0
+        self.dropped_frames = 0  # captured frames overwritten before processing took them
+        self.duplicate_frames = 0  # polls that found no new frame (previously reprocessed)
+        self.condition = threading.Condition()
+        self.on_publish = None  # optional callback for schedulers that watch several buffers
+
+    # Preallocated array for the next capture; None until the first frame has set the shape.
+    def write_buffer(self):
+        return self.slots[self.back]
+
+    def publish(self, frame, timestamp_ns=0):
+        with self.condition:
+            self.slots[self.back] = frame
+            self.sequence += 1
+            self.sequences[self.back] = self.sequence
+            self.timestamps[self.back] = timestamp_ns
+            if self.ready_fresh:
+                self.dropped_frames += 1
+            self.back, self.ready = self.ready, self.back
+            self.ready_fresh = True
+            self.condition.notify_all()
+            sequence = self.sequence
+        if self.on_publish:
+            self.on_publish()
+        return sequence
+
+    # Returns (frame, sequence, capture timestamp) for the newest unseen frame, or (None, last_sequence, 0) if nothing new.
+    # The returned array is a view of the front slot and is valid until the next acquire().
+    def acquire(self):
+        with self.condition:
+            if not self.ready_fresh:
+                self.duplicate_frames += 1
+                return None, self.last_sequence, 0
+            self.front, self.ready = self.ready, self.front
+            self.ready_fresh = False
+            self.last_sequence = self.sequences[self.front]
+            return self.slots[self.front], self.last_sequence, self.timestamps[self.front]
+
+    def has_new_frame(self):
+        return self.ready_fresh
+
+    def wait_for_frame(self, timeout):
+        with self.condition:
+            return self.condition.wait_for(lambda: self.ready_fresh, timeout)
+
+    def stats(self):
+        with self.condition:
+            return {"captured": self.sequence, "dropped": self.dropped_frames, "duplicates": self.duplicate_frames}
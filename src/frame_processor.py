@@ -1,229 +1,476 @@
 # frame_processor.py
 import cv2
-import mediapipe as mp
 import numpy as np
 import threading
 import logging
 import time
-from collections import deque
+import os
+import json
 from concurrent.futures import ThreadPoolExecutor
-from PIL import Image, ImageDraw, ImageFont
-import arabic_reshaper
-from bidi.algorithm import get_display
-import math
-from src.utils import eye_aspect_ratio, check_hardware_acceleration, render_animated_text
-from src.constants import FRAME_WIDTH, FRAME_HEIGHT, LEFT_EYE_INDICES, RIGHT_EYE_INDICES, FONT_PATH_FA, FONT_PATH_EN, TEXTS, STD_DEV_THRESH, MIN_BRIGHTNESS_THRESH, DYNAMIC_EAR_ADJUST_RATE, SENSITIVITY_MODES
+from src.tracing import FrameTracer
+from src.frame_buffer import TripleBuffer
+from src.face_tracker import FaceTracker
+from src.landmark_flow import LandmarkFlow
+from src.governor import QualityGovernor
+from src.geometry import face_geometry
+from src.overlay import OverlayCompositor
+from src.text_sprites import TextSpriteCache
+from src.rolling_stats import RollingWindow, TimedRollingWindow
+from src.utils import check_hardware_acceleration, build_gamma_lut_bank, timed_call
+from src.constants import FRAME_WIDTH, FRAME_HEIGHT, TEXTS, STD_DEV_THRESH, MIN_BRIGHTNESS_THRESH, DYNAMIC_EAR_ADJUST_RATE, SENSITIVITY_MODES, GAMMA_ANCHORS, LOW_LIGHT_THRESH, BRIGHTNESS_SAMPLE_STEP, BRIGHTNESS_HYSTERESIS, CLAHE_CLIP_LIMIT, CLAHE_TILE_GRID, CONFIG_FILE, DENOISE_MODES, DENOISE_MODE, DENOISE_ROI_PADDING, TEMPORAL_DENOISE_ALPHA, BILATERAL_DIAMETER, BILATERAL_SIGMA, FACE_ROI_TRACKING, KEYFRAME_TRACKING, QUALITY_GOVERNOR, GOVERNOR_FRAME_BUDGET_MS, POSE_WINDOW, EAR_CALIBRATION_WINDOW, EAR_CALIBRATION_CAPACITY, EAR_CALIBRATION_MIN_FILL, CAPTURE_JOIN_TIMEOUT
+
+# BGR weights of cv2.COLOR_BGR2GRAY; the mean of the gray image is the weighted mean of the channels
+GRAY_WEIGHTS = np.array([0.114, 0.587, 0.299])
+
+NO_EYE_POINTS = np.empty((0, 2), dtype=np.int32)
+
+# Per-frame detection output; eye points are (6, 2) int32 arrays in frame pixels (empty without a face).
+class FrameResult:
+    __slots__ = ("frame", "smoothed_ear", "current_roll", "current_pitch", "direction_text", "alert_flag", "left_eye_points", "right_eye_points", "roll_dir", "pitch_dir", "alert_severity", "brightness", "timestamp_ns")
+
+    # timestamp_ns: time.monotonic_ns() when the frame was captured (video time in batch mode)
+    def __init__(self, frame, smoothed_ear, current_roll, current_pitch, direction_text, alert_flag, left_eye_points, right_eye_points, roll_dir, pitch_dir, alert_severity, brightness, timestamp_ns):
+        self.frame = frame
+        self.smoothed_ear = smoothed_ear
+        self.current_roll = current_roll
+        self.current_pitch = current_pitch
+        self.direction_text = direction_text
+        self.alert_flag = alert_flag
+        self.left_eye_points = left_eye_points
+        self.right_eye_points = right_eye_points
+        self.roll_dir = roll_dir
+        self.pitch_dir = pitch_dir
+        self.alert_severity = alert_severity
+        self.brightness = brightness
+        self.timestamp_ns = timestamp_ns
 
 class FrameProcessor:
-    def __init__(self, parent):
+    def __init__(self, parent, source=0, face_mesh=None, load_model=True):
         self.parent = parent
         self.frame_width = FRAME_WIDTH
         self.frame_height = FRAME_HEIGHT
-        self.latest_frame = None
-        self.frame_lock = threading.Lock()
-        self.lut_cache = {}
-        self.thread_pool = ThreadPoolExecutor(max_workers=4)
-        self.use_cuda, self.use_opencl = check_hardware_acceleration()
+        self.frame_buffer = TripleBuffer()
+        self.gamma_lut_bank = build_gamma_lut_bank(GAMMA_ANCHORS)
+        self.lut_brightness = None  # brightness level of the gamma table in use
+        self.low_light = False
+        self.clahe = cv2.createCLAHE(clipLimit=CLAHE_CLIP_LIMIT, tileGridSize=CLAHE_TILE_GRID)
+        self.denoise_mode = DENOISE_MODE
+        self.configured_denoise_mode = DENOISE_MODE
+        self.denoise_roi = None  # (x0, y0, x1, y1) around the eyes in the previous frame
+        self.denoise_accumulator = None
+        self.denoise_frames = 0
+        self.denoise_ns = 0
+        self.nlmeans_ns = 0  # measured non-local means time and pixels, the baseline of denoise_savings_ms
+        self.nlmeans_pixels = 0
+        self.nlmeans_sampling = False
+        self.roi_tracking = FACE_ROI_TRACKING
+        self.face_tracker = FaceTracker(self.frame_width, self.frame_height)
+        self.keyframe_tracking = KEYFRAME_TRACKING
+        self.landmark_flow = LandmarkFlow(self.frame_width, self.frame_height)
+        self.overlay_detail = "full"  # "reduced" skips the animated alert text
+        self.refine_landmarks = True
+        self.governor = None
+        self.load_config()
+        self.overlay = OverlayCompositor()
+        self.text_sprites = TextSpriteCache()
+        self.alert_text_start = None
+        self.use_cuda, self.use_opencl = False, False
         self.is_running = True
-        self.roll_history = deque(maxlen=15)
-        self.pitch_history = deque(maxlen=15)
-        self.long_term_ear_history = deque(maxlen=300)
-        self.ear_smoothing_window = deque(maxlen=10)
+        self.roll_history = RollingWindow(POSE_WINDOW)
+        self.pitch_history = RollingWindow(POSE_WINDOW)
+        self.long_term_ear_history = TimedRollingWindow(int(EAR_CALIBRATION_WINDOW * 1e9), EAR_CALIBRATION_CAPACITY)
         self.kalman_ear = 0.0
         self.kalman_noise = 0.01
         self.kalman_measurement_noise = 0.1
+        self.cap = None
+        self.tracer = FrameTracer()
+        self.frame_id = 0
+        self.current_frame_id = 0
+        self.face_mesh = None
+        self.owns_face_mesh = face_mesh is None
+        self.init_ms = {}  # duration of each start-up step
+
+        # باز کردن دوربین، بارگذاری مدل و بررسی شتاب‌دهنده‌ی سخت‌افزاری هم‌زمان انجام می‌شوند
+        with ThreadPoolExecutor(max_workers=4, thread_name_prefix="FrameProcessorInit") as executor:
+            acceleration = executor.submit(timed_call, check_hardware_acceleration)
+            warm_up = executor.submit(timed_call, self.warm_up)
+            # source=None: frames are passed to analyze_frame by the caller (offline batch mode)
+            capture = executor.submit(timed_call, self.open_capture, source) if source is not None else None
+            model = executor.submit(timed_call, self.create_face_mesh) if face_mesh is None and load_model else None
+
+        (self.use_cuda, self.use_opencl), self.init_ms["acceleration"] = acceleration.result()
+        _, self.init_ms["warm_up"] = warm_up.result()
+        # اگر یکی از دو مرحله شکست بخورد، منبع ساخته‌شده توسط دیگری آزاد می‌شود
+        if capture is not None:
+            try:
+                self.cap, self.init_ms["capture"] = capture.result()
+            except Exception as e:
+                logging.error(f"Error initializing webcam: {e}")
+                if model is not None and model.exception() is None:
+                    model.result()[0].close()
+                raise
 
         try:
-            self.cap = cv2.VideoCapture(0)
-            if not self.cap.isOpened():
-                logging.error("Failed to open webcam.")
-                raise Exception("Cannot open webcam.")
+            if face_mesh is not None:
+                self.face_mesh = face_mesh
+            elif model is not None:
+                self.face_mesh, self.init_ms["face_mesh"] = model.result()
         except Exception as e:
-            logging.error(f"Error initializing webcam: {e}")
+            logging.error(f"Error initializing FaceMesh: {e}")
+            if self.cap is not None:
+                self.cap.release()
             raise
+        if capture is not None or model is not None:
+            logging.info("Frame processor initialized: " + ", ".join(f"{step} {ms:.0f} ms" for step, ms in self.init_ms.items()))
+
+        if self.cap is not None:
+            self.frame_reader_thread = threading.Thread(target=self.read_frames, daemon=True)
+            self.frame_reader_thread.start()
 
+    def load_config(self):
+        config = {}
         try:
-            self.mp_face_mesh = mp.solutions.face_mesh
-            self.face_mesh = self.mp_face_mesh.FaceMesh(
-                static_image_mode=False,
-                max_num_faces=1,
-                refine_landmarks=True,
-                min_detection_confidence=0.6,
-                min_tracking_confidence=0.6
-            )
+            if os.path.exists(CONFIG_FILE):
+                with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+                self.set_denoise_mode(config.get("denoise_mode", self.denoise_mode))
+                self.roi_tracking = config.get("roi_tracking", self.roi_tracking)
+                self.keyframe_tracking = config.get("keyframe_tracking", self.keyframe_tracking)
         except Exception as e:
-            logging.error(f"Error initializing FaceMesh: {e}")
-            raise
+            logging.error(f"Error loading configuration in FrameProcessor: {e}")
+        if config.get("quality_governor", QUALITY_GOVERNOR):
+            self.governor = QualityGovernor(self, config.get("frame_budget_ms", GOVERNOR_FRAME_BUDGET_MS))
+
+    # configured=False: a temporary change by the quality governor, not saved to the config file
+    def set_denoise_mode(self, mode, configured=True):
+        if mode not in DENOISE_MODES:
+            logging.warning(f"Unknown denoise mode '{mode}', keeping '{self.denoise_mode}'")
+            return
+        if configured:
+            self.configured_denoise_mode = mode
+        if mode != self.denoise_mode:
+            logging.info(f"Low-light denoise mode: {mode}")
+        self.denoise_mode = mode
+        self.denoise_accumulator = None
+
+    # Processing resolution; frames are resized to it and overlays and recordings use it.
+    def set_resolution(self, width, height):
+        self.frame_width = width
+        self.frame_height = height
+        self.face_tracker = FaceTracker(width, height)
+        self.landmark_flow = LandmarkFlow(width, height)
+        self.denoise_roi = None
+        self.denoise_accumulator = None
+
+    # Returns False when the model is shared and owned by someone else (multi-camera pool).
+    def set_refine_landmarks(self, refine_landmarks):
+        if not self.owns_face_mesh or self.face_mesh is None:
+            return False
+        try:
+            face_mesh = self.create_face_mesh(refine_landmarks=refine_landmarks)
+            self.face_mesh.close()
+            self.face_mesh = face_mesh
+            self.refine_landmarks = refine_landmarks
+            self.landmark_flow.reset()
+            return True
+        except Exception as e:
+            logging.error(f"Error recreating FaceMesh: {e}")
+            return False
 
-        self.frame_reader_thread = threading.Thread(target=self.read_frames, daemon=True)
-        self.frame_reader_thread.start()
+    # OpenCV builds its Lab conversion tables on first use (over 100 ms), which would otherwise hold up
+    # the first low-light frame.
+    def warm_up(self):
+        try:
+            lab = cv2.cvtColor(np.zeros((self.frame_height, self.frame_width, 3), dtype=np.uint8), cv2.COLOR_BGR2LAB)
+            l, a, b = cv2.split(lab)
+            cv2.cvtColor(cv2.merge((self.clahe.apply(l), a, b)), cv2.COLOR_LAB2BGR)
+        except Exception as e:
+            logging.error(f"Error warming up image enhancement: {e}")
+
+    @staticmethod
+    def open_capture(source):
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            logging.error(f"Failed to open video source: {source}")
+            raise Exception(f"Cannot open video source: {source}")
+        return cap
+
+    @staticmethod
+    def create_face_mesh(static_image_mode=False, refine_landmarks=True):
+        # mediapipe takes most of the import time, so it is loaded with the first model
+        import mediapipe as mp
+        return mp.solutions.face_mesh.FaceMesh(
+            static_image_mode=static_image_mode,
+            max_num_faces=1,
+            refine_landmarks=refine_landmarks,
+            min_detection_confidence=0.6,
+            min_tracking_confidence=0.6
+        )
 
     def read_frames(self):
         try:
             while self.is_running:
-                ret, frame = self.cap.read()
+                capture_start = time.perf_counter_ns()
+                # خواندن مستقیم در بافر از پیش تخصیص‌یافته، بدون کپی
+                ret, frame = self.cap.read(self.frame_buffer.write_buffer())
                 if ret:
-                    with self.frame_lock:
-                        self.latest_frame = frame.copy()
+                    # زمان دریافت فریم؛ زمان‌بندی پلک و هشدار بر این اساس است نه زمان پردازش
+                    sequence = self.frame_buffer.publish(frame, time.monotonic_ns())
+                    self.tracer.record(sequence, "capture", capture_start, time.perf_counter_ns())
                 else:
                     logging.warning("Failed to read frame from webcam.")
                     time.sleep(0.005)
         except Exception as e:
             logging.error(f"Error reading frames: {e}")
 
-    def enhance_frame(self, frame, brightness_threshold=50):
+    def wait_for_frame(self, timeout):
+        return self.frame_buffer.wait_for_frame(timeout)
+
+    def estimate_brightness(self, frame):
+        size = (max(1, frame.shape[1] // BRIGHTNESS_SAMPLE_STEP), max(1, frame.shape[0] // BRIGHTNESS_SAMPLE_STEP))
+        sample = cv2.resize(frame, size, interpolation=cv2.INTER_NEAREST)
+        return float(np.dot(cv2.mean(sample)[:3], GRAY_WEIGHTS))
+
+    # Gamma table and low-light mode for the full-frame brightness
+    def update_light_state(self, brightness, brightness_threshold=LOW_LIGHT_THRESH):
+        # جدول گاما و حالت کم‌نور فقط با تغییر محسوس روشنایی عوض می‌شوند تا تصویر چشمک نزند
+        if self.lut_brightness is None or abs(brightness - self.lut_brightness) >= BRIGHTNESS_HYSTERESIS:
+            self.lut_brightness = brightness
+        if self.low_light:
+            self.low_light = brightness < brightness_threshold + BRIGHTNESS_HYSTERESIS
+        else:
+            self.low_light = brightness < brightness_threshold
+        return self.gamma_lut_bank[min(int(self.lut_brightness), 255)]
+
+    # Returns (display frame, detector input, brightness). The gamma table, and CLAHE in low light, are
+    # applied to the whole frame for display; the detector input is the part inside region (x0, y0, x1, y1),
+    # the face region with ROI tracking, and only it is denoised. brightness is always the full frame's.
+    def enhance_frame(self, frame, brightness=None, region=None):
         try:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            brightness = np.mean(gray)
-            brightness_key = round(brightness, 2)
-
-            if brightness < 10:
-                gamma = 3.5
-            elif brightness < 23:
-                gamma = 2.8
-            elif brightness < 30:
-                gamma = 2.2
-            elif brightness < 50:
-                gamma = 1.7
-            else:
-                gamma = 1.2
-            invGamma = 1.0 / gamma
-            table = np.array([((i / 255.0) ** invGamma) * 255 for i in np.arange(256)]).astype("uint8")
-
-            if brightness_key in self.lut_cache:
-                table = self.lut_cache[brightness_key]
-            else:
-                self.lut_cache[brightness_key] = table
-                if len(self.lut_cache) > 25600:
-                    self.lut_cache.pop(list(self.lut_cache.keys())[0])
+            if brightness is None:
+                brightness = self.estimate_brightness(frame)
+            table = self.update_light_state(brightness)
+            x0, y0, x1, y1 = region or (0, 0, frame.shape[1], frame.shape[0])
+            whole = (x0, y0, x1, y1) == (0, 0, frame.shape[1], frame.shape[0])
 
-            if brightness < brightness_threshold:
+            if self.low_light:
                 lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
                 l, a, b = cv2.split(lab)
-                clahe = cv2.createCLAHE(clipLimit=4.0, tileGridSize=(8, 8))
-                l = clahe.apply(l)
+                l = self.clahe.apply(l)
                 lab = cv2.merge((l, a, b))
                 frame = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
-                frame = cv2.fastNlMeansDenoisingColored(frame, None, 10, 10, 7, 21)
-
-            return cv2.LUT(frame, table), brightness
+                if not self.nlmeans_pixels and not self.nlmeans_sampling and self.denoise_mode != "nlmeans":
+                    self.sample_nlmeans_baseline(frame)
+                with self.tracer.span(self.current_frame_id, "denoise"):
+                    # the roi mode writes into its input, so a face region is denoised on a copy
+                    detector_input = self.denoise(frame if whole else frame[y0:y1, x0:x1].copy(), (x0, y0))
+                detector_input = cv2.LUT(detector_input, table)
+                display = detector_input if whole else cv2.LUT(frame, table)
+            else:
+                self.denoise_accumulator = None
+                display = cv2.LUT(frame, table)
+                detector_input = display if whole else display[y0:y1, x0:x1]
+            return display, detector_input, brightness
         except Exception as e:
             logging.error(f"Error enhancing frame: {e}")
-            return frame, 0.0
+            return frame, frame, 0.0
 
-    def process_quadrant_image(self, quadrant_img, quadrant_coords, left_eye_points, right_eye_points, alert_flag, alert_severity):
+    def denoise(self, frame, offset=(0, 0)):
         try:
-            x_start, y_start, x_end, y_end = quadrant_coords
-            if alert_flag or self.parent.pending_alert_message:
-                overlay = quadrant_img.copy()
-                if alert_severity == "severe":
-                    color = (0, 0, 255)
-                elif alert_severity == "moderate":
-                    color = (0, 165, 255)
-                elif alert_severity == "mild":
-                    color = (0, 255, 255)
+            start_ns = time.perf_counter_ns()
+            mode = self.denoise_mode
+            if mode == "nlmeans":
+                frame = cv2.fastNlMeansDenoisingColored(frame, None, 10, 10, 7, 21)
+            elif mode == "temporal":
+                if self.denoise_accumulator is None or self.denoise_accumulator.shape != frame.shape:
+                    self.denoise_accumulator = frame.astype(np.float32)
                 else:
-                    color = (255, 255, 0)
-                cv2.rectangle(overlay, (0, 0), (quadrant_img.shape[1], quadrant_img.shape[0]), color, -1)
-                alpha = 0.2 if self.parent.pending_alert_message else 0.3
-                cv2.addWeighted(overlay, alpha, quadrant_img, 1 - alpha, 0, quadrant_img)
-
-            left_points = [(x - x_start, y - y_start) for x, y in left_eye_points if x_start <= x < x_end and y_start <= y < y_end]
-            if left_points:
-                cv2.polylines(quadrant_img, [np.array(left_points)], True, (0, 255, 0), 1)
+                    cv2.accumulateWeighted(frame, self.denoise_accumulator, TEMPORAL_DENOISE_ALPHA)
+                frame = cv2.convertScaleAbs(self.denoise_accumulator)
+            elif mode == "roi" and self.denoise_roi is not None and self.denoise_roi_in(frame, offset):
+                # فقط ناحیه‌ی چشم‌ها از فریم قبلی نویززدایی می‌شود
+                x0, y0, x1, y1 = self.denoise_roi_in(frame, offset)
+                frame[y0:y1, x0:x1] = cv2.fastNlMeansDenoisingColored(frame[y0:y1, x0:x1], None, 10, 10, 7, 21)
+            else:
+                # spatial mode, and roi mode until a face has been found
+                frame = cv2.bilateralFilter(frame, BILATERAL_DIAMETER, BILATERAL_SIGMA, BILATERAL_SIGMA)
+            elapsed_ns = time.perf_counter_ns() - start_ns
+
+            self.denoise_frames += 1
+            self.denoise_ns += elapsed_ns
+            if mode == "nlmeans":
+                # the baseline is the mode's own measured time; per pixel, since ROI tracking denoises the face region only
+                self.nlmeans_ns += elapsed_ns
+                self.nlmeans_pixels += frame.shape[0] * frame.shape[1]
+            return frame
+        except Exception as e:
+            logging.error(f"Error denoising frame: {e}")
+            return frame
 
-            right_points = [(x - x_start, y - y_start) for x, y in right_eye_points if x_start <= x < x_end and y_start <= y < y_end]
-            if right_points:
-                cv2.polylines(quadrant_img, [np.array(right_points)], True, (0, 255, 0), 1)
+    # In the other modes non-local means is timed once, on a quarter of a low-light frame and on its own
+    # thread, since it takes hundreds of ms; its cost scales with the pixel count.
+    def sample_nlmeans_baseline(self, frame):
+        h, w = frame.shape[:2]
+        sample = frame[h // 4:h // 4 + h // 2, w // 4:w // 4 + w // 2].copy()
+        self.nlmeans_sampling = True
+        threading.Thread(target=self.measure_nlmeans, args=(sample,), name="NlmBaseline", daemon=True).start()
 
-            return quadrant_img
+    def measure_nlmeans(self, sample):
+        try:
+            start_ns = time.perf_counter_ns()
+            cv2.fastNlMeansDenoisingColored(sample, None, 10, 10, 7, 21)
+            elapsed_ns = time.perf_counter_ns() - start_ns
+            if not self.nlmeans_pixels:
+                self.nlmeans_ns = elapsed_ns
+                self.nlmeans_pixels = sample.shape[0] * sample.shape[1]
+                logging.info(f"Non-local means measured at {elapsed_ns * 4 / 1e6:.1f} ms per full frame")
         except Exception as e:
-            logging.error(f"Error processing quadrant image: {e}")
-            return quadrant_img
+            logging.error(f"Error measuring NLM denoising time: {e}")
+
+    # The eye region in the coordinates of `frame`, or None if it falls outside it.
+    def denoise_roi_in(self, frame, offset):
+        x0, y0, x1, y1 = self.denoise_roi
+        x0, x1 = max(0, x0 - offset[0]), min(frame.shape[1], x1 - offset[0])
+        y0, y1 = max(0, y0 - offset[1]), min(frame.shape[0], y1 - offset[1])
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return x0, y0, x1, y1
+
+    # Average time per low-light frame saved against non-local means on the whole frame, in milliseconds,
+    # or None until non-local means has been measured on this machine. What is actually denoised may be the
+    # face region only (ROI tracking) or the eye region (roi mode).
+    def denoise_savings_ms(self):
+        if not self.denoise_frames:
+            return 0.0
+        if not self.nlmeans_pixels:
+            return None
+        full_frame_ns = self.nlmeans_ns / self.nlmeans_pixels * self.frame_width * self.frame_height
+        return (full_frame_ns - self.denoise_ns / self.denoise_frames) / 1e6
+
+    def denoise_savings_text(self):
+        savings = self.denoise_savings_ms()
+        return "n/a" if savings is None else f"{savings:.1f} ms/frame"
+
+    def update_denoise_roi(self, left_eye_points, right_eye_points):
+        points = np.concatenate((left_eye_points, right_eye_points))
+        x0, y0 = points.min(axis=0)
+        x1, y1 = points.max(axis=0)
+        pad = int(DENOISE_ROI_PADDING * max(x1 - x0, 1))
+        self.denoise_roi = (max(0, x0 - pad), max(0, y0 - pad), min(self.frame_width, x1 + pad), min(self.frame_height, y1 + pad))
 
-    def process_frame(self):
+    def process_frame(self, face_mesh=None):
         try:
-            with self.frame_lock:
-                frame = self.latest_frame.copy() if self.latest_frame is not None else None
+            # فقط فریم‌های جدید پردازش می‌شوند؛ فریم تکراری None برمی‌گرداند
+            frame, sequence, timestamp_ns = self.frame_buffer.acquire()
             if frame is None:
                 return None
+            return self.analyze_frame(frame, sequence, face_mesh, timestamp_ns)
+        except Exception as e:
+            logging.error(f"Error processing frame: {e}")
+            return None
 
-            frame = cv2.resize(frame, (self.frame_width, self.frame_height))
-            frame, brightness = self.enhance_frame(frame)
+    # With ROI tracking only the face region of the enhanced frame goes to FaceMesh.
+    def analyze_frame(self, frame, frame_id=None, face_mesh=None, timestamp_ns=None):
+        try:
+            start_ns = time.perf_counter_ns()
+            if timestamp_ns is None:
+                timestamp_ns = time.monotonic_ns()
+            if self.governor:
+                self.governor.next_frame()
+            if frame_id is None:
+                self.frame_id += 1
+                frame_id = self.frame_id
+            self.current_frame_id = frame_id
+            tracer = self.tracer
+
+            if frame.shape[1] != self.frame_width or frame.shape[0] != self.frame_height:
+                with tracer.span(frame_id, "resize"):
+                    frame = cv2.resize(frame, (self.frame_width, self.frame_height))
+            # روشنایی از کل فریم سنجیده می‌شود؛ فقط ناحیه‌ی چهره نویززدایی و به FaceMesh داده می‌شود
+            region = self.face_tracker.region() if self.roi_tracking else (0, 0, self.frame_width, self.frame_height)
+            x0, y0, x1, y1 = region
+            with tracer.span(frame_id, "enhance_frame"):
+                frame, enhanced, brightness = self.enhance_frame(frame, region=region)
+
+            results = None
+            gray = None
+            if self.keyframe_tracking:
+                with tracer.span(frame_id, "optical_flow"):
+                    gray = cv2.cvtColor(enhanced, cv2.COLOR_BGR2GRAY)
+                    results = self.landmark_flow.track(gray, (x0, y0))
+            if results is None:
+                with tracer.span(frame_id, "rgb_convert"):
+                    rgb_frame = cv2.cvtColor(enhanced, cv2.COLOR_BGR2RGB)
+                with tracer.span(frame_id, "face_mesh"):
+                    results = (face_mesh or self.face_mesh).process(rgb_frame)
+                    if self.roi_tracking:
+                        results = self.face_tracker.update(results, region)
+                if self.keyframe_tracking:
+                    self.landmark_flow.start(gray, (x0, y0), results)
+            with tracer.span(frame_id, "geometry"):
+                frame_data = self.analyze_landmarks(frame, brightness, results, timestamp_ns)
+            if self.governor:
+                self.governor.record(time.perf_counter_ns() - start_ns)
+            return frame_data
+        except Exception as e:
+            logging.error(f"Error analyzing frame: {e}")
+            return None
 
+    def analyze_landmarks(self, frame, brightness, results, timestamp_ns):
+        try:
             smoothed_ear = 1.0
             current_roll = 0.0
             current_pitch = 0.0
             direction_text = "---"
             alert_flag = False
             alert_severity = "none"
-            left_eye_points = []
-            right_eye_points = []
+            left_eye_points = NO_EYE_POINTS
+            right_eye_points = NO_EYE_POINTS
             roll_dir = ""
             pitch_dir = ""
 
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.face_mesh.process(rgb_frame)
-
             if not results.multi_face_landmarks:
-                return frame, smoothed_ear, current_roll, current_pitch, direction_text, True, left_eye_points, right_eye_points, roll_dir, pitch_dir, "no_face", brightness
-
-            face_landmarks = results.multi_face_landmarks[0]
-            for idx in LEFT_EYE_INDICES:
-                lm = face_landmarks.landmark[idx]
-                left_eye_points.append((int(lm.x * self.frame_width), int(lm.y * self.frame_height)))
-            for idx in RIGHT_EYE_INDICES:
-                lm = face_landmarks.landmark[idx]
-                right_eye_points.append((int(lm.x * self.frame_width), int(lm.y * self.frame_height)))
-
-            if len(left_eye_points) != len(LEFT_EYE_INDICES) or len(right_eye_points) != len(RIGHT_EYE_INDICES):
-                logging.warning("Incomplete eye landmarks detected.")
-                smoothed_ear = 0.0
-            else:
-                leftEAR = eye_aspect_ratio(np.array(left_eye_points))
-                rightEAR = eye_aspect_ratio(np.array(right_eye_points))
-                ear = (leftEAR + rightEAR) / 2.0
-                self.ear_smoothing_window.append(ear)
-                self.parent.alert_handler.ear_history.append(ear)
-                self.long_term_ear_history.append(ear)
-
-                prediction = self.kalman_ear
-                measurement = ear
-                self.kalman_ear = prediction + (measurement - prediction) / (1.0 + self.kalman_noise / self.kalman_measurement_noise)
-                smoothed_ear = self.kalman_ear
-
-                if len(self.long_term_ear_history) == self.long_term_ear_history.maxlen:
-                    avg_ear = np.mean(self.long_term_ear_history)
-                    ear_std = np.std(self.long_term_ear_history)
-                    if avg_ear > 0.1 and ear_std < 0.04:
-                        new_threshold = max(0.12, min(0.27, avg_ear * (1 - DYNAMIC_EAR_ADJUST_RATE)))
-                        if abs(new_threshold - self.parent.EYE_AR_THRESH) > 0.001:
-                            logging.info(f"Adjusted EYE_AR_THRESH to {new_threshold}")
-                            self.parent.EYE_AR_THRESH = new_threshold
-
-            left_center = np.mean(np.array(left_eye_points), axis=0)
-            right_center = np.mean(np.array(right_eye_points), axis=0)
-            eyes_center = (left_center + right_center) / 2
-            current_roll = np.degrees(np.arctan2(right_center[1] - left_center[1], right_center[0] - left_center[0]))
-            nose_lm = face_landmarks.landmark[1]
-            nose = (int(nose_lm.x * self.frame_width), int(nose_lm.y * self.frame_height))
-            diff_y = nose[1] - eyes_center[1]
-            eye_distance = np.linalg.norm(right_center - left_center)
-            current_pitch = np.degrees(np.arctan2(diff_y, eye_distance)) -30
+                self.denoise_roi = None
+                return FrameResult(frame, smoothed_ear, current_roll, current_pitch, direction_text, True, left_eye_points, right_eye_points, roll_dir, pitch_dir, "no_face", brightness, timestamp_ns)
+
+            geometry = face_geometry(results.multi_face_landmarks[0], self.frame_width, self.frame_height)
+            left_eye_points = geometry.left_eye_points
+            right_eye_points = geometry.right_eye_points
+            self.update_denoise_roi(left_eye_points, right_eye_points)
+
+            ear = geometry.ear
+            self.long_term_ear_history.append(ear, timestamp_ns)
+
+            prediction = self.kalman_ear
+            measurement = ear
+            self.kalman_ear = prediction + (measurement - prediction) / (1.0 + self.kalman_noise / self.kalman_measurement_noise)
+            smoothed_ear = self.kalman_ear
+
+            if self.long_term_ear_history.span_ns() >= self.long_term_ear_history.duration_ns * EAR_CALIBRATION_MIN_FILL:
+                avg_ear = self.long_term_ear_history.mean()
+                ear_std = self.long_term_ear_history.std()
+                if avg_ear > 0.1 and ear_std < 0.04:
+                    new_threshold = max(0.12, min(0.27, avg_ear * (1 - DYNAMIC_EAR_ADJUST_RATE)))
+                    if abs(new_threshold - self.parent.EYE_AR_THRESH) > 0.001:
+                        logging.info(f"Adjusted EYE_AR_THRESH to {new_threshold}")
+                        self.parent.EYE_AR_THRESH = new_threshold
+
+            current_roll = geometry.roll
+            current_pitch = geometry.pitch
 
             self.roll_history.append(current_roll)
             self.pitch_history.append(current_pitch)
-            smoothed_roll = sum(self.roll_history) / len(self.roll_history) if self.roll_history else 0.0
-            smoothed_pitch = sum(self.pitch_history) / len(self.pitch_history) if self.pitch_history else 0.0
+            smoothed_roll = self.roll_history.mean()
+            smoothed_pitch = self.pitch_history.mean()
 
             is_stable = True
-            if len(self.roll_history) == self.roll_history.maxlen:
-                roll_std = np.std(self.roll_history)
+            if self.roll_history.full():
+                roll_std = self.roll_history.std()
                 if roll_std > STD_DEV_THRESH:
                     is_stable = False
                     logging.debug(f"Unstable roll: std={roll_std}")
-            if len(self.pitch_history) == self.pitch_history.maxlen:
-                pitch_std = np.std(self.pitch_history)
+            if self.pitch_history.full():
+                pitch_std = self.pitch_history.std()
                 if pitch_std > STD_DEV_THRESH:
                     is_stable = False
                     logging.debug(f"Unstable pitch: std={pitch_std}")
@@ -263,52 +510,35 @@ class FrameProcessor:
                 else:
                     alert_severity = "mild"
 
-            return frame, smoothed_ear, smoothed_roll, smoothed_pitch, direction_text, alert_flag, left_eye_points, right_eye_points, roll_dir, pitch_dir, alert_severity, brightness
+            return FrameResult(frame, smoothed_ear, smoothed_roll, smoothed_pitch, direction_text, alert_flag, left_eye_points, right_eye_points, roll_dir, pitch_dir, alert_severity, brightness, timestamp_ns)
         except Exception as e:
-            logging.error(f"Error processing frame: {e}")
+            logging.error(f"Error analyzing landmarks: {e}")
             return None
 
+    # Returns the display frame in RGB; it is one of the compositor's rotating buffers.
     def finalize_frame(self, frame, alert_flag, alert_severity):
         try:
-            mid_x = self.frame_width // 2
-            mid_y = self.frame_height // 2
-            top_left_img = frame[0:mid_y, 0:mid_x].copy()
-            top_right_img = frame[0:mid_y, mid_x:self.frame_width].copy()
-            bottom_left_img = frame[mid_y:self.frame_height, 0:mid_x].copy()
-            bottom_right_img = frame[mid_y:self.frame_height, mid_x:self.frame_width].copy()
-
-            args_list = [
-                (top_left_img, (0, 0, mid_x, mid_y), self.parent.left_eye_points, self.parent.right_eye_points, alert_flag, alert_severity),
-                (top_right_img, (mid_x, 0, self.frame_width, mid_y), self.parent.left_eye_points, self.parent.right_eye_points, alert_flag, alert_severity),
-                (bottom_left_img, (0, mid_y, mid_x, self.frame_height), self.parent.left_eye_points, self.parent.right_eye_points, alert_flag, alert_severity),
-                (bottom_right_img, (mid_x, mid_y, self.frame_width, self.frame_height), self.parent.left_eye_points, self.parent.right_eye_points, alert_flag, alert_severity)
-            ]
-
-            futures = [self.thread_pool.submit(self.process_quadrant_image, *args) for args in args_list]
-            quad0 = futures[0].result()
-            quad1 = futures[1].result()
-            quad2 = futures[2].result()
-            quad3 = futures[3].result()
-
-            top_row = np.hstack((quad0, quad1))
-            bottom_row = np.hstack((quad2, quad3))
-            combined_frame = np.vstack((top_row, bottom_row))
-
-            if alert_flag or self.parent.pending_alert_message:
-                logging.info(f"Rendering alert: flag={alert_flag}, message={self.parent.pending_alert_message}")
-                rgb_combined = cv2.cvtColor(combined_frame, cv2.COLOR_BGR2RGB)
-                pil_img = Image.fromarray(rgb_combined)
+            start_ns = time.perf_counter_ns()
+            tint = "alert" if alert_flag else "pending" if self.parent.pending_alert_message else None
+            final_frame = self.overlay.compose(frame, self.parent.left_eye_points, self.parent.right_eye_points, tint, alert_severity)
+
+            if self.overlay_detail == "full" and tint:
+                logging.debug(f"Rendering alert: flag={alert_flag}, message={self.parent.pending_alert_message}")
                 alert_message = self.get_alert_message() if alert_flag else self.parent.pending_alert_message
                 if alert_message:
-                    pil_img = render_animated_text(pil_img, alert_message, self.parent.language, self.parent.animation_frame)
-                    combined_frame = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGBA2BGR)
-                    self.parent.animation_frame += 1
+                    # انیمیشن متن بر اساس زمان سپری‌شده از نمایش هشدار است، نه شماره‌ی فریم
+                    now = time.perf_counter()
+                    if self.alert_text_start is None:
+                        self.alert_text_start = now
+                    self.text_sprites.draw(final_frame, alert_message, self.parent.language, now - self.alert_text_start)
                 else:
                     logging.warning("No alert message to render")
             else:
-                self.parent.animation_frame = 0
+                self.alert_text_start = None
 
-            return cv2.cvtColor(combined_frame, cv2.COLOR_BGR2RGB)
+            if self.governor:
+                self.governor.record(time.perf_counter_ns() - start_ns)
+            return final_frame
         except Exception as e:
             logging.error(f"Error finalizing frame: {e}")
             return frame
@@ -374,8 +604,21 @@ class FrameProcessor:
     def cleanup(self):
         try:
             self.is_running = False
-            self.cap.release()
-            self.thread_pool.shutdown(wait=True)
-            self.face_mesh.close()
+            if self.cap is not None:
+                logging.info(f"Frame buffer stats: {self.frame_buffer.stats()}")
+                # دوربین تا پایان خواندن جاری آزاد نمی‌شود؛ آزادسازی وسط cap.read باعث crash می‌شود
+                self.frame_reader_thread.join(CAPTURE_JOIN_TIMEOUT)
+                if self.frame_reader_thread.is_alive():
+                    logging.warning(f"Frame reader still blocked after {CAPTURE_JOIN_TIMEOUT:.0f} s; capture left open")
+                else:
+                    self.cap.release()
+            if self.roi_tracking:
+                logging.info(f"Face ROI tracking: {self.face_tracker.pixel_ratio() * 100:.0f}% of frame pixels processed, {self.face_tracker.full_scans} full-frame scans")
+            if self.keyframe_tracking:
+                logging.info(f"Keyframe tracking: {self.landmark_flow.stats()}")
+            if self.denoise_frames:
+                logging.info(f"Low-light denoising ({self.denoise_mode}): {self.denoise_frames} frames, saved vs full-frame NLM: {self.denoise_savings_text()}")
+            if self.owns_face_mesh and self.face_mesh is not None:
+                self.face_mesh.close()
         except Exception as e:
             logging.error(f"Error cleaning up frame processor: {e}")
\ No newline at end of file
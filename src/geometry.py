@@ -0,0 +1,71 @@
+# geometry.py
+import logging
+import numpy as np
+from src.constants import LEFT_EYE_INDICES, RIGHT_EYE_INDICES, NOSE_INDEX, PITCH_OFFSET
+
+# Landmarks needed for the per-frame geometry: 6 left-eye, 6 right-eye and the nose tip.
+GEOMETRY_INDICES = LEFT_EYE_INDICES + RIGHT_EYE_INDICES + [NOSE_INDEX]
+EYE_POINTS = len(LEFT_EYE_INDICES)
+# EAR = (|p1 - p5| + |p2 - p4|) / (2 |p0 - p3|); the three distances are taken in one subtraction
+EAR_FROM = np.array([1, 2, 0])
+EAR_TO = np.array([5, 4, 3])
+
+class FaceGeometry:
+    __slots__ = ("left_ear", "right_ear", "ear", "left_center", "right_center", "roll", "pitch", "eye_distance", "left_eye_points", "right_eye_points")
+
+    def __init__(self, left_ear, right_ear, ear, left_center, right_center, roll, pitch, eye_distance, left_eye_points, right_eye_points):
+        self.left_ear = left_ear
+        self.right_ear = right_ear
+        self.ear = ear
+        self.left_center = left_center
+        self.right_center = right_center
+        self.roll = roll
+        self.pitch = pitch
+        self.eye_distance = eye_distance
+        self.left_eye_points = left_eye_points
+        self.right_eye_points = right_eye_points
+
+# Reads only the geometry landmarks into one (13, 3) float32 array.
+def landmark_array(face_landmarks):
+    landmark = face_landmarks.landmark
+    points = np.empty((len(GEOMETRY_INDICES), 3), dtype=np.float32)
+    for row, index in enumerate(GEOMETRY_INDICES):
+        lm = landmark[index]
+        points[row] = (lm.x, lm.y, lm.z)
+    return points
+
+# eyes: (..., 2, 6, 2) pixel coordinates; returns (..., 2) EAR per eye, 0 where the eye has no width.
+def eye_aspect_ratios(eyes):
+    distances = np.linalg.norm(eyes[..., EAR_FROM, :] - eyes[..., EAR_TO, :], axis=-1)
+    width = distances[..., 2]
+    return np.divide(distances[..., 0] + distances[..., 1], 2.0 * width, out=np.zeros_like(width), where=width > 0)
+
+# points: (..., 13, 2+) normalized geometry landmarks; all outputs keep the leading batch dimensions.
+def measure(points, width, height):
+    pixels = points[..., :2] * np.array([width, height], dtype=np.float32)
+    eyes = pixels[..., :2 * EYE_POINTS, :].reshape(pixels.shape[:-2] + (2, EYE_POINTS, 2))
+    ears = eye_aspect_ratios(eyes)
+    centers = eyes.mean(axis=-2)
+    delta = centers[..., 1, :] - centers[..., 0, :]
+    eye_distance = np.hypot(delta[..., 0], delta[..., 1])
+    roll = np.degrees(np.arctan2(delta[..., 1], delta[..., 0]))
+    nose_drop = pixels[..., 2 * EYE_POINTS, 1] - centers[..., :, 1].mean(axis=-1)
+    pitch = np.degrees(np.arctan2(nose_drop, eye_distance)) - PITCH_OFFSET
+    return FaceGeometry(
+        ears[..., 0], ears[..., 1], ears.mean(axis=-1), centers[..., 0, :], centers[..., 1, :],
+        roll, pitch, eye_distance, eyes[..., 0, :, :].astype(np.int32), eyes[..., 1, :, :].astype(np.int32)
+    )
+
+def face_geometry(face_landmarks, width, height):
+    try:
+        geometry = measure(landmark_array(face_landmarks), width, height)
+        for name in ("left_ear", "right_ear", "ear", "roll", "pitch", "eye_distance"):
+            setattr(geometry, name, float(getattr(geometry, name)))
+        return geometry
+    except Exception as e:
+        logging.error(f"Error computing face geometry: {e}")
+        return None
+
+# Offline API: landmarks is an (N, 478, 3) or (N, 468, 3) array of normalized FaceMesh landmarks.
+def batch_geometry(landmarks, width, height):
+    return measure(np.asarray(landmarks, dtype=np.float32)[:, GEOMETRY_INDICES, :], width, height)
@@ -0,0 +1,78 @@
+# governor.py
+import logging
+from src.constants import QUALITY_LADDER, GOVERNOR_FRAME_BUDGET_MS, GOVERNOR_EMA_ALPHA, GOVERNOR_SETTLE_FRAMES, GOVERNOR_UPGRADE_RATIO, GOVERNOR_UPGRADE_FRAMES, DENOISE_COST_ORDER
+
+# Holds the per-frame processing cost (analysis plus overlay) under a frame budget by stepping through
+# QUALITY_LADDER: level 0 is full quality, each further level is cheaper. It steps down as soon as the
+# smoothed cost exceeds the budget and steps back up only after a long run of frames well under it.
+class QualityGovernor:
+    def __init__(self, processor, frame_budget_ms=GOVERNOR_FRAME_BUDGET_MS, ladder=QUALITY_LADDER, scale_resolution=True):
+        self.processor = processor
+        self.budget_ns = frame_budget_ms * 1e6
+        self.ladder = ladder
+        self.scale_resolution = scale_resolution
+        self.level = 0
+        self.cost_ns = None
+        self.pending_ns = 0
+        self.frames_at_level = 0
+        self.fast_frames = 0
+        self.changes = 0
+
+    def record(self, elapsed_ns):
+        self.pending_ns += elapsed_ns
+
+    # Called when a new frame starts; closes the cost of the previous one.
+    def next_frame(self):
+        try:
+            if not self.pending_ns:
+                return
+            # One-off stalls (model reload, a cold OpenCV path on the first low-light frame) must not trigger a step on their own
+            cost = min(self.pending_ns, 4 * self.budget_ns)
+            self.pending_ns = 0
+            self.cost_ns = cost if self.cost_ns is None else self.cost_ns + GOVERNOR_EMA_ALPHA * (cost - self.cost_ns)
+            self.frames_at_level += 1
+            if self.frames_at_level < GOVERNOR_SETTLE_FRAMES:
+                return
+
+            if self.cost_ns > self.budget_ns:
+                self.fast_frames = 0
+                if self.level < len(self.ladder) - 1:
+                    self.set_level(self.level + 1)
+            elif self.cost_ns < self.budget_ns * GOVERNOR_UPGRADE_RATIO:
+                self.fast_frames += 1
+                if self.fast_frames >= GOVERNOR_UPGRADE_FRAMES and self.level > 0:
+                    self.set_level(self.level - 1)
+            else:
+                self.fast_frames = 0
+        except Exception as e:
+            logging.error(f"Error in quality governor: {e}")
+
+    # حالت نویززدایی انتخاب‌شده‌ی کاربر؛ نردبان فقط آن را ارزان‌تر می‌کند
+    def denoise_mode_for(self, step):
+        configured = self.processor.configured_denoise_mode
+        return max(step["denoise_mode"] or configured, configured, key=DENOISE_COST_ORDER.index)
+
+    def set_level(self, level):
+        old, new = self.ladder[self.level], self.ladder[level]
+        processor = self.processor
+        changes = []
+        if self.scale_resolution and new["resolution"] != old["resolution"]:
+            processor.set_resolution(*new["resolution"])
+            changes.append(f"resolution {new['resolution'][0]}x{new['resolution'][1]}")
+        if new["refine_landmarks"] != old["refine_landmarks"] and processor.set_refine_landmarks(new["refine_landmarks"]):
+            changes.append(f"iris refinement {'on' if new['refine_landmarks'] else 'off'}")
+        denoise_mode = self.denoise_mode_for(new)
+        if denoise_mode != processor.denoise_mode:
+            processor.set_denoise_mode(denoise_mode, configured=False)
+            changes.append(f"denoise {denoise_mode}")
+        if new["overlay"] != old["overlay"]:
+            processor.overlay_detail = new["overlay"]
+            changes.append(f"overlay {new['overlay']}")
+
+        direction = "down" if level > self.level else "up"
+        logging.info(f"Quality governor stepped {direction} to level {level} (frame cost {self.cost_ns / 1e6:.1f} ms, budget {self.budget_ns / 1e6:.1f} ms): {', '.join(changes) or 'no change'}")
+        self.level = level
+        self.changes += 1
+        self.cost_ns = None
+        self.frames_at_level = 0
+        self.fast_frames = 0
@@ -0,0 +1,145 @@
+# headless.py
+import os
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.frame_processor import FrameProcessor
+from src.alert_handler import AlertHandler
+from src.utils import get_texts
+from src.constants import CONFIG_FILE, EYE_AR_THRESH, EYE_AR_CONSEC_FRAMES, HEAD_ROLL_THRESH, HEAD_PITCH_THRESH, ALERT_MIN_DURATION, ALERT_COOLDOWN, HEADLESS_REPORT_INTERVAL, HEADLESS_FRAME_TIMEOUT
+
+# Stands in for DrowsinessApp as the `parent` of FrameProcessor and AlertHandler when there is no display.
+class HeadlessParent:
+    def __init__(self):
+        self.language = "fa"
+        self.theme = "dark"
+        self.texts = get_texts()
+
+        # Detection thresholds
+        self.EYE_AR_THRESH = EYE_AR_THRESH
+        self.EYE_AR_CONSEC_FRAMES = EYE_AR_CONSEC_FRAMES
+        self.HEAD_ROLL_THRESH = HEAD_ROLL_THRESH
+        self.HEAD_PITCH_THRESH = HEAD_PITCH_THRESH
+        self.ALERT_MIN_DURATION = ALERT_MIN_DURATION
+        self.ALERT_COOLDOWN = ALERT_COOLDOWN
+
+        # Frame processing attributes
+        self.left_eye_points = []
+        self.right_eye_points = []
+        self.current_roll = 0.0
+        self.current_pitch = 0.0
+        self.direction_text = "---"
+        self.roll_dir = ""
+        self.pitch_dir = ""
+        self.alert_severity = "none"
+        self.brightness = 0.0
+        self.pending_alert_message = None
+
+        self.frame_processor = None
+        self.alert_handler = None
+
+        self.load_config()
+
+    def load_config(self):
+        try:
+            if os.path.exists(CONFIG_FILE):
+                with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+                self.language = config.get("language", self.language)
+                self.theme = config.get("theme", self.theme)
+                self.EYE_AR_THRESH = config.get("ear_threshold", int(self.EYE_AR_THRESH * 100)) / 100.0
+                self.EYE_AR_CONSEC_FRAMES = config.get("consec_frames", self.EYE_AR_CONSEC_FRAMES)
+                self.HEAD_ROLL_THRESH = config.get("roll_tilt", self.HEAD_ROLL_THRESH)
+                self.HEAD_PITCH_THRESH = config.get("pitch_tilt", self.HEAD_PITCH_THRESH)
+                logging.info("Configuration loaded successfully in headless mode")
+        except Exception as e:
+            logging.error(f"Error loading configuration in headless mode: {e}")
+
+    def show_warning(self, message):
+        logging.warning(message)
+
+    def apply_frame_data(self, frame_data):
+        self.left_eye_points = frame_data.left_eye_points
+        self.right_eye_points = frame_data.right_eye_points
+        self.current_roll = frame_data.current_roll
+        self.current_pitch = frame_data.current_pitch
+        self.direction_text = frame_data.direction_text
+        self.roll_dir = frame_data.roll_dir
+        self.pitch_dir = frame_data.pitch_dir
+        self.alert_severity = frame_data.alert_severity
+        self.brightness = frame_data.brightness
+
+class HeadlessMonitor(HeadlessParent):
+    # started_ns: time.monotonic_ns() when the process started, for the time to the first processed frame
+    def __init__(self, report_interval=HEADLESS_REPORT_INTERVAL, multiprocess=False, started_ns=None):
+        super().__init__()
+        self.report_interval = report_interval
+        self.started_ns = started_ns or time.monotonic_ns()
+        self.is_running = False
+        self.trace_requested = False
+        self.frame_count = 0
+        # دوربین و مدل (در FrameProcessor) هم‌زمان با صدا و پوشه‌ی هشدار (در AlertHandler) آماده می‌شوند
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="Startup") as executor:
+            processor = executor.submit(self.create_frame_processor, multiprocess)
+            handler = executor.submit(AlertHandler, self)
+        self.frame_processor = processor.result()
+        self.alert_handler = handler.result()
+        logging.info(f"Startup: modules loaded after {(time.monotonic_ns() - self.started_ns) / 1e6:.0f} ms")
+
+    def create_frame_processor(self, multiprocess):
+        if multiprocess:
+            from src.shm_pipeline import SharedMemoryFrameProcessor
+            return SharedMemoryFrameProcessor(self)
+        return FrameProcessor(self)
+
+    def run(self):
+        self.is_running = True
+        logging.info("Headless detection started")
+        report_start = time.perf_counter()
+        report_frames = 0
+        try:
+            while self.is_running:
+                if self.trace_requested:
+                    self.trace_requested = False
+                    self.frame_processor.tracer.export_chrome_trace()
+                if not self.frame_processor.wait_for_frame(HEADLESS_FRAME_TIMEOUT):
+                    continue
+                frame_data = self.frame_processor.process_frame()
+                if frame_data is None:
+                    continue
+
+                self.apply_frame_data(frame_data)
+                with self.frame_processor.tracer.span(self.frame_processor.current_frame_id, "handle_alerts"):
+                    self.alert_handler.handle_result(frame_data)
+                self.frame_count += 1
+                report_frames += 1
+                if self.frame_count == 1:
+                    logging.info(f"Startup: first processed frame after {(time.monotonic_ns() - self.started_ns) / 1e6:.0f} ms")
+
+                elapsed = time.perf_counter() - report_start
+                if elapsed >= self.report_interval:
+                    stats = self.frame_processor.frame_buffer.stats()
+                    logging.info(f"Headless detection rate: {report_frames / elapsed:.1f} FPS (alerts: {self.alert_handler.alert_count}, dropped frames: {stats['dropped']}, duplicate polls: {stats['duplicates']}, denoise saved: {self.frame_processor.denoise_savings_text()})")
+                    report_start = time.perf_counter()
+                    report_frames = 0
+        except KeyboardInterrupt:
+            logging.info("Headless detection interrupted")
+        finally:
+            self.cleanup()
+        return 0
+
+    def stop(self):
+        self.is_running = False
+
+    # Safe to call from a signal handler; the trace is written by the detection loop.
+    def request_trace(self):
+        self.trace_requested = True
+
+    def cleanup(self):
+        logging.info(f"Stopping headless detection after {self.frame_count} frames...")
+        try:
+            self.frame_processor.cleanup()
+            self.alert_handler.cleanup()
+        except Exception as e:
+            logging.error(f"Error during headless cleanup: {e}")
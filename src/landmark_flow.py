@@ -0,0 +1,113 @@
+# landmark_flow.py
+import logging
+import types
+import numpy as np
+import cv2
+from src.geometry import eye_aspect_ratios
+from src.constants import LEFT_EYE_INDICES, RIGHT_EYE_INDICES, NOSE_INDEX, KEYFRAME_INTERVAL, KEYFRAME_EAR_JUMP, LK_WINDOW_SIZE, LK_MAX_LEVEL, LK_MAX_ERROR, LK_MAX_FB_ERROR
+
+FLOW_INDICES = LEFT_EYE_INDICES + RIGHT_EYE_INDICES + [NOSE_INDEX]
+LK_PARAMS = dict(
+    winSize=LK_WINDOW_SIZE, maxLevel=LK_MAX_LEVEL,
+    criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03)
+)
+
+# The eye and nose landmarks moved by optical flow, indexed like FaceMesh landmarks (normalized coordinates).
+class TrackedLandmarks:
+    __slots__ = ("points",)
+
+    def __init__(self, points):
+        self.points = points
+
+    @property
+    def landmark(self):
+        return self
+
+    def __getitem__(self, index):
+        x, y = self.points[index]
+        return types.SimpleNamespace(x=x, y=y, z=0.0)
+
+# Runs FaceMesh on keyframes only and moves the 12 eye landmarks and the nose tip with pyramidal
+# Lucas-Kanade in between. track() returns None whenever a keyframe is due: on schedule, when the
+# crop moved, when forward-backward tracking error is too high, or when EAR jumps (blinks get FaceMesh).
+class LandmarkFlow:
+    def __init__(self, frame_width, frame_height):
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.prev_gray = None
+        self.prev_offset = None
+        self.points = None
+        self.last_ear = 0.0
+        self.frames_since_keyframe = 0
+        self.keyframes = 0
+        self.flow_frames = 0
+        self.tracking_failures = 0
+        self.ear_jumps = 0
+
+    def reset(self):
+        self.prev_gray = None
+        self.points = None
+
+    @staticmethod
+    def points_ear(points):
+        eyes = points[:len(LEFT_EYE_INDICES) + len(RIGHT_EYE_INDICES)].reshape(2, len(LEFT_EYE_INDICES), 2)
+        return float(eye_aspect_ratios(eyes).mean())
+
+    # gray: grayscale image the keyframe landmarks were found in; offset: its position in the full frame.
+    def start(self, gray, offset, results):
+        try:
+            self.keyframes += 1
+            if gray is None or not results.multi_face_landmarks:
+                self.reset()
+                return
+            face_landmarks = results.multi_face_landmarks[0]
+            points = np.array([
+                (face_landmarks.landmark[index].x * self.frame_width - offset[0], face_landmarks.landmark[index].y * self.frame_height - offset[1])
+                for index in FLOW_INDICES
+            ], dtype=np.float32)
+            self.prev_gray = gray
+            self.prev_offset = offset
+            self.points = points.reshape(-1, 1, 2)
+            self.last_ear = self.points_ear(points)
+            self.frames_since_keyframe = 0
+        except Exception as e:
+            logging.error(f"Error starting landmark flow: {e}")
+            self.reset()
+
+    def track(self, gray, offset):
+        try:
+            if self.points is None or self.frames_since_keyframe + 1 >= KEYFRAME_INTERVAL:
+                return None
+            if offset != self.prev_offset or gray.shape != self.prev_gray.shape:
+                return None
+
+            next_points, status, error = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.points, None, **LK_PARAMS)
+            back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, next_points, None, **LK_PARAMS)
+            fb_error = np.abs(back_points - self.points).max()
+            if not status.all() or not back_status.all() or error.max() > LK_MAX_ERROR or fb_error > LK_MAX_FB_ERROR:
+                self.tracking_failures += 1
+                return None
+
+            points = next_points.reshape(-1, 2)
+            ear = self.points_ear(points)
+            # تغییر ناگهانی EAR (مثلاً پلک زدن) با FaceMesh دوباره اندازه‌گیری می‌شود
+            if abs(ear - self.last_ear) > KEYFRAME_EAR_JUMP:
+                self.ear_jumps += 1
+                return None
+
+            self.prev_gray = gray
+            self.points = next_points
+            self.last_ear = ear
+            self.frames_since_keyframe += 1
+            self.flow_frames += 1
+            normalized = {
+                index: ((x + offset[0]) / self.frame_width, (y + offset[1]) / self.frame_height)
+                for index, (x, y) in zip(FLOW_INDICES, points)
+            }
+            return types.SimpleNamespace(multi_face_landmarks=[TrackedLandmarks(normalized)])
+        except Exception as e:
+            logging.error(f"Error tracking landmarks: {e}")
+            return None
+
+    def stats(self):
+        return {"keyframes": self.keyframes, "flow_frames": self.flow_frames, "tracking_failures": self.tracking_failures, "ear_jumps": self.ear_jumps}
@@ -0,0 +1,178 @@
+# multi_camera.py
+import os
+import time
+import logging
+import threading
+from src.frame_processor import FrameProcessor
+from src.alert_handler import AlertHandler
+from src.headless import HeadlessParent
+from src.constants import MULTI_CAMERA_FOLDER, FACEMESH_POOL_SIZE, MULTI_CAMERA_FRAME_TIMEOUT, HEADLESS_REPORT_INTERVAL, TRACE_FOLDER
+
+# One monitored camera: its own capture thread, EAR/head-pose history, alert state, log and recordings.
+# The FaceMesh model is not owned by the stream; the pool passes one in for every frame.
+class CameraStream(HeadlessParent):
+    def __init__(self, index, source):
+        super().__init__()
+        self.index = index
+        self.source = source
+        self.name = f"camera_{index}"
+        self.busy = False
+        self.last_served = 0.0
+        self.frame_count = 0
+        self.report_frames = 0
+        self.frame_processor = FrameProcessor(self, source=source, load_model=False)
+        # هر دوربین پوشه‌ی هشدار و کانال صدای مخصوص خود را دارد
+        self.alert_handler = AlertHandler(
+            self, alert_folder=os.path.join(MULTI_CAMERA_FOLDER, self.name),
+            alarm_channel_id=index, persist_config=False
+        )
+
+    def show_warning(self, message):
+        logging.warning(f"[{self.name}] {message}")
+
+    def process(self, face_mesh):
+        frame_data = self.frame_processor.process_frame(face_mesh)
+        if frame_data is None:
+            return
+        self.apply_frame_data(frame_data)
+        with self.frame_processor.tracer.span(self.frame_processor.current_frame_id, "handle_alerts"):
+            self.alert_handler.handle_result(frame_data)
+        self.frame_count += 1
+        self.report_frames += 1
+
+    def cleanup(self):
+        try:
+            self.frame_processor.cleanup()
+            self.alert_handler.cleanup()
+        except Exception as e:
+            logging.error(f"Error cleaning up {self.name}: {e}")
+
+# Fixed pool of FaceMesh workers shared by all streams, woken by the streams' triple buffers.
+# With at least one worker per stream, each stream is pinned to one worker so FaceMesh can keep
+# tracking between frames. With fewer workers, FaceMesh runs in static-image mode (tracking state
+# would mix faces from different cameras) and a free worker takes the longest-waiting stream.
+class FaceMeshPool:
+    def __init__(self, streams, workers=FACEMESH_POOL_SIZE):
+        self.streams = streams
+        # pinned: one worker per stream, so no more FaceMesh instances than streams
+        self.workers = max(1, min(workers, len(streams)))
+        self.pinned = self.workers == len(streams)
+        self.condition = threading.Condition()
+        self.is_running = False
+        self.threads = []
+        self.face_meshes = [FrameProcessor.create_face_mesh(static_image_mode=not self.pinned) for _ in range(self.workers)]
+        self.processed = [0] * self.workers
+        for stream in streams:
+            stream.frame_processor.frame_buffer.on_publish = self.notify
+
+    def notify(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    # Called with the condition held.
+    def next_stream(self, worker_index):
+        candidates = [
+            stream for stream in self.streams
+            if not stream.busy and stream.frame_processor.frame_buffer.has_new_frame()
+            and (not self.pinned or stream.index % self.workers == worker_index)
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda stream: stream.last_served)
+
+    def start(self):
+        self.is_running = True
+        for index in range(self.workers):
+            thread = threading.Thread(target=self.run_worker, args=(index,), name=f"FaceMeshWorker-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        mode = "pinned" if self.pinned else "shared"
+        logging.info(f"Started {self.workers} FaceMesh workers for {len(self.streams)} cameras ({mode} scheduling)")
+
+    def run_worker(self, index):
+        face_mesh = self.face_meshes[index]
+        while self.is_running:
+            try:
+                with self.condition:
+                    stream = self.condition.wait_for(lambda: self.next_stream(index) if self.is_running else None, MULTI_CAMERA_FRAME_TIMEOUT)
+                    if stream is None:
+                        continue
+                    stream.busy = True
+                    stream.last_served = time.perf_counter()
+                try:
+                    stream.process(face_mesh)
+                    self.processed[index] += 1
+                finally:
+                    with self.condition:
+                        stream.busy = False
+                        self.condition.notify_all()
+            except Exception as e:
+                logging.error(f"Error in FaceMesh worker {index}: {e}")
+
+    def stop(self, timeout=2.0):
+        self.is_running = False
+        self.notify()
+        for thread in self.threads:
+            thread.join(timeout)
+        for face_mesh in self.face_meshes:
+            try:
+                if face_mesh is not None:
+                    face_mesh.close()
+            except Exception as e:
+                logging.error(f"Error closing FaceMesh: {e}")
+        logging.info(f"FaceMesh pool stopped; frames per worker: {self.processed}")
+
+# Monitors several camera sources in one process, without a window, sharing one mixer and one FaceMesh pool.
+class MultiCameraMonitor:
+    def __init__(self, sources, workers=FACEMESH_POOL_SIZE, report_interval=HEADLESS_REPORT_INTERVAL):
+        self.report_interval = report_interval
+        self.stop_event = threading.Event()
+        self.trace_requested = False
+        self.streams = []
+        try:
+            for index, source in enumerate(sources):
+                self.streams.append(CameraStream(index, source))
+        except Exception:
+            for stream in self.streams:
+                stream.cleanup()
+            raise
+        self.pool = FaceMeshPool(self.streams, workers)
+
+    def run(self):
+        logging.info(f"Multi-camera detection started for {len(self.streams)} sources")
+        self.pool.start()
+        report_start = time.perf_counter()
+        try:
+            while not self.stop_event.wait(self.report_interval):
+                if self.trace_requested:
+                    self.trace_requested = False
+                    self.export_traces()
+                elapsed = time.perf_counter() - report_start
+                for stream in self.streams:
+                    stats = stream.frame_processor.frame_buffer.stats()
+                    logging.info(f"[{stream.name}] detection rate: {stream.report_frames / elapsed:.1f} FPS (alerts: {stream.alert_handler.alert_count}, dropped frames: {stats['dropped']})")
+                    stream.report_frames = 0
+                report_start = time.perf_counter()
+        except KeyboardInterrupt:
+            logging.info("Multi-camera detection interrupted")
+        finally:
+            self.cleanup()
+        return 0
+
+    def stop(self):
+        self.stop_event.set()
+
+    def request_trace(self):
+        self.trace_requested = True
+
+    def export_traces(self):
+        os.makedirs(TRACE_FOLDER, exist_ok=True)
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        for stream in self.streams:
+            stream.frame_processor.tracer.export_chrome_trace(os.path.join(TRACE_FOLDER, f"trace_{stamp}_{stream.name}.json"))
+
+    def cleanup(self):
+        logging.info("Stopping multi-camera detection...")
+        self.pool.stop()
+        for stream in self.streams:
+            stream.cleanup()
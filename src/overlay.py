@@ -0,0 +1,55 @@
+# overlay.py
+import logging
+import numpy as np
+import cv2
+from src.constants import OVERLAY_TINT_COLORS, OVERLAY_DEFAULT_TINT, OVERLAY_ALERT_ALPHA, OVERLAY_PENDING_ALPHA, OVERLAY_OUTPUT_BUFFERS, EYE_CONTOUR_COLOR
+
+def bgr_to_rgb(color):
+    return (color[2], color[1], color[0])
+
+# Draws the display overlay into preallocated RGB buffers: one BGR->RGB conversion of the frame,
+# then the severity tint blended in place against a cached solid layer, then the eye contours.
+# Output buffers rotate so the frame handed to the display is not overwritten while the next
+# one is drawn; a returned frame stays valid for OVERLAY_OUTPUT_BUFFERS - 1 further calls.
+class OverlayCompositor:
+    def __init__(self, buffers=OVERLAY_OUTPUT_BUFFERS):
+        self.buffer_count = buffers
+        self.buffers = []
+        self.next_buffer = 0
+        self.tint_layers = {}  # (severity, shape) -> solid RGB layer
+        self.eye_color = bgr_to_rgb(EYE_CONTOUR_COLOR)
+
+    def output_buffer(self, shape):
+        if not self.buffers or self.buffers[0].shape != shape:
+            # the quality governor changed the resolution
+            self.buffers = [np.empty(shape, dtype=np.uint8) for _ in range(self.buffer_count)]
+            self.tint_layers.clear()
+            self.next_buffer = 0
+        buffer = self.buffers[self.next_buffer]
+        self.next_buffer = (self.next_buffer + 1) % self.buffer_count
+        return buffer
+
+    def tint_layer(self, severity, shape):
+        key = (severity, shape)
+        layer = self.tint_layers.get(key)
+        if layer is None:
+            layer = np.empty(shape, dtype=np.uint8)
+            layer[:] = bgr_to_rgb(OVERLAY_TINT_COLORS.get(severity, OVERLAY_DEFAULT_TINT))
+            self.tint_layers[key] = layer
+        return layer
+
+    # tint: None, "alert" (alert shown) or "pending" (alert about to start); returns the RGB frame.
+    def compose(self, frame, left_eye_points, right_eye_points, tint=None, severity="none"):
+        try:
+            rgb = self.output_buffer(frame.shape)
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+            if tint:
+                alpha = OVERLAY_PENDING_ALPHA if tint == "pending" else OVERLAY_ALERT_ALPHA
+                cv2.addWeighted(self.tint_layer(severity, frame.shape), alpha, rgb, 1 - alpha, 0, dst=rgb)
+            contours = [points for points in (left_eye_points, right_eye_points) if len(points)]
+            if contours:
+                cv2.polylines(rgb, contours, True, self.eye_color, 1)
+            return rgb
+        except Exception as e:
+            logging.error(f"Error composing overlay: {e}")
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -0,0 +1,83 @@
+# pipeline.py
+import logging
+import threading
+from collections import deque
+from src.constants import DETECTION_FRAME_TIMEOUT, RESULT_QUEUE_SIZE
+
+# Bounded queue where a full put evicts the oldest item, so the consumer always sees the newest result.
+class LatestResultQueue:
+    def __init__(self, maxsize=RESULT_QUEUE_SIZE):
+        self.items = deque(maxlen=maxsize)
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, item):
+        with self.lock:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+
+    def get(self):
+        with self.lock:
+            return self.items.popleft() if self.items else None
+
+class DetectionResult:
+    __slots__ = ("frame_id", "frame", "smoothed_ear", "current_roll", "current_pitch", "direction_text", "alert_count", "blink_rate")
+
+    def __init__(self, frame_id, frame, smoothed_ear, current_roll, current_pitch, direction_text, alert_count, blink_rate):
+        self.frame_id = frame_id
+        self.frame = frame
+        self.smoothed_ear = smoothed_ear
+        self.current_roll = current_roll
+        self.current_pitch = current_pitch
+        self.direction_text = direction_text
+        self.alert_count = alert_count
+        self.blink_rate = blink_rate
+
+# Runs detection, alerting and overlay rendering off the GUI thread, woken by new camera frames.
+# Capture of frame N+1, detection of frame N and display of frame N-1 overlap.
+class DetectionWorker(threading.Thread):
+    def __init__(self, parent, result_queue, on_result=None, render=True):
+        super().__init__(name="DetectionWorker", daemon=True)
+        self.parent = parent
+        self.result_queue = result_queue
+        self.on_result = on_result
+        self.render = render
+        self.is_running = True
+
+    def run(self):
+        processor = self.parent.frame_processor
+        handler = self.parent.alert_handler
+        tracer = processor.tracer
+        while self.is_running:
+            try:
+                if not processor.wait_for_frame(DETECTION_FRAME_TIMEOUT):
+                    continue
+                frame_data = processor.process_frame()
+                if frame_data is None:
+                    continue
+
+                frame_id = processor.current_frame_id
+                self.parent.apply_frame_data(frame_data)
+                with tracer.span(frame_id, "handle_alerts"):
+                    handler.handle_result(frame_data)
+
+                final_frame = None
+                if self.render:
+                    with tracer.span(frame_id, "finalize_frame"):
+                        final_frame = processor.finalize_frame(frame_data.frame, frame_data.alert_flag, frame_data.alert_severity)
+
+                self.result_queue.put(DetectionResult(
+                    frame_id, final_frame, frame_data.smoothed_ear, frame_data.current_roll, frame_data.current_pitch, frame_data.direction_text,
+                    handler.alert_count, handler.calculate_blink_rate()
+                ))
+                if self.on_result:
+                    self.on_result()
+            except Exception as e:
+                logging.error(f"Error in detection worker: {e}")
+
+    def stop(self, timeout=2.0):
+        self.is_running = False
+        if self.is_alive():
+            self.join(timeout)
+        logging.info(f"Detection worker stopped; results dropped by the display: {self.result_queue.dropped}")
@@ -0,0 +1,190 @@
+# rolling_stats.py
+from collections import deque
+import numpy as np
+
+# Fixed-size window over the last `capacity` values with O(1) mean/variance (running sums, re-summed
+# once per wrap to stop floating-point drift) and amortized O(1) min/max (monotonic queues).
+class RollingWindow:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+        self.index = 0  # next slot to write
+        self.total = 0  # number of values ever appended
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min_queue = deque()  # (sequence, value), values increasing
+        self.max_queue = deque()  # (sequence, value), values decreasing
+
+    def __len__(self):
+        return self.count
+
+    def full(self):
+        return self.count == self.capacity
+
+    def append(self, value):
+        value = float(value)
+        if self.count == self.capacity:
+            old = self.values[self.index]
+            self.sum -= old
+            self.sum_sq -= old * old
+        else:
+            self.count += 1
+        self.values[self.index] = value
+        self.sum += value
+        self.sum_sq += value * value
+        self.index = (self.index + 1) % self.capacity
+        if self.index == 0:
+            self.sum = float(self.values.sum())
+            self.sum_sq = float(np.dot(self.values, self.values))
+
+        sequence = self.total
+        self.total += 1
+        oldest = self.total - self.count
+        while self.min_queue and self.min_queue[-1][1] >= value:
+            self.min_queue.pop()
+        self.min_queue.append((sequence, value))
+        while self.min_queue[0][0] < oldest:
+            self.min_queue.popleft()
+        while self.max_queue and self.max_queue[-1][1] <= value:
+            self.max_queue.pop()
+        self.max_queue.append((sequence, value))
+        while self.max_queue[0][0] < oldest:
+            self.max_queue.popleft()
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    # Population variance, like np.var
+    def var(self):
+        if not self.count:
+            return 0.0
+        mean = self.sum / self.count
+        return max(self.sum_sq / self.count - mean * mean, 0.0)
+
+    def std(self):
+        return self.var() ** 0.5
+
+    def min(self):
+        return self.min_queue[0][1] if self.count else 0.0
+
+    def max(self):
+        return self.max_queue[0][1] if self.count else 0.0
+
+    def clear(self):
+        self.count = 0
+        self.index = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min_queue.clear()
+        self.max_queue.clear()
+
+    # Values oldest first (allocates; for inspection, not the per-frame path)
+    def to_array(self):
+        if self.count < self.capacity:
+            return self.values[:self.count].copy()
+        return np.roll(self.values, -self.index)
+
+# Window over the values of the last `duration_ns` nanoseconds, stored in a ring of at most `capacity`
+# entries (the oldest are dropped early if the ring fills). Same statistics as RollingWindow.
+class TimedRollingWindow:
+    def __init__(self, duration_ns, capacity):
+        self.duration_ns = duration_ns
+        self.capacity = capacity
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.start = 0  # index of the oldest entry
+        self.count = 0
+        self.total = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.evictions = 0
+        self.min_queue = deque()
+        self.max_queue = deque()
+
+    def __len__(self):
+        return self.count
+
+    def pop_oldest(self):
+        old = self.values[self.start]
+        self.sum -= old
+        self.sum_sq -= old * old
+        self.start = (self.start + 1) % self.capacity
+        self.count -= 1
+        self.evictions += 1
+        # re-sum now and then so repeated subtraction does not drift
+        if self.evictions % self.capacity == 0:
+            self.resum()
+
+    def resum(self):
+        indices = (self.start + np.arange(self.count)) % self.capacity
+        window = self.values[indices]
+        self.sum = float(window.sum())
+        self.sum_sq = float(np.dot(window, window))
+
+    def append(self, value, timestamp_ns):
+        value = float(value)
+        if self.count == self.capacity:
+            self.pop_oldest()
+        end = (self.start + self.count) % self.capacity
+        self.values[end] = value
+        self.times[end] = timestamp_ns
+        self.count += 1
+        self.sum += value
+        self.sum_sq += value * value
+        self.expire(timestamp_ns)
+
+        sequence = self.total
+        self.total += 1
+        while self.min_queue and self.min_queue[-1][1] >= value:
+            self.min_queue.pop()
+        self.min_queue.append((sequence, value))
+        while self.max_queue and self.max_queue[-1][1] <= value:
+            self.max_queue.pop()
+        self.max_queue.append((sequence, value))
+        self.trim_queues()
+
+    def expire(self, now_ns):
+        cutoff = now_ns - self.duration_ns
+        while self.count and self.times[self.start] < cutoff:
+            self.pop_oldest()
+        self.trim_queues()
+
+    def trim_queues(self):
+        oldest = self.total - self.count
+        while self.min_queue and self.min_queue[0][0] < oldest:
+            self.min_queue.popleft()
+        while self.max_queue and self.max_queue[0][0] < oldest:
+            self.max_queue.popleft()
+
+    # Time between the oldest and newest entry
+    def span_ns(self):
+        if self.count < 2:
+            return 0
+        return int(self.times[(self.start + self.count - 1) % self.capacity] - self.times[self.start])
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def var(self):
+        if not self.count:
+            return 0.0
+        mean = self.sum / self.count
+        return max(self.sum_sq / self.count - mean * mean, 0.0)
+
+    def std(self):
+        return self.var() ** 0.5
+
+    def min(self):
+        return self.min_queue[0][1] if self.count else 0.0
+
+    def max(self):
+        return self.max_queue[0][1] if self.count else 0.0
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min_queue.clear()
+        self.max_queue.clear()
@@ -0,0 +1,280 @@
+# shm_pipeline.py
+import time
+import queue
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import cv2
+from src.frame_processor import FrameProcessor
+from src.headless import HeadlessParent
+from src.constants import FRAME_WIDTH, FRAME_HEIGHT, SHM_INPUT_SLOTS, SHM_OUTPUT_SLOTS, SHM_FRAME_TIMEOUT, SHM_JOIN_TIMEOUT
+
+# Ring of frame slots in one SharedMemory block. The header holds one sequence number per slot
+# plus the latest published sequence; a slot reads as -1 while it is being written (seqlock).
+# After it come the slots' capture timestamps (time.monotonic_ns(), shared by all processes).
+class SharedFrameRing:
+    def __init__(self, slots, height, width, name=None):
+        self.slots = slots
+        self.shape = (height, width, 3)
+        header_bytes = 8 * (2 * slots + 1)
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=header_bytes + slots * height * width * 3)
+        else:
+            # Child processes share the creator's resource tracker, so only the creator unlinks.
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.header = np.ndarray((slots + 1,), dtype=np.int64, buffer=self.shm.buf)
+        self.timestamps = np.ndarray((slots,), dtype=np.int64, buffer=self.shm.buf, offset=8 * (slots + 1))
+        self.last_timestamp_ns = 0
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf, offset=header_bytes)
+        if self.owner:
+            self.header[:] = 0
+            self.timestamps[:] = 0
+
+    def spec(self):
+        return (self.shm.name, self.slots, self.shape[0], self.shape[1])
+
+    @classmethod
+    def attach(cls, spec):
+        name, slots, height, width = spec
+        return cls(slots, height, width, name=name)
+
+    def begin_write(self, sequence):
+        slot = sequence % self.slots
+        self.header[slot] = -1
+        return slot, self.frames[slot]
+
+    def end_write(self, slot, sequence, timestamp_ns=0):
+        self.timestamps[slot] = timestamp_ns
+        self.header[slot] = sequence
+        self.header[self.slots] = sequence
+
+    def latest_sequence(self):
+        return int(self.header[self.slots])
+
+    # Copies the frame with this sequence into `out` and its timestamp into last_timestamp_ns;
+    # False if the slot was overwritten meanwhile.
+    def read(self, sequence, out):
+        slot = sequence % self.slots
+        if self.header[slot] != sequence:
+            return False
+        self.last_timestamp_ns = int(self.timestamps[slot])
+        np.copyto(out, self.frames[slot])
+        return self.header[slot] == sequence
+
+    def close(self):
+        self.header = None
+        self.timestamps = None
+        self.frames = None
+        try:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+        except Exception as e:
+            logging.error(f"Error releasing shared memory: {e}")
+
+# AlertHandler stays in the main process; the inference process only needs its sensitivity mode.
+class AlertSettings:
+    def __init__(self, sensitivity_mode):
+        self.sensitivity_mode = sensitivity_mode
+
+class InferenceParent(HeadlessParent):
+    def __init__(self, settings):
+        super().__init__()
+        self.alert_handler = AlertSettings("normal")
+        self.apply_settings(settings)
+
+    def apply_settings(self, settings):
+        self.EYE_AR_THRESH = settings["EYE_AR_THRESH"]
+        self.HEAD_ROLL_THRESH = settings["HEAD_ROLL_THRESH"]
+        self.HEAD_PITCH_THRESH = settings["HEAD_PITCH_THRESH"]
+        self.language = settings["language"]
+        self.alert_handler.sensitivity_mode = settings["sensitivity_mode"]
+
+def configure_process_logging():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(processName)s - %(message)s')
+
+def capture_process(source, ring_spec, frame_ready, stop_event):
+    configure_process_logging()
+    ring = SharedFrameRing.attach(ring_spec)
+    cap = cv2.VideoCapture(source)
+    try:
+        if not cap.isOpened():
+            logging.error(f"Cannot open video source: {source}")
+            return
+        size = (ring.shape[1], ring.shape[0])
+        sequence = 0
+        while not stop_event.is_set():
+            slot, target = ring.begin_write(sequence + 1)
+            # اگر اندازه‌ی فریم دوربین با اسلات یکی باشد، مستقیم در حافظه‌ی مشترک خوانده می‌شود
+            ret, frame = cap.read(target)
+            timestamp_ns = time.monotonic_ns()
+            if not ret:
+                logging.warning("Failed to read frame from webcam.")
+                time.sleep(0.005)
+                continue
+            if frame is not target:
+                cv2.resize(frame, size, dst=target)
+            sequence += 1
+            ring.end_write(slot, sequence, timestamp_ns)
+            frame_ready.set()
+    except Exception as e:
+        logging.error(f"Error in capture process: {e}")
+    finally:
+        cap.release()
+        ring.close()
+
+def inference_process(input_spec, output_spec, frame_ready, result_queue, control_queue, stop_event, settings):
+    configure_process_logging()
+    input_ring = SharedFrameRing.attach(input_spec)
+    output_ring = SharedFrameRing.attach(output_spec)
+    parent = InferenceParent(settings)
+    processor = None
+    try:
+        processor = FrameProcessor(parent, source=None)
+        if processor.governor:
+            # Output ring slots have a fixed size
+            processor.governor.scale_resolution = False
+        frame = np.empty(input_ring.shape, dtype=np.uint8)
+        last_sequence = 0
+        while not stop_event.is_set():
+            if not frame_ready.wait(SHM_FRAME_TIMEOUT):
+                continue
+            frame_ready.clear()
+            try:
+                while True:
+                    parent.apply_settings(control_queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            sequence = input_ring.latest_sequence()
+            if sequence == last_sequence or not input_ring.read(sequence, frame):
+                continue
+            last_sequence = sequence
+
+            start_ns = time.perf_counter_ns()
+            frame_data = processor.analyze_frame(frame, sequence, timestamp_ns=input_ring.last_timestamp_ns)
+            if frame_data is None:
+                continue
+            slot, target = output_ring.begin_write(sequence)
+            np.copyto(target, frame_data.frame)
+            output_ring.end_write(slot, sequence, frame_data.timestamp_ns)
+            # The frame travels through the output ring, not the queue
+            frame_data.frame = None
+            result_queue.put((sequence, frame_data, parent.EYE_AR_THRESH, processor.kalman_ear, start_ns, time.perf_counter_ns()))
+    except Exception as e:
+        logging.error(f"Error in inference process: {e}")
+    finally:
+        if processor is not None:
+            processor.cleanup()
+        input_ring.close()
+        output_ring.close()
+
+# Drop-in FrameProcessor that runs capture and FaceMesh inference in separate processes.
+# Frames travel through shared memory; only small result tuples cross the process boundary.
+# Alert handling and overlay rendering stay in the calling process.
+class SharedMemoryFrameProcessor(FrameProcessor):
+    def __init__(self, parent, source=0):
+        super().__init__(parent, source=None, load_model=False)
+        context = multiprocessing.get_context("spawn")
+        self.input_ring = SharedFrameRing(SHM_INPUT_SLOTS, FRAME_HEIGHT, FRAME_WIDTH)
+        self.output_ring = SharedFrameRing(SHM_OUTPUT_SLOTS, FRAME_HEIGHT, FRAME_WIDTH)
+        self.frame_ready = context.Event()
+        self.stop_event = context.Event()
+        self.result_queue = context.Queue()
+        self.control_queue = context.Queue()
+        # Frame returned by process_frame; valid until the next call
+        self.frame = np.empty((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
+        self.pending_result = None
+        self.skipped_results = 0
+        self.stale_results = 0
+        self.synced_ear_thresh = parent.EYE_AR_THRESH
+        self.sent_settings = self.current_settings()
+
+        self.capture = context.Process(
+            target=capture_process, name="CaptureProcess",
+            args=(source, self.input_ring.spec(), self.frame_ready, self.stop_event), daemon=True
+        )
+        self.inference = context.Process(
+            target=inference_process, name="InferenceProcess",
+            args=(self.input_ring.spec(), self.output_ring.spec(), self.frame_ready, self.result_queue, self.control_queue, self.stop_event, self.sent_settings),
+            daemon=True
+        )
+        self.capture.start()
+        self.inference.start()
+        logging.info(f"Started capture (pid {self.capture.pid}) and inference (pid {self.inference.pid}) processes")
+
+    def current_settings(self):
+        return {
+            "EYE_AR_THRESH": self.parent.EYE_AR_THRESH,
+            "HEAD_ROLL_THRESH": self.parent.HEAD_ROLL_THRESH,
+            "HEAD_PITCH_THRESH": self.parent.HEAD_PITCH_THRESH,
+            "language": self.parent.language,
+            "sensitivity_mode": self.parent.alert_handler.sensitivity_mode if self.parent.alert_handler else "normal"
+        }
+
+    def sync_settings(self, ear_thresh):
+        # آستانه‌ی EAR در پردازه‌ی استنتاج به‌صورت پویا تنظیم می‌شود؛ تغییرات تنظیمات کاربر به آن ارسال می‌شود
+        if ear_thresh != self.synced_ear_thresh:
+            self.synced_ear_thresh = ear_thresh
+            self.parent.EYE_AR_THRESH = ear_thresh
+        settings = self.current_settings()
+        if settings != self.sent_settings:
+            self.sent_settings = settings
+            self.control_queue.put(settings)
+
+    def wait_for_frame(self, timeout):
+        if self.pending_result is not None:
+            return True
+        try:
+            self.pending_result = self.result_queue.get(timeout=timeout)
+            return True
+        except queue.Empty:
+            return False
+
+    def process_frame(self):
+        try:
+            result = self.pending_result
+            self.pending_result = None
+            try:
+                while True:
+                    newer = self.result_queue.get_nowait()
+                    if result is not None:
+                        self.skipped_results += 1
+                    result = newer
+            except queue.Empty:
+                pass
+            if result is None:
+                return None
+
+            sequence, frame_data, ear_thresh, kalman_ear, start_ns, end_ns = result
+            if not self.output_ring.read(sequence, self.frame):
+                self.stale_results += 1
+                return None
+            self.current_frame_id = sequence
+            self.kalman_ear = kalman_ear
+            self.tracer.record(sequence, "inference_process", start_ns, end_ns)
+            self.sync_settings(ear_thresh)
+            frame_data.frame = self.frame
+            return frame_data
+        except Exception as e:
+            logging.error(f"Error processing frame: {e}")
+            return None
+
+    def cleanup(self):
+        try:
+            self.stop_event.set()
+            for process in (self.capture, self.inference):
+                process.join(SHM_JOIN_TIMEOUT)
+                if process.is_alive():
+                    logging.warning(f"{process.name} did not stop; terminating")
+                    process.terminate()
+            logging.info(f"Shared-memory pipeline stopped; skipped results: {self.skipped_results}, stale frames: {self.stale_results}")
+            self.result_queue.cancel_join_thread()
+            self.control_queue.cancel_join_thread()
+            self.input_ring.close()
+            self.output_ring.close()
+        except Exception as e:
+            logging.error(f"Error cleaning up shared-memory pipeline: {e}")
+        super().cleanup()
@@ -0,0 +1,107 @@
+# text_sprites.py
+import math
+import logging
+from collections import OrderedDict
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+import arabic_reshaper
+from bidi.algorithm import get_display
+from src.constants import FONT_PATH_FA, FONT_PATH_EN, TEXTS, ALERT_TEXT_FONT_SIZE, ALERT_TEXT_PADDING, ALERT_TEXT_SHADOW, ALERT_TEXT_BOX_ALPHA, ALERT_TEXT_PULSE_RATE, ALERT_TEXT_PULSE_DEPTH, ALERT_TEXT_BOB_RATE, ALERT_TEXT_BOB_AMPLITUDE, TEXT_SPRITE_CACHE_SIZE
+
+# رندر صحیح متن فارسی: اتصال حروف و ترتیب راست به چپ
+def shape_text(text, language):
+    return get_display(arabic_reshaper.reshape(text)) if language == "fa" else text
+
+def load_font(language):
+    try:
+        return ImageFont.truetype(FONT_PATH_FA if language == "fa" else FONT_PATH_EN, ALERT_TEXT_FONT_SIZE)
+    except IOError:
+        logging.warning("Falling back to default font with size 24.")
+        try:
+            return ImageFont.truetype("arial.ttf" if language == "en" else "tahoma.ttf", 24)
+        except IOError:
+            return ImageFont.load_default()
+
+class TextSprite:
+    __slots__ = ("color", "alpha", "width", "height")
+
+    def __init__(self, color, alpha):
+        self.color = color  # (h, w, 3) float32 RGB, premultiplied by alpha
+        self.alpha = alpha  # (h, w, 1) float32 coverage of text and shadow
+        self.height, self.width = alpha.shape[:2]
+
+# Alert messages rendered once per (message, language) into sprites, then blended into the RGB display
+# frame with NumPy on the text box only. The pulse and bob animation follow elapsed seconds, so they run
+# at the same speed whatever the frame rate. The messages of TEXTS are shaped when the cache is created;
+# formatted messages (with numbers) are shaped and rendered on first use and kept in a small LRU.
+class TextSpriteCache:
+    def __init__(self, texts=TEXTS, capacity=TEXT_SPRITE_CACHE_SIZE):
+        self.capacity = capacity
+        self.fonts = {}
+        self.sprites = OrderedDict()
+        self.shaped = {}
+        for language, strings in texts.items():
+            for text in strings.values():
+                if isinstance(text, str):
+                    self.shaped[(language, text)] = shape_text(text, language)
+
+    def font(self, language):
+        font = self.fonts.get(language)
+        if font is None:
+            font = self.fonts[language] = load_font(language)
+        return font
+
+    def render(self, message, language):
+        shaped = self.shaped.get((language, message)) or shape_text(message, language)
+        font = self.font(language)
+        left, top, right, bottom = font.getbbox(shaped)
+        pad = ALERT_TEXT_PADDING
+        size = (right - left + 2 * pad + ALERT_TEXT_SHADOW, bottom - top + 2 * pad + ALERT_TEXT_SHADOW)
+        origin = (pad - left, pad - top)
+        text_mask = Image.new("L", size, 0)
+        shadow_mask = Image.new("L", size, 0)
+        ImageDraw.Draw(text_mask).text(origin, shaped, font=font, fill=255)
+        ImageDraw.Draw(shadow_mask).text((origin[0] + ALERT_TEXT_SHADOW, origin[1] + ALERT_TEXT_SHADOW), shaped, font=font, fill=255)
+        text = np.asarray(text_mask, dtype=np.float32)[..., None] / 255.0
+        shadow = np.asarray(shadow_mask, dtype=np.float32)[..., None] / 255.0
+        # white text over a black shadow
+        alpha = text + shadow * (1.0 - text)
+        color = np.repeat(text * 255.0, 3, axis=2)
+        return TextSprite(color, alpha)
+
+    def sprite(self, message, language):
+        key = (message, language)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.sprites[key] = self.render(message, language)
+            if len(self.sprites) > self.capacity:
+                self.sprites.popitem(last=False)
+        else:
+            self.sprites.move_to_end(key)
+        return sprite
+
+    # Draws message centered on the RGB frame in place; elapsed: seconds since the message appeared.
+    def draw(self, frame, message, language, elapsed):
+        try:
+            sprite = self.sprite(message, language)
+            opacity = min(1.0, 1.0 - math.sin(elapsed * ALERT_TEXT_PULSE_RATE) * ALERT_TEXT_PULSE_DEPTH)
+            offset_y = int(ALERT_TEXT_BOB_AMPLITUDE * math.sin(elapsed * ALERT_TEXT_BOB_RATE))
+            frame_height, frame_width = frame.shape[:2]
+            x = (frame_width - sprite.width) // 2
+            y = (frame_height - sprite.height) // 2 + offset_y
+            # بخشی از متن که بیرون از فریم است بریده می‌شود
+            x0, y0 = max(x, 0), max(y, 0)
+            x1, y1 = min(x + sprite.width, frame_width), min(y + sprite.height, frame_height)
+            if x1 <= x0 or y1 <= y0:
+                return frame
+            sx, sy = x0 - x, y0 - y
+            alpha = sprite.alpha[sy:sy + y1 - y0, sx:sx + x1 - x0] * opacity
+            color = sprite.color[sy:sy + y1 - y0, sx:sx + x1 - x0]
+            region = frame[y0:y1, x0:x1]
+            # semi-transparent black box, then the text layer
+            blended = region * ((1.0 - ALERT_TEXT_BOX_ALPHA) * (1.0 - alpha)) + color * opacity
+            np.copyto(region, blended, casting="unsafe")
+            return frame
+        except Exception as e:
+            logging.error(f"Error drawing alert text: {e}")
+            return frame
@@ -0,0 +1,92 @@
+# tracing.py
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+import numpy as np
+from src.constants import TRACE_BUFFER_SIZE, TRACE_FOLDER
+
+# Fixed-size ring buffer of per-frame stage timings, exportable as Chrome trace / Perfetto JSON.
+class FrameTracer:
+    def __init__(self, capacity=TRACE_BUFFER_SIZE):
+        self.capacity = capacity
+        self.enabled = True
+        self.frame_ids = np.zeros(capacity, dtype=np.int64)
+        self.stage_ids = np.zeros(capacity, dtype=np.int16)
+        self.start_ns = np.zeros(capacity, dtype=np.int64)
+        self.duration_ns = np.zeros(capacity, dtype=np.int64)
+        self.thread_ids = np.zeros(capacity, dtype=np.int64)
+        self.stage_names = []
+        self.stage_index = {}
+        self.thread_names = {}
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def record(self, frame_id, stage, start_ns, end_ns):
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        with self.lock:
+            stage_id = self.stage_index.get(stage)
+            if stage_id is None:
+                stage_id = len(self.stage_names)
+                self.stage_names.append(stage)
+                self.stage_index[stage] = stage_id
+            if thread.native_id not in self.thread_names:
+                self.thread_names[thread.native_id] = thread.name
+            slot = self.count % self.capacity
+            self.frame_ids[slot] = frame_id
+            self.stage_ids[slot] = stage_id
+            self.start_ns[slot] = start_ns
+            self.duration_ns[slot] = end_ns - start_ns
+            self.thread_ids[slot] = thread.native_id
+            self.count += 1
+
+    @contextmanager
+    def span(self, frame_id, stage):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(frame_id, stage, start, time.perf_counter_ns())
+
+    def snapshot(self):
+        with self.lock:
+            size = min(self.count, self.capacity)
+            order = np.arange(self.count - size, self.count) % self.capacity
+            return [
+                (int(self.frame_ids[i]), self.stage_names[self.stage_ids[i]], int(self.start_ns[i]), int(self.duration_ns[i]), int(self.thread_ids[i]))
+                for i in order
+            ], dict(self.thread_names)
+
+    def export_chrome_trace(self, path=None):
+        try:
+            if path is None:
+                os.makedirs(TRACE_FOLDER, exist_ok=True)
+                path = os.path.join(TRACE_FOLDER, f"trace_{time.strftime('%Y%m%d_%H%M%S')}.json")
+            spans, thread_names = self.snapshot()
+            pid = os.getpid()
+            events = [
+                {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                for tid, name in thread_names.items()
+            ]
+            for frame_id, stage, start_ns, duration_ns, tid in spans:
+                events.append({
+                    "name": stage,
+                    "cat": "frame",
+                    "ph": "X",
+                    "ts": start_ns / 1000.0,
+                    "dur": duration_ns / 1000.0,
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"frame_id": frame_id}
+                })
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+            logging.info(f"Exported {len(spans)} trace spans to {os.path.abspath(path)}")
+            return path
+        except Exception as e:
+            logging.error(f"Error exporting trace: {e}")
+            return None
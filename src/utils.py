@@ -1,12 +1,7 @@
 import cv2
 import numpy as np
 import logging
-from PIL import Image, ImageDraw, ImageFont
-import arabic_reshaper
-from bidi.algorithm import get_display
-import math
-import os
-from src.constants import FONT_PATH_FA, FONT_PATH_EN
+import time
 
 def check_hardware_acceleration():
     try:
@@ -32,6 +27,12 @@ def check_hardware_acceleration():
         logging.error(f"Error checking hardware acceleration: {e}")
         return False, False
 
+# Returns (result, milliseconds taken)
+def timed_call(function, *args):
+    start = time.perf_counter_ns()
+    result = function(*args)
+    return result, (time.perf_counter_ns() - start) / 1e6
+
 def eye_aspect_ratio(eye):
     try:
         A = np.linalg.norm(eye[1] - eye[5])
@@ -46,45 +47,17 @@ def eye_aspect_ratio(eye):
         logging.error(f"Error calculating eye aspect ratio: {e}")
         return 0.0
 
-def render_animated_text(pil_img, text, language, frame_count):
+# One gamma table per brightness level (256 x 256), gamma interpolated linearly between anchors,
+# so neighbouring brightness levels get neighbouring curves instead of jumping between bands.
+def build_gamma_lut_bank(anchors):
     try:
-        draw = ImageDraw.Draw(pil_img, 'RGBA')
-        font_size = 40  # اندازه فونت مناسب
-        try:
-            if language == "fa":
-                font = ImageFont.truetype(FONT_PATH_FA, font_size)
-            else:
-                font = ImageFont.truetype(FONT_PATH_EN, font_size)
-        except IOError:
-            logging.warning("Falling back to default font with size 24.")
-            font = ImageFont.truetype("arial.ttf", 24) if language == "en" else ImageFont.truetype("tahoma.ttf", 24)
-
-        # رندر صحیح متن فارسی
-        reshaped_text = arabic_reshaper.reshape(text) if language == "fa" else text
-        bidi_text = get_display(reshaped_text) if language == "fa" else text
-
-        opacity = int(255 * (1.0 - (math.sin(frame_count / 20.0) * 0.3)))
-        offset_y = int(20 * math.sin(frame_count / 15.0))
-
-        bbox = font.getbbox(bidi_text)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        img_width, img_height = pil_img.size
-        text_x = (img_width - text_width) / 2
-        text_y = (img_height - text_height) / 2 + offset_y
-
-        draw.rectangle(
-            [(text_x - 10, text_y - 10), (text_x + text_width + 10, text_y + text_height + 10)],
-            fill=(0, 0, 0, 128)
-        )
-
-        # سایه برای خوانایی بهتر
-        draw.text((text_x + 3, text_y + 3), bidi_text, font=font, fill=(0, 0, 0, opacity))
-        draw.text((text_x, text_y), bidi_text, font=font, fill=(255, 255, 255, opacity))
-        return pil_img
+        levels = np.arange(256, dtype=np.float64)
+        points, gammas = zip(*anchors)
+        gamma = np.interp(levels, points, gammas)
+        return (np.power(levels[None, :] / 255.0, 1.0 / gamma[:, None]) * 255).astype(np.uint8)
     except Exception as e:
-        logging.error(f"Error rendering animated text: {e}")
-        return pil_img
+        logging.error(f"Error building gamma LUT bank: {e}")
+        return np.tile(np.arange(256, dtype=np.uint8), (256, 1))
 
 def get_texts():
     return {
@@ -0,0 +1,68 @@
+# view_model.py
+import logging
+from PyQt6.QtCore import QTimer
+from src.constants import UI_STATS_RATE
+
+# The stat labels of the main window. update() only keeps the newest detection result; a timer at
+# `rate` Hz formats the label texts and calls setText only on labels whose displayed text changed,
+# since every setText on these styled labels can cost a relayout. Nothing is formatted while the
+# window is minimised.
+class StatsViewModel:
+    def __init__(self, parent, rate=UI_STATS_RATE):
+        self.parent = parent
+        self.latest = None
+        self.current = None  # result the labels show
+        self.shown = {}  # label -> text last set
+        self.updates = 0
+        self.timer = QTimer(parent)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start(max(1, round(1000 / rate)))
+
+    def labels(self):
+        return {
+            "ear": self.parent.ear_label,
+            "tilt": self.parent.tilt_label,
+            "direction": self.parent.direction_label,
+            "blink_rate": self.parent.blink_rate_label,
+            "alert_count": self.parent.alert_label
+        }
+
+    def update(self, result):
+        self.latest = result
+
+    def texts(self, result):
+        texts = self.parent.texts[self.parent.language]
+        return {
+            "ear": texts["ear_ratio"].format(result.smoothed_ear),
+            "tilt": texts["tilt_info"].format(result.current_roll, result.current_pitch),
+            "direction": texts["direction"].format(result.direction_text),
+            "blink_rate": texts["blink_rate"].format(result.blink_rate),
+            "alert_count": texts["alert_count"].format(result.alert_count)
+        }
+
+    def flush(self):
+        try:
+            if self.latest is None or self.parent.isMinimized():
+                return
+            result = self.latest
+            self.latest = None
+            self.current = result
+            labels = self.labels()
+            for key, text in self.texts(result).items():
+                if self.shown.get(key) != text:
+                    labels[key].setText(text)
+                    self.shown[key] = text
+                    self.updates += 1
+        except Exception as e:
+            logging.error(f"Error updating stat labels: {e}")
+
+    # The labels were rewritten elsewhere (language change); set them all again from the last result.
+    def refresh(self):
+        self.shown.clear()
+        if self.latest is None:
+            self.latest = self.current
+        self.flush()
+
+    def stop(self):
+        self.timer.stop()
+        logging.info(f"Stat labels updated {self.updates} time(s)")
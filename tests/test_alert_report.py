@@ -0,0 +1,62 @@
+# test_alert_report.py
+import math
+import numpy as np
+import pytest
+from src.alert_report import LogHistogram
+from src.constants import REPORT_HISTOGRAM_GROWTH, REPORT_HISTOGRAM_MIN
+
+# a bin's geometric middle is at most this far (relative) from any value in the bin
+BIN_ERROR = math.sqrt(REPORT_HISTOGRAM_GROWTH) - 1
+
+def histogram_of(values):
+    histogram = LogHistogram()
+    for value in values:
+        histogram.add(float(value))
+    return histogram
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_percentiles_within_bin_error(seed):
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(0.5, 1.0, 5000)
+    histogram = histogram_of(values)
+    for q in (1, 10, 50, 90, 95, 99, 100):
+        expected = np.percentile(values, q, method="inverted_cdf")
+        assert histogram.percentile(q) == pytest.approx(expected, rel=BIN_ERROR + 1e-9)
+
+def test_summary_exact_fields():
+    values = [0.5, 2.0, 3.5, 10.0]
+    summary = histogram_of(values).summary()
+    assert summary["count"] == 4
+    assert summary["mean"] == pytest.approx(4.0)
+    assert summary["min"] == 0.5 and summary["max"] == 10.0
+
+def test_percentile_clamped_to_observed_range():
+    histogram = histogram_of([3.0] * 10)
+    assert histogram.percentile(0) == 3.0
+    assert histogram.percentile(50) == 3.0
+    assert histogram.percentile(100) == 3.0
+
+def test_short_durations_share_first_bin():
+    histogram = histogram_of([0.0, REPORT_HISTOGRAM_MIN / 2, REPORT_HISTOGRAM_MIN])
+    assert list(histogram.bins) == [0]
+    assert histogram.percentile(50) == REPORT_HISTOGRAM_MIN
+
+def test_merge_matches_single_histogram():
+    rng = np.random.default_rng(3)
+    parts = [rng.lognormal(0.0, 1.5, size) for size in (10, 500, 2000)]
+    merged = LogHistogram()
+    for part in parts:
+        merged.merge(histogram_of(part))
+    merged.merge(LogHistogram())
+    whole = histogram_of(np.concatenate(parts))
+    assert merged.bins == whole.bins
+    assert merged.count == whole.count
+    assert merged.total == pytest.approx(whole.total)
+    assert (merged.min, merged.max) == (whole.min, whole.max)
+    for q in (50, 90, 99):
+        assert merged.percentile(q) == whole.percentile(q)
+
+def test_empty_histogram():
+    histogram = LogHistogram()
+    assert histogram.percentile(50) is None
+    assert histogram.summary()["mean"] is None
@@ -0,0 +1,110 @@
+# test_clip_recorder.py
+import numpy as np
+import pytest
+from src.clip_recorder import ClipRecorder
+
+SECOND = 1_000_000_000
+STEP = SECOND // 10
+
+@pytest.fixture
+def recorder():
+    recorder = ClipRecorder(fps=10, pre_seconds=3, post_seconds=2, memory_budget=1 << 20)
+    submitted = []
+    # store() is driven directly, so finished clips are captured instead of written
+    recorder.submit = submitted.append
+    recorder.submitted = submitted
+    yield recorder
+    # the frames are not JPEG data, so an open clip is discarded rather than written
+    with recorder.lock:
+        recorder.close_clip()
+    recorder.close()
+
+def feed(recorder, start_ns, end_ns, size=10):
+    for timestamp in range(start_ns, end_ns, STEP):
+        recorder.store(timestamp, bytes(size))
+
+def timestamps(frames):
+    return [timestamp for timestamp, _ in frames]
+
+def test_ring_keeps_pre_seconds(recorder):
+    feed(recorder, 0, 10 * SECOND)
+    ring = timestamps(recorder.ring)
+    assert ring[-1] - ring[0] <= 3 * SECOND
+    assert ring == list(range(ring[0], 10 * SECOND, STEP))
+    assert ring[0] == 10 * SECOND - STEP - 3 * SECOND
+    assert recorder.ring_bytes == 10 * len(ring)
+
+def test_trigger_takes_frames_from_pre_window(recorder):
+    feed(recorder, 0, 10 * SECOND)
+    # the event is newer than the last encoded frame, so part of the ring is older than the pre window
+    recorder.trigger("clip.avi", 11 * SECOND)
+    assert recorder.clip.start_ns == 8 * SECOND
+    assert timestamps(recorder.clip.frames) == list(range(8 * SECOND, 10 * SECOND, STEP))
+    assert recorder.clip_bytes == 10 * len(recorder.clip.frames)
+
+def test_finish_keeps_post_seconds_then_closes(recorder):
+    feed(recorder, 0, 5 * SECOND)
+    recorder.trigger("clip.avi", 5 * SECOND)
+    feed(recorder, 5 * SECOND, 8 * SECOND)
+    recorder.finish(8 * SECOND)
+    feed(recorder, 8 * SECOND, 10 * SECOND + STEP)
+    assert recorder.submitted == []
+    # the first frame past end + post_seconds closes the clip without joining it
+    recorder.store(10 * SECOND + STEP, bytes(10))
+    assert len(recorder.submitted) == 1
+    clip = recorder.submitted[0]
+    assert clip.end_ns == 10 * SECOND
+    assert timestamps(clip.frames) == list(range(2 * SECOND, 10 * SECOND + STEP, STEP))
+    assert recorder.clip is None and recorder.clip_bytes == 0
+
+def test_finish_only_sets_the_first_end(recorder):
+    recorder.trigger("clip.avi", 0)
+    recorder.finish(SECOND)
+    recorder.finish(4 * SECOND)
+    assert recorder.clip.end_ns == 3 * SECOND
+
+def test_retrigger_submits_open_clip(recorder):
+    feed(recorder, 0, 2 * SECOND)
+    recorder.trigger("first.avi", 2 * SECOND)
+    feed(recorder, 2 * SECOND, 3 * SECOND)
+    recorder.trigger("second.avi", 3 * SECOND)
+    assert [clip.path for clip in recorder.submitted] == ["first.avi"]
+    assert recorder.clip.path == "second.avi"
+    assert recorder.clip.start_ns == 0
+
+def test_open_clip_is_capped_at_max_length(recorder):
+    recorder.trigger("clip.avi", 3 * SECOND)
+    feed(recorder, 0, recorder.max_ns + 2 * SECOND)
+    assert len(recorder.submitted) == 1
+    clip = recorder.submitted[0]
+    assert clip.end_ns == clip.start_ns + recorder.max_ns
+    assert timestamps(clip.frames)[-1] <= clip.end_ns
+
+def test_memory_budget_drops_clip_frames():
+    recorder = ClipRecorder(fps=10, pre_seconds=3, post_seconds=2, memory_budget=1000)
+    try:
+        recorder.trigger("clip.avi", 0)
+        feed(recorder, 0, 2 * SECOND, size=100)
+        # the ring gave up its frames first and the clip holds what the budget allows
+        assert recorder.clip_bytes == 1000
+        assert recorder.ring_bytes == 0
+        assert recorder.budget_drops == 10
+    finally:
+        with recorder.lock:
+            recorder.close_clip()
+        recorder.close()
+
+def test_writes_clip_file(tmp_path):
+    recorder = ClipRecorder(fps=10, pre_seconds=1, post_seconds=1)
+    written = []
+    recorder.on_clip_written = written.append
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    for index in range(20):
+        frame[:] = index * 10
+        recorder.add_frame(frame, index * STEP)
+    path = str(tmp_path / "clip.avi")
+    recorder.trigger(path, 2 * SECOND)
+    recorder.close()
+    assert written == [path]
+    assert (tmp_path / "clip.avi").stat().st_size > 0
+    assert recorder.stats()["written_clips"] == 1
@@ -0,0 +1,92 @@
+# test_frame_buffer.py
+import threading
+import numpy as np
+from src.frame_buffer import TripleBuffer
+
+def frame(value):
+    return np.full((4, 4, 3), value, dtype=np.uint8)
+
+def test_acquire_before_publish_returns_nothing():
+    buffer = TripleBuffer()
+    assert buffer.acquire() == (None, 0, 0)
+    assert buffer.stats() == {"captured": 0, "dropped": 0, "duplicates": 1}
+
+def test_publish_then_acquire():
+    buffer = TripleBuffer()
+    published = frame(7)
+    assert buffer.publish(published, 123) == 1
+    acquired, sequence, timestamp_ns = buffer.acquire()
+    assert acquired is published
+    assert (sequence, timestamp_ns) == (1, 123)
+    # nothing new until the next publish
+    assert buffer.acquire() == (None, 1, 0)
+    assert buffer.stats()["duplicates"] == 1
+
+def test_acquire_returns_newest_and_counts_dropped():
+    buffer = TripleBuffer()
+    for value in (1, 2, 3):
+        buffer.publish(frame(value), value * 10)
+    acquired, sequence, timestamp_ns = buffer.acquire()
+    assert acquired[0, 0, 0] == 3
+    assert (sequence, timestamp_ns) == (3, 30)
+    assert buffer.stats() == {"captured": 3, "dropped": 2, "duplicates": 0}
+
+def test_writer_never_gets_the_front_slot():
+    buffer = TripleBuffer()
+    for value in range(3):
+        buffer.publish(frame(value))
+    front, _, _ = buffer.acquire()
+    for value in range(10):
+        target = buffer.write_buffer()
+        assert target is not front
+        buffer.publish(target if target is not None else frame(value))
+    assert front[0, 0, 0] == 2
+
+def test_wait_for_frame_and_publish_callback():
+    buffer = TripleBuffer()
+    calls = []
+    buffer.on_publish = lambda: calls.append(True)
+    assert not buffer.wait_for_frame(0.01)
+    buffer.publish(frame(1))
+    assert buffer.wait_for_frame(0.01)
+    assert buffer.has_new_frame()
+    buffer.acquire()
+    assert not buffer.has_new_frame()
+    assert calls == [True]
+
+# The writer fills reused slots in place like read_frames does; every acquired frame must be whole
+# and must stay unchanged until the reader's next acquire.
+def test_concurrent_publish_and_acquire():
+    buffer = TripleBuffer()
+    count = 2000
+    done = threading.Event()
+
+    def write():
+        for sequence in range(1, count + 1):
+            target = buffer.write_buffer()
+            if target is None:
+                target = np.empty((32, 32, 3), dtype=np.uint8)
+            target[:] = sequence % 256
+            buffer.publish(target, sequence)
+        done.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    last_sequence = 0
+    previous = None
+    while not done.is_set() or buffer.has_new_frame():
+        if previous is not None:
+            # the front slot from the last acquire is still intact
+            assert np.all(previous[0] == previous[1])
+        acquired, sequence, timestamp_ns = buffer.acquire()
+        if acquired is None:
+            continue
+        assert sequence > last_sequence
+        assert timestamp_ns == sequence
+        assert np.all(acquired == sequence % 256)
+        last_sequence = sequence
+        previous = (acquired, sequence % 256)
+    writer.join()
+    assert last_sequence == count
+    stats = buffer.stats()
+    assert stats["captured"] == count
@@ -0,0 +1,40 @@
+# test_pipeline.py
+import threading
+from src.pipeline import LatestResultQueue
+
+def test_get_on_empty_queue():
+    assert LatestResultQueue(2).get() is None
+
+def test_full_put_evicts_oldest():
+    results = LatestResultQueue(2)
+    for item in range(5):
+        results.put(item)
+    assert results.dropped == 3
+    assert [results.get(), results.get(), results.get()] == [3, 4, None]
+
+def test_concurrent_producer_keeps_order_and_count():
+    results = LatestResultQueue(3)
+    count = 5000
+    received = []
+    done = threading.Event()
+
+    def produce():
+        for item in range(count):
+            results.put(item)
+        done.set()
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    while not done.is_set():
+        item = results.get()
+        if item is not None:
+            received.append(item)
+    producer.join()
+    item = results.get()
+    while item is not None:
+        received.append(item)
+        item = results.get()
+    assert received == sorted(received)
+    assert received[-1] == count - 1
+    # every item was either received or counted as dropped
+    assert len(received) + results.dropped == count
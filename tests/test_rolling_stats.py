@@ -0,0 +1,89 @@
+# test_rolling_stats.py
+import numpy as np
+import pytest
+from src.rolling_stats import RollingWindow, TimedRollingWindow
+
+def assert_matches(window, expected):
+    expected = np.asarray(expected, dtype=np.float64)
+    assert len(window) == len(expected)
+    if not len(expected):
+        assert (window.mean(), window.var(), window.min(), window.max()) == (0.0, 0.0, 0.0, 0.0)
+        return
+    assert window.mean() == pytest.approx(expected.mean(), rel=1e-9, abs=1e-9)
+    assert window.var() == pytest.approx(expected.var(), rel=1e-6, abs=1e-9)
+    # the square root magnifies the rounding left in a zero variance
+    assert window.std() == pytest.approx(expected.std(), rel=1e-6, abs=1e-4)
+    assert window.min() == expected.min()
+    assert window.max() == expected.max()
+
+@pytest.mark.parametrize("capacity", [1, 2, 7, 64])
+def test_rolling_window_matches_naive(capacity):
+    rng = np.random.default_rng(capacity)
+    window = RollingWindow(capacity)
+    values = []
+    for value in rng.normal(0.3, 0.05, 1000):
+        window.append(value)
+        values.append(value)
+        assert_matches(window, values[-capacity:])
+    assert np.array_equal(window.to_array(), np.array(values[-capacity:]))
+
+def test_rolling_window_monotonic_runs_and_ties():
+    # rising, falling and constant runs exercise the min/max queues
+    values = list(range(20)) + list(range(20, 0, -1)) + [5.0] * 10
+    window = RollingWindow(8)
+    for index, value in enumerate(values):
+        window.append(value)
+        assert_matches(window, values[max(0, index - 7):index + 1])
+
+def test_rolling_window_forgets_large_values():
+    # A burst of large values that has left the window must leave no residue in the running sums,
+    # which subtraction alone would (the periodic re-sum removes it).
+    window = RollingWindow(50)
+    rng = np.random.default_rng(0)
+    values = np.concatenate((rng.normal(1e4, 10.0, 50), rng.normal(0.3, 0.01, 500)))
+    for value in values:
+        window.append(value)
+    assert window.mean() == pytest.approx(values[-50:].mean(), rel=1e-9)
+    assert window.var() == pytest.approx(values[-50:].var(), rel=1e-6)
+
+def test_rolling_window_clear():
+    window = RollingWindow(4)
+    for value in (1, 2, 3, 4, 5):
+        window.append(value)
+    window.clear()
+    assert_matches(window, [])
+    for value in (9, 8):
+        window.append(value)
+    assert_matches(window, [9, 8])
+
+def naive_timed(entries, now_ns, duration_ns, capacity):
+    window = [value for value, timestamp_ns in entries if timestamp_ns >= now_ns - duration_ns]
+    return window[-capacity:]
+
+@pytest.mark.parametrize("capacity", [4, 30, 1000])
+def test_timed_window_matches_naive(capacity):
+    rng = np.random.default_rng(capacity)
+    duration_ns = 1_000_000_000
+    window = TimedRollingWindow(duration_ns, capacity)
+    entries = []
+    timestamp_ns = 0
+    for value in rng.normal(10.0, 3.0, 1500):
+        # irregular frame intervals, including pauses longer than the window
+        timestamp_ns += int(rng.choice([16_000_000, 33_000_000, 50_000_000, 1_500_000_000], p=[0.4, 0.4, 0.19, 0.01]))
+        window.append(value, timestamp_ns)
+        entries.append((value, timestamp_ns))
+        expected = naive_timed(entries, timestamp_ns, duration_ns, capacity)
+        assert_matches(window, expected)
+        kept = [t for _, t in entries if t >= timestamp_ns - duration_ns][-capacity:]
+        assert window.span_ns() == (kept[-1] - kept[0] if len(kept) > 1 else 0)
+
+def test_timed_window_expire_without_append():
+    window = TimedRollingWindow(100, 10)
+    for timestamp_ns, value in ((0, 1.0), (50, 2.0), (90, 3.0)):
+        window.append(value, timestamp_ns)
+    window.expire(140)
+    assert_matches(window, [2.0, 3.0])
+    window.expire(160)
+    assert_matches(window, [3.0])
+    window.expire(1000)
+    assert_matches(window, [])
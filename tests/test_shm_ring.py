@@ -0,0 +1,102 @@
+# test_shm_ring.py
+import multiprocessing
+import numpy as np
+import pytest
+from src import shm_pipeline
+from src.shm_pipeline import SharedFrameRing
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing(3, 8, 8)
+    yield ring
+    ring.close()
+
+def write(ring, sequence, value, timestamp_ns=0):
+    slot, target = ring.begin_write(sequence)
+    target[:] = value
+    ring.end_write(slot, sequence, timestamp_ns)
+
+def test_write_and_read(ring):
+    out = np.empty(ring.shape, dtype=np.uint8)
+    write(ring, 1, 11, 1000)
+    assert ring.latest_sequence() == 1
+    assert ring.read(1, out)
+    assert np.all(out == 11)
+    assert ring.last_timestamp_ns == 1000
+
+def test_read_fails_while_slot_is_written(ring):
+    out = np.zeros(ring.shape, dtype=np.uint8)
+    write(ring, 1, 11)
+    ring.begin_write(4)  # same slot as sequence 1
+    assert not ring.read(1, out)
+    assert not ring.read(4, out)
+
+def test_read_fails_for_overwritten_sequence(ring):
+    out = np.empty(ring.shape, dtype=np.uint8)
+    for sequence in range(1, 5):
+        write(ring, sequence, sequence)
+    assert not ring.read(1, out)
+    assert ring.read(4, out)
+    assert np.all(out == 4)
+
+# A writer that laps the reader in the middle of the copy must make the read fail, so the caller
+# drops it and retries with the newest sequence.
+def test_torn_read_is_detected_and_retry_succeeds(ring, monkeypatch):
+    out = np.empty(ring.shape, dtype=np.uint8)
+    write(ring, 1, 1)
+    copyto = np.copyto
+
+    def lapped_copy(dst, src):
+        copyto(dst, src)
+        slot, target = ring.begin_write(4)
+        target[:] = 4
+    monkeypatch.setattr(shm_pipeline.np, "copyto", lapped_copy)
+    assert not ring.read(1, out)
+    monkeypatch.undo()
+
+    ring.end_write(1, 4)
+    assert ring.latest_sequence() == 4
+    assert ring.read(ring.latest_sequence(), out)
+    assert np.all(out == 4)
+
+def test_attached_ring_shares_frames(ring):
+    other = SharedFrameRing.attach(ring.spec())
+    try:
+        write(ring, 2, 22, 5)
+        out = np.empty(other.shape, dtype=np.uint8)
+        assert other.latest_sequence() == 2
+        assert other.read(2, out)
+        assert np.all(out == 22)
+        assert other.last_timestamp_ns == 5
+    finally:
+        other.close()
+
+def write_frames(spec, count):
+    ring = SharedFrameRing.attach(spec)
+    try:
+        for sequence in range(1, count + 1):
+            write(ring, sequence, sequence % 256, sequence)
+    finally:
+        ring.close()
+
+# Writer in another process, as with the capture process: a read that succeeds is never torn.
+def test_reads_across_processes_are_never_torn():
+    ring = SharedFrameRing(2, 120, 160)
+    count = 3000
+    try:
+        writer = multiprocessing.get_context("spawn").Process(target=write_frames, args=(ring.spec(), count))
+        writer.start()
+        out = np.empty(ring.shape, dtype=np.uint8)
+        reads = 0
+        while writer.is_alive():
+            sequence = ring.latest_sequence()
+            if sequence and ring.read(sequence, out):
+                assert np.all(out == sequence % 256)
+                assert ring.last_timestamp_ns == sequence
+                reads += 1
+        writer.join(10)
+        assert writer.exitcode == 0
+        assert ring.latest_sequence() == count
+        assert reads > 0
+    finally:
+        ring.close()